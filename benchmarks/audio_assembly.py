@@ -0,0 +1,80 @@
+"""
+Compare assembling the speech of a long comment from its chunks, through WAV files and pydub or in memory.
+
+    pydub       every chunk is written to a _part_N.wav file, read back and appended to an AudioSegment, which is
+                exported to MP3
+    assembler   every chunk is appended to an AudioAssembler, which streams the samples to a single ffmpeg
+
+Usage:
+    python benchmarks/audio_assembly.py [--chunks 10 50 200] [--chunk-seconds 12] [--sample-rate 22050]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from src.audio_generation.audio_assembler import AudioAssembler  # noqa: E402
+
+
+def chunk_samples(count, chunk_seconds, sample_rate):
+    """Return the samples of every chunk, a tone each."""
+    time_axis = np.arange(int(chunk_seconds * sample_rate)) / sample_rate
+    return [(0.3 * np.sin(2 * np.pi * (200 + 10 * i) * time_axis)).astype(np.float32) for i in range(count)]
+
+
+def assemble_with_pydub(chunks, sample_rate, output_file):
+    from pydub import AudioSegment
+
+    part_files = []
+    for i, samples in enumerate(chunks):
+        part_file = f"{os.path.splitext(output_file)[0]}_part_{i}.wav"
+        with wave.open(part_file, 'wb') as file:
+            file.setnchannels(1)
+            file.setsampwidth(2)
+            file.setframerate(sample_rate)
+            file.writeframes((samples * 32767).astype('<i2').tobytes())
+        part_files.append(part_file)
+
+    combined = AudioSegment.empty()
+    for part_file in part_files:
+        combined += AudioSegment.from_wav(part_file)
+        os.remove(part_file)
+    combined.export(output_file, format='mp3')
+
+
+def assemble_in_memory(chunks, sample_rate, output_file):
+    assembler = AudioAssembler(sample_rate, sum(len(samples) for samples in chunks))
+    for samples in chunks:
+        assembler.append(samples)
+    assembler.write_mp3(output_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare assembling the chunks of speech with pydub and in memory.')
+    parser.add_argument('--chunks', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--chunk-seconds', type=float, default=12.0, help='Speech per chunk of 200 characters.')
+    parser.add_argument('--sample-rate', type=int, default=22050)
+    arguments = parser.parse_args()
+
+    for count in arguments.chunks:
+        chunks = chunk_samples(count, arguments.chunk_seconds, arguments.sample_rate)
+        times = {}
+        for name, assemble in (('pydub', assemble_with_pydub), ('assembler', assemble_in_memory)):
+            with tempfile.TemporaryDirectory() as directory:
+                start = time.perf_counter()
+                assemble(chunks, arguments.sample_rate, os.path.join(directory, 'comment.mp3'))
+                times[name] = time.perf_counter() - start
+        print(f"{count:4d} chunks ({count * arguments.chunk_seconds / 60:.0f} min of speech): "
+              f"pydub {times['pydub']:.2f} s, assembler {times['assembler']:.2f} s "
+              f"({times['pydub'] / times['assembler']:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Compare checking the speech of a comment with librosa on its exported file and in memory, chunk by chunk.
+
+    librosa     the speech is written to a WAV file, loaded back by librosa and split on silences, and its RMS
+                computed over the whole file, as check_audio_quality did
+    checker     the samples of every chunk are checked by check_audio_quality as they are synthesized
+
+Usage:
+    python benchmarks/audio_quality.py [--chunks 10 50 200] [--chunk-seconds 12] [--sample-rate 22050]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from src.audio_generation.audio_quality import check_audio_quality  # noqa: E402
+
+
+def chunk_samples(count, chunk_seconds, sample_rate):
+    """Return the samples of every chunk, noise shaped like syllables with short pauses between them."""
+    random = np.random.default_rng(0)
+    chunks = []
+    for _ in range(count):
+        parts = []
+        while sum(len(part) for part in parts) < chunk_seconds * sample_rate:
+            envelope = np.sin(np.linspace(0, np.pi, int(random.uniform(0.08, 0.3) * sample_rate)))
+            parts.append(envelope * random.uniform(0.05, 0.5) * random.standard_normal(len(envelope)))
+            parts.append(np.zeros(int(random.uniform(0.02, 0.2) * sample_rate)))
+        chunks.append(np.concatenate(parts)[:int(chunk_seconds * sample_rate)].astype(np.float32))
+    return chunks
+
+
+def check_with_librosa(chunks, sample_rate, directory):
+    import librosa
+
+    file_path = os.path.join(directory, 'comment.wav')
+    with wave.open(file_path, 'wb') as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(sample_rate)
+        file.writeframes((np.concatenate(chunks) * 32767).astype('<i2').tobytes())
+
+    y, sr = librosa.load(file_path, sr=None)
+    librosa.effects.split(y, top_db=20)
+    np.diff(librosa.feature.rms(y=y)[0])
+
+
+def check_in_memory(chunks, sample_rate, directory):
+    for samples in chunks:
+        check_audio_quality(samples, sample_rate, characters=200)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare checking speech with librosa and in memory.')
+    parser.add_argument('--chunks', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--chunk-seconds', type=float, default=12.0, help='Speech per chunk of 200 characters.')
+    parser.add_argument('--sample-rate', type=int, default=22050)
+    arguments = parser.parse_args()
+
+    for count in arguments.chunks:
+        chunks = chunk_samples(count, arguments.chunk_seconds, arguments.sample_rate)
+        times = {}
+        for name, check in (('librosa', check_with_librosa), ('checker', check_in_memory)):
+            with tempfile.TemporaryDirectory() as directory:
+                start = time.perf_counter()
+                check(chunks, arguments.sample_rate, directory)
+                times[name] = time.perf_counter() - start
+        print(f"{count:4d} chunks ({count * arguments.chunk_seconds / 60:.0f} min of speech): "
+              f"librosa {times['librosa']:.2f} s, checker {times['checker']:.2f} s "
+              f"({times['librosa'] / times['checker']:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
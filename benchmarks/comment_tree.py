@@ -0,0 +1,106 @@
+"""
+Compare the top comment selection and the reply extraction with the previous full sort and recursive flattening,
+on large synthetic threads.
+
+Usage:
+    python benchmarks/comment_tree.py [--comments 10000 50000] [--limit 30] [--min-score 30] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from src.reddit.comment_fetcher import FetchedComment, all_comments, iter_comments  # noqa: E402
+from src.reddit.comment_tree import select_top_comments  # noqa: E402
+from src.reddit.fake_reddit import synthetic_thread  # noqa: E402
+from src.reddit.fetch_subreddit import extract_comment_data  # noqa: E402
+
+
+def sorted_top_comments(top_level, limit):
+    """The previous selection: flatten the whole tree and sort it."""
+    comments = all_comments(top_level)
+    return sorted(comments, key=lambda comment: comment.score, reverse=True)[:limit]
+
+
+def recursive_comment_data(comment, indent=0, min_score=30):
+    """The previous extraction: recurse into every reply above the threshold, at any depth below the comment."""
+    comments_data = [{'author': str(comment.author), 'votes': comment.score, 'comment': comment.body,
+                      'indent': indent}]
+    for subcomment in comment.replies.list():
+        if subcomment.score > min_score:
+            comments_data.extend(recursive_comment_data(subcomment, indent + 1, min_score))
+    return comments_data
+
+
+def build_tree(comments):
+    """Build the comments of synthetic_thread into a tree, returning the top-level comments."""
+    fetched = {comment_id: FetchedComment(f't1_{comment_id}', comment['parent_id'], comment['author'],
+                                          comment['score'], comment['body'])
+               for comment_id, comment in comments.items()}
+    for comment_id, comment in comments.items():
+        fetched[comment_id].replies.extend(fetched[reply_id] for reply_id in comment['replies'])
+    return [fetched[comment_id] for comment_id, comment in comments.items() if comment['parent_id'] is None]
+
+
+def measure(func, repeat):
+    """Return the median time, the peak of allocated memory and the result of a function."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return sorted(times)[len(times) // 2], peak, result
+
+
+def extract_all(extract, top_comments, min_score):
+    rows = []
+    for comment in top_comments:
+        rows.extend(extract(comment, min_score=min_score))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the comment tree selection and extraction.')
+    parser.add_argument('--comments', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--limit', type=int, default=30)
+    parser.add_argument('--min-score', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=3)
+    arguments = parser.parse_args()
+
+    for count in arguments.comments:
+        top_level = build_tree(synthetic_thread(count))
+        print(f'{count} comments:')
+
+        runs = {
+            'top comments, sort': lambda: sorted_top_comments(top_level, arguments.limit),
+            'top comments, heap': lambda: select_top_comments(iter_comments(top_level), arguments.limit),
+        }
+        results = {}
+        for name, func in runs.items():
+            elapsed, peak, results[name] = measure(func, arguments.repeat)
+            print(f'    {name}: {elapsed * 1000:.1f} ms, {peak / 1024:.0f} KiB peak')
+        if [comment.score for comment in results['top comments, sort']] != \
+                [comment.score for comment in results['top comments, heap']]:
+            raise AssertionError('The heap selected other comments than the sort')
+
+        top_comments = results['top comments, heap']
+        runs = {
+            'extraction, recursive': lambda: extract_all(recursive_comment_data, top_comments, arguments.min_score),
+            'extraction, iterative': lambda: extract_all(extract_comment_data, top_comments, arguments.min_score),
+        }
+        for name, func in runs.items():
+            elapsed, peak, rows = measure(func, arguments.repeat)
+            print(f'    {name}: {elapsed * 1000:.1f} ms, {peak / 1024:.0f} KiB peak, {len(rows)} rows')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Compare how fast comment datasets load from CSV, with pandas or the csv module, and from the columnar format.
+
+Usage:
+    python benchmarks/dataset.py [--comments 50000] [--limits 30 0] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from src.reddit.comments import CommentCollection  # noqa: E402
+from src.reddit.fake_reddit import synthetic_thread  # noqa: E402
+
+
+def synthetic_dataset(count):
+    """Comments with long multi-line bodies, like the datasets of large threads."""
+    comments = synthetic_thread(count)
+    return CommentCollection.from_records(
+        {'author': comment['author'], 'votes': comment['score'],
+         'comment': comment['body'].replace(' the ', ' the\n"quoted" '), 'indent': i % 4}
+        for i, comment in enumerate(comments.values()))
+
+
+def read_with_pandas(csv_file, limit):
+    """The previous way of loading a dataset: parse the whole file, then keep the first rows."""
+    import pandas as pd
+    dataframe = pd.read_csv(csv_file)
+    return CommentCollection.from_dataframe(dataframe[:limit] if limit else dataframe)
+
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the load time of the dataset formats.')
+    parser.add_argument('--comments', type=int, default=50000)
+    parser.add_argument('--limits', type=int, nargs='+', default=[30, 0], help='Rows to read, 0 for every row.')
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args()
+
+    comments = synthetic_dataset(arguments.comments)
+    with tempfile.TemporaryDirectory() as directory:
+        csv_file = os.path.join(directory, 'comments.csv')
+        columns_file = os.path.join(directory, 'comments.cols')
+        comments.to_csv(csv_file)
+        comments.to_columns(columns_file)
+        print(f"{arguments.comments} comments: {os.path.getsize(csv_file) / 2 ** 20:.1f} MiB as CSV, "
+              f"{os.path.getsize(columns_file) / 2 ** 20:.1f} MiB as columns")
+
+        for limit in arguments.limits:
+            limit = limit or None
+            runs = {
+                'pandas': lambda: read_with_pandas(csv_file, limit),
+                'csv': lambda: CommentCollection.from_csv(csv_file, limit),
+                'columns': lambda: CommentCollection.from_columns(columns_file, limit),
+                'columns, votes only': lambda: CommentCollection.from_columns(columns_file, limit, ['votes']),
+            }
+            expected = list(CommentCollection.from_csv(csv_file, limit))
+            if list(CommentCollection.from_columns(columns_file, limit)) != expected:
+                raise AssertionError('The columnar dataset differs from the CSV file')
+
+            print(f"{limit or 'All'} rows:")
+            for name, func in runs.items():
+                print(f"    {name}: {measure(func, arguments.repeat) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
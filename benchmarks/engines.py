@@ -0,0 +1,128 @@
+"""
+Stand-ins for the TTS engines, the browser recorder and ffmpeg, so the pipeline can be benchmarked offline.
+
+The fakes write small but real files where the stages expect them, so journaling, caching and the later stages
+behave as in a real run. Audio is written as WAV data, whatever the extension of the file.
+"""
+import math
+import os
+import shutil
+import struct
+import time
+import types
+import wave
+
+SAMPLE_RATE = 8000
+WORDS_PER_SECOND = 2.5
+CHUNK_SIZE = 200
+
+
+def speech_duration(text):
+    """Return how long reading a text out loud takes, in seconds."""
+    return max(1.0, len(str(text).split()) / WORDS_PER_SECOND)
+
+
+def write_sine_wave(output_file, duration, frequency=440.0):
+    """Write a mono 16-bit sine wave of the given duration."""
+    frame_count = int(duration * SAMPLE_RATE)
+    period = [int(8000 * math.sin(2 * math.pi * frequency * i / SAMPLE_RATE)) for i in range(SAMPLE_RATE)]
+    samples = struct.pack(f'<{SAMPLE_RATE}h', *period)
+
+    with wave.open(output_file, 'wb') as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(SAMPLE_RATE)
+        for _ in range(frame_count // SAMPLE_RATE):
+            file.writeframes(samples)
+        file.writeframes(samples[:(frame_count % SAMPLE_RATE) * 2])
+
+
+def read_wave_duration(file_path):
+    """Return the duration of a file written by sine_tts, or 10 seconds if it is missing, like get_mp3_length_v2."""
+    if not os.path.exists(file_path):
+        return 10
+    with wave.open(file_path, 'rb') as file:
+        return file.getnframes() / file.getframerate()
+
+
+def sine_tts(latency=0.0):
+    """
+    Return a TTS engine that reads every text as a sine wave.
+
+    :param latency: The time spent per chunk of text, like a TTS request or model inference.
+    :return A function called like generate_audio_mozilla_tts, ``tts(text, output_file)``.
+    """
+    def generate_audio(text, output_file, *args, **kwargs):
+        chunks = max(1, math.ceil(len(str(text)) / CHUNK_SIZE))
+        time.sleep(latency * chunks)
+        write_sine_wave(output_file, speech_duration(text))
+
+    return generate_audio
+
+
+def sine_tts_model(call_latency=0.0, char_latency=0.0):
+    """
+    Return a stand-in for the Coqui TTS class, whose models read every text as a sine wave.
+
+    :param call_latency: The time spent per call, like the fixed cost of a forward pass of the model.
+    :param char_latency: The time spent per character of text.
+    :return A class created like ``TTS(model_name=..., progress_bar=..., gpu=...)``, with the tts and tts_to_file
+        methods and the output sample rate of the synthesizer.
+    """
+    class SineTTSModel:
+        synthesizer = types.SimpleNamespace(output_sample_rate=SAMPLE_RATE)
+
+        def __init__(self, model_name=None, progress_bar=True, gpu=False):
+            self.model_name = model_name
+
+        def tts(self, text):
+            time.sleep(call_latency + char_latency * len(text))
+            frame_count = int(speech_duration(text) * SAMPLE_RATE)
+            return [0.25 * math.sin(2 * math.pi * 440.0 * i / SAMPLE_RATE) for i in range(frame_count)]
+
+        def tts_to_file(self, text, file_path):
+            time.sleep(call_latency + char_latency * len(text))
+            write_sine_wave(file_path, speech_duration(text))
+
+    return SineTTSModel
+
+
+def sine_gtts(latency=0.0):
+    """Return a sine wave TTS engine called like generate_audio_gtts, ``gtts(text, output_file, language)``."""
+    generate_audio = sine_tts(latency)
+
+    def generate_audio_gtts(text, output_file, language='en', *args, **kwargs):
+        generate_audio(text, output_file)
+
+    return generate_audio_gtts
+
+
+def static_frame_recorder(latency=0.0):
+    """
+    Return a recorder that writes a single static frame instead of recording the browser.
+
+    :param latency: The time spent per second of video, 1.0 records in real time like the real recorder.
+    :return A function called like record_html, ``record(path, output, duration)``.
+    """
+    def record(path, output, duration, *args, **kwargs):
+        time.sleep(latency * (duration or 0))
+        with open(output, 'wb') as file:
+            file.write(b'\x00' * 1024)
+
+    return record
+
+
+def null_muxer(input_video, input_audio, output_video):
+    """Stand in for combine_video_audio by copying the video."""
+    shutil.copyfile(input_video, output_video)
+
+
+def null_concatenate(directory, output_file):
+    """Stand in for concatenate_videos by writing an empty video."""
+    open(output_file, 'wb').close()
+
+
+def null_store_metadata(folder_path):
+    """Stand in for store_metadata when ffprobe is not installed."""
+    with open(os.path.join(folder_path, 'metadata.json'), 'w') as file:
+        file.write('[]')
@@ -0,0 +1,99 @@
+"""
+Measure how fast the comment fetcher loads large synthetic threads from the local stand-in Reddit server.
+
+Usage:
+    python benchmarks/fetch.py [--comments 10000 50000] [--workers 1 8] [--latency 0.05] [--rate-limit 100]
+                               [--save results.json] [--baseline results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from src.reddit.comment_fetcher import AdaptiveRateLimiter, CommentFetcher, all_comments  # noqa: E402
+from src.reddit.fake_reddit import FakeReddit, synthetic_thread  # noqa: E402
+
+
+def measure_fetch(comments, workers, latency, rate_limit, repeat):
+    """
+    Fetch a synthetic thread and return the median time, the comments per second and the requests it took.
+
+    :rtype dict
+    """
+    thread = synthetic_thread(comments)
+    times = []
+    with FakeReddit(thread, latency=latency, rate_limit=rate_limit) as fake_reddit:
+        for _ in range(repeat):
+            fetcher = CommentFetcher(fake_reddit.base_url, workers=workers,
+                                     rate_limiter=AdaptiveRateLimiter(rate=rate_limit or 1000,
+                                                                      max_rate=rate_limit or 1000))
+            start = time.perf_counter()
+            fetched = all_comments(fetcher.fetch_comments(fake_reddit.post_url))
+            times.append(time.perf_counter() - start)
+            if len(fetched) != comments:
+                raise AssertionError(f"Fetched {len(fetched)} of {comments} comments")
+
+    elapsed = sorted(times)[len(times) // 2]
+    return {
+        'comments': comments,
+        'workers': workers,
+        'time': elapsed,
+        'comments_per_second': comments / elapsed,
+        'requests': fetcher.request_count,
+        'refused': fake_reddit.refused_count,
+    }
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Return the runs whose throughput dropped by more than the tolerance against the baseline."""
+    regressions = []
+    for key, result in results.items():
+        previous = baseline.get(key)
+        if previous and result['comments_per_second'] < previous['comments_per_second'] * (1 - tolerance):
+            regressions.append(f"{key}: {previous['comments_per_second']:.0f} -> "
+                               f"{result['comments_per_second']:.0f} comments per second")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the comment fetcher against the stand-in Reddit server.')
+    parser.add_argument('--comments', type=int, nargs='+', default=[10000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds every request takes.')
+    parser.add_argument('--rate-limit', type=float, help='Requests the server accepts per second.')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--save', help='Save the results to this JSON file.')
+    parser.add_argument('--baseline', help='Compare the results with this JSON file.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown against the baseline.')
+    arguments = parser.parse_args()
+
+    results = {}
+    for comments in arguments.comments:
+        for workers in arguments.workers:
+            key = f'{comments} comments/{workers} workers'
+            results[key] = measure_fetch(comments, workers, arguments.latency, arguments.rate_limit,
+                                         arguments.repeat)
+            result = results[key]
+            print(f"{key}: {result['time']:.2f} s, {result['comments_per_second']:.0f} comments per second, "
+                  f"{result['requests']} requests, {result['refused']} refused")
+
+    if arguments.save:
+        with open(arguments.save, 'w') as file:
+            json.dump(results, file, indent=4)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            regressions = compare_with_baseline(results, json.load(file), arguments.tolerance)
+        if regressions:
+            print('Regressions against the baseline:')
+            for regression in regressions:
+                print(f'    {regression}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
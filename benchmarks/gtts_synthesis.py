@@ -0,0 +1,70 @@
+"""
+Measure how fast gTTS audio is synthesized against the local stand-in of the gTTS endpoint.
+
+Every comment is synthesized with generate_audio_gtts through a client shared by the comments, like the audio stage
+does. With one worker, the chunks are sent one after the other, like gTTS itself sends them.
+
+Usage:
+    python benchmarks/gtts_synthesis.py [--comments 10] [--workers 1 4 8] [--latency 0.2] [--rate-limit 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from src.audio_generation.fake_gtts import FakeGoogleTTS  # noqa: E402
+from src.audio_generation.generate_audio import generate_audio_gtts, split_text_into_phrases  # noqa: E402
+from src.audio_generation.gtts_client import GTTSClient  # noqa: E402
+from src.reddit.fake_reddit import synthetic_thread  # noqa: E402
+
+
+def measure_gtts(texts, workers, latency, rate_limit):
+    """
+    Synthesize the texts and return the time, the chunks per second and the requests it took.
+
+    :rtype dict
+    """
+    chunks = sum(len(split_text_into_phrases(text, 50, 200)) for text in texts)
+    with FakeGoogleTTS(latency=latency, rate_limit=rate_limit) as fake_gtts, \
+            GTTSClient(fake_gtts.base_url, workers=workers, rate=rate_limit, max_retries=10) as client, \
+            tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        with redirect_stdout(StringIO()):
+            for i, text in enumerate(texts):
+                generate_audio_gtts(text, os.path.join(directory, f'comment_{i}.mp3'), 'en', gtts_client=client)
+        elapsed = time.perf_counter() - start
+
+    return {
+        'workers': workers,
+        'time': elapsed,
+        'chunks_per_second': chunks / elapsed,
+        'requests': fake_gtts.request_count,
+        'refused': fake_gtts.refused_count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure gTTS synthesis against the stand-in gTTS endpoint.')
+    parser.add_argument('--comments', type=int, default=10)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds every request takes.')
+    parser.add_argument('--rate-limit', type=float, help='Requests the endpoint accepts per second.')
+    arguments = parser.parse_args()
+
+    # The longest comments of a synthetic thread, which are split into several chunks
+    thread = synthetic_thread(2000)
+    texts = sorted((comment['body'] for comment in thread.values()), key=len, reverse=True)[:arguments.comments]
+    for workers in arguments.workers:
+        result = measure_gtts(texts, workers, arguments.latency, arguments.rate_limit)
+        print(f"{workers} workers: {result['time']:.2f} s, {result['chunks_per_second']:.1f} chunks per second, "
+              f"{result['requests']} requests, {result['refused']} refused")
+
+
+if __name__ == '__main__':
+    main()
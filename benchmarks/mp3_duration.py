@@ -0,0 +1,80 @@
+"""
+Compare getting the duration of the speech of a comment by decoding its MP3 file and from its headers.
+
+    decode      ffmpeg decodes the whole file to PCM, as pydub does for AudioSegment.from_mp3
+    headers     the Xing/Info tag, or every frame header of files without one, is read by read_duration
+    index       the duration is read again from the DurationIndex, as by the recorder after the artifact cache
+
+Every length is measured as a file with a LAME tag, as written by the audio assembler, and as the chunks of gTTS,
+MP3 files of about 200 characters one after the other.
+
+Usage:
+    python benchmarks/mp3_duration.py [--minutes 1 5 20] [--repeat 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from src.video.mp3_duration import DurationIndex, read_duration  # noqa: E402
+
+# The speech of a chunk of 200 characters
+CHUNK_SECONDS = 12
+
+
+def encode_mp3(file_path, seconds, *options):
+    subprocess.run(['ffmpeg', '-loglevel', 'error', '-y', '-f', 'lavfi', '-i', f"anoisesrc=duration={seconds}",
+                    '-ar', '24000', '-ac', '1', *options, file_path], check=True)
+
+
+def write_files(directory, minutes):
+    """Write the speech of a comment as one tagged file and as concatenated gTTS chunks."""
+    tagged_path = os.path.join(directory, 'tagged.mp3')
+    encode_mp3(tagged_path, minutes * 60)
+    chunk_path = os.path.join(directory, 'chunk.mp3')
+    encode_mp3(chunk_path, CHUNK_SECONDS, '-b:a', '32k')
+    concatenated_path = os.path.join(directory, 'concatenated.mp3')
+    with open(chunk_path, 'rb') as chunk, open(concatenated_path, 'wb') as file:
+        file.write(chunk.read() * int(minutes * 60 / CHUNK_SECONDS))
+    return {'tagged': tagged_path, 'gtts': concatenated_path}
+
+
+def decode_duration(file_path):
+    samples = subprocess.run(['ffmpeg', '-loglevel', 'error', '-i', file_path, '-f', 's16le', '-'],
+                             capture_output=True, check=True).stdout
+    return len(samples) / 2 / 24000
+
+
+def timed(function, file_path, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        duration = function(file_path)
+    return (time.perf_counter() - start) / repeat, duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare decoding MP3 files and reading their headers.')
+    parser.add_argument('--minutes', type=float, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args()
+
+    for minutes in arguments.minutes:
+        with tempfile.TemporaryDirectory() as directory:
+            for name, file_path in write_files(directory, minutes).items():
+                index = DurationIndex()
+                index.duration(file_path)
+                decode_time, decoded = timed(decode_duration, file_path, arguments.repeat)
+                header_time, duration = timed(read_duration, file_path, arguments.repeat)
+                index_time, _ = timed(index.duration, file_path, arguments.repeat)
+                print(f"{minutes:4.0f} min {name:6s}: decode {decode_time * 1000:8.1f} ms, "
+                      f"headers {header_time * 1000:6.2f} ms ({decode_time / header_time:.0f}x), "
+                      f"index {index_time * 1000:.3f} ms, duration {duration:.3f} s vs {decoded:.3f} s decoded")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare reducing the noise of long speech with noisereduce over the whole signal and with a NoiseReducer.
+
+    whole       the samples are copied out of the AudioSegment and denoised in one call, estimating the noise of
+                the recording on its own, as reduce_noise did
+    reducer     the samples are read from the raw buffer and denoised in overlapping blocks over a pool of
+                processes, against the noise profile taken from the first clip
+
+Usage:
+    python benchmarks/noise_reduction.py [--minutes 1 5 20] [--workers 0 2 4] [--sample-rate 22050]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from src.audio_generation.noise_processing import NoiseReducer, segment_samples  # noqa: E402
+
+
+def noisy_segment(minutes, sample_rate):
+    """Return an AudioSegment of tones switched on and off over a noise floor."""
+    from pydub import AudioSegment
+
+    random = np.random.default_rng(0)
+    time_axis = np.arange(int(minutes * 60 * sample_rate)) / sample_rate
+    samples = 0.3 * np.sin(2 * np.pi * 220 * time_axis) * (np.sin(2 * np.pi * 1.3 * time_axis) > 0)
+    samples += 0.01 * random.standard_normal(len(time_axis))
+    return AudioSegment((samples * 32767).astype('<i2').tobytes(), sample_width=2, frame_rate=sample_rate, channels=1)
+
+
+def reduce_whole(segment):
+    import noisereduce as nr
+
+    samples = np.array(segment.get_array_of_samples())
+    reduced = nr.reduce_noise(y=samples, sr=segment.frame_rate)
+    return segment._spawn(reduced.astype(samples.dtype).tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare reducing noise over the whole signal and in blocks.')
+    parser.add_argument('--minutes', type=float, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 2, 4])
+    parser.add_argument('--sample-rate', type=int, default=22050)
+    arguments = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs")
+    for minutes in arguments.minutes:
+        segment = noisy_segment(minutes, arguments.sample_rate)
+        start = time.perf_counter()
+        reduce_whole(segment)
+        times = [f"whole {time.perf_counter() - start:.2f} s"]
+
+        for workers in arguments.workers:
+            with NoiseReducer(workers, mp_context=multiprocessing.get_context('fork')) as noise_reducer:
+                # The profile is taken from the reference clip and the workers are started by the first long clip
+                reference = segment[:5000]
+                noise_reducer.reduce_segment(segment[:60000], 'model',
+                                             lambda: (segment_samples(reference)[0][0] / 32768, reference.frame_rate))
+                start = time.perf_counter()
+                noise_reducer.reduce_segment(segment, 'model')
+                times.append(f"reducer with {workers} workers {time.perf_counter() - start:.2f} s")
+        print(f"{minutes:5.1f} min: {', '.join(times)}")
+
+
+if __name__ == '__main__':
+    main()
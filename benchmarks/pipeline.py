@@ -0,0 +1,257 @@
+"""
+Measure the throughput of the pipeline offline, against the sample threads and synthetic threads.
+
+Every run drives main() with tracing enabled, so the per-stage latencies come from the spans of its trace. The TTS
+engines, the recorder and ffmpeg are replaced by the stand-ins in engines.py, unless --real selects the real ones.
+
+Usage:
+    python benchmarks/pipeline.py [--datasets samples synthetic:10000] [--profile html|audio|video|full]
+                                  [--real tts recorder muxer] [--save results.json] [--baseline results.json]
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+import toml
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import engines  # noqa: E402
+from startup import profile_configuration, PROFILES  # noqa: E402
+
+ENGINES = ['tts', 'recorder', 'muxer']
+
+WORDS = ('the of and to a in that is was he for it with as his on be at by had are but from or have an they which '
+         'one you were all her she there would their we him been has when who will no more if out so up said what '
+         'its about than into them can only other time new some could these two may first then do any like my now '
+         'over such our man me even most made after also did many off before must well back through years much '
+         'where your way down should because long each just state people those too how little good very make world '
+         'still see own work men day get here old life both between under last never us while might great upon '
+         'same another know just why house thing every take believe video comment reddit president fingers').split()
+
+
+def synthetic_comments(count, seed=0):
+    """
+    Return a synthetic thread of comments, with the mix of short and long comments and replies of a real thread.
+
+    :param count: The number of comments.
+    :param seed: The seed of the random generator, so that every run benchmarks the same thread.
+    :rtype CommentCollection
+    """
+    from src.reddit.comments import CommentCollection
+
+    generator = random.Random(seed)
+    records = []
+    for i in range(count):
+        length = min(400, max(3, int(generator.lognormvariate(3.5, 1.0))))
+        records.append({
+            'author': f'user{generator.randrange(count)}',
+            'votes': int(generator.paretovariate(1.2) * 10),
+            'comment': ' '.join(generator.choice(WORDS) for _ in range(length)).capitalize() + '.',
+            'indent': 0 if i == 0 else generator.choice([0, 0, 1, 1, 2, 3]),
+        })
+    return CommentCollection.from_records(records)
+
+
+def load_dataset(name):
+    """
+    Load a dataset by name: 'synthetic:<count>' or the path of a CSV of comments.
+
+    :rtype CommentCollection
+    """
+    from src.reddit.comments import CommentCollection
+
+    if name.startswith('synthetic:'):
+        return synthetic_comments(int(name.split(':', 1)[1]))
+    return CommentCollection.from_csv(name)
+
+
+def expand_datasets(names):
+    """Replace 'samples' by every CSV of the samples directory."""
+    datasets = []
+    for name in names:
+        if name == 'samples':
+            datasets.extend(sorted(glob.glob(os.path.join('samples', '*.csv'))))
+        else:
+            datasets.append(name)
+    return datasets
+
+
+def percentile(values, fraction):
+    """Return a percentile of a list of values, with the nearest-rank method."""
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, int(round(fraction * len(values) + 0.5)) - 1))]
+
+
+def stage_latencies(trace_file):
+    """
+    Return the latency percentiles of every stage of a trace, in seconds.
+
+    :rtype dict
+    """
+    with open(trace_file) as file:
+        events = json.load(file)['traceEvents']
+
+    durations = {}
+    for event in events:
+        if event['ph'] == 'X' and event.get('cat') == 'stage':
+            durations.setdefault(event['name'], []).append(event['dur'] / 1e6)
+
+    return {name: {'count': len(values), 'p50': percentile(values, 0.5), 'p90': percentile(values, 0.9),
+                   'p99': percentile(values, 0.99)}
+            for name, values in durations.items()}
+
+
+def engine_patches(real, tts_latency, record_latency):
+    """Return the patches that replace every engine that is not in ``real`` by its stand-in."""
+    patches = []
+    if 'tts' not in real:
+        patches.append(patch('src.cli.inputs.generate_audio_gtts', engines.sine_gtts(tts_latency)))
+        patches.append(patch('src.cli.inputs.generate_audio_mozilla_tts', engines.sine_tts(tts_latency)))
+        patches.append(patch('src.video.record_html.get_mp3_length_v2', engines.read_wave_duration))
+    if 'recorder' not in real:
+        patches.append(patch('src.video.record_html.record_html', engines.static_frame_recorder(record_latency)))
+    if 'muxer' not in real:
+        patches.append(patch('src.cli.inputs.combine_video_audio', engines.null_muxer))
+        patches.append(patch('main.concatenate_videos', engines.null_concatenate))
+    if shutil.which('ffprobe') is None:
+        patches.append(patch('main.store_metadata', engines.null_store_metadata))
+    return patches
+
+
+def run_once(configuration, comments, patches):
+    """
+    Run main() once in a temporary output directory.
+
+    :return The wall time of the run and the latencies of its stages.
+    """
+    import main
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        with contextlib.ExitStack() as stack:
+            for engine_patch in patches:
+                stack.enter_context(engine_patch)
+            stack.enter_context(patch('main.get_configuration', return_value=configuration))
+            stack.enter_context(patch('main.create_output_directory', return_value=output_dir))
+            stack.enter_context(patch('main.get_comments', return_value=(comments, True)))
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+
+            start = time.perf_counter()
+            main.main(['--trace'])
+            wall_time = time.perf_counter() - start
+
+        return wall_time, stage_latencies(os.path.join(output_dir, 'trace.json'))
+
+
+def benchmark(configuration, comments, patches, repeat):
+    """
+    Benchmark a dataset, keeping the median wall time and the latencies of the median run.
+
+    :rtype dict
+    """
+    runs = sorted((run_once(configuration, comments, patches) for _ in range(repeat)), key=lambda run: run[0])
+    wall_time, stages = runs[len(runs) // 2]
+    return {
+        'comments': len(comments),
+        'wall_time': wall_time,
+        'comments_per_minute': len(comments) / wall_time * 60 if wall_time else 0,
+        'wall_times': [run[0] for run in runs],
+        'stages': stages
+    }
+
+
+def compare_with_baseline(results, baseline, tolerance, min_latency=0.001):
+    """
+    Return the regressions against a baseline: lower throughput, or a slower p90 of a stage.
+
+    Stages faster than ``min_latency`` seconds are too noisy to compare.
+    """
+    regressions = []
+    for key, result in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        if result['comments_per_minute'] < previous['comments_per_minute'] * (1 - tolerance):
+            regressions.append(f"{key}: {previous['comments_per_minute']:.0f} -> "
+                               f"{result['comments_per_minute']:.0f} comments per minute")
+        for stage, latencies in result['stages'].items():
+            previous_p90 = previous.get('stages', {}).get(stage, {}).get('p90')
+            if previous_p90 is None or max(previous_p90, latencies['p90']) < min_latency:
+                continue
+            if latencies['p90'] > previous_p90 * (1 + tolerance):
+                regressions.append(f"{key}: {stage} p90 {previous_p90 * 1000:.1f} -> "
+                                   f"{latencies['p90'] * 1000:.1f} ms")
+    return regressions
+
+
+def print_result(key, result):
+    print(f"{key}: {result['comments']} comments in {result['wall_time']:.2f} s, "
+          f"{result['comments_per_minute']:.0f} comments per minute")
+    for stage, latencies in sorted(result['stages'].items()):
+        print(f"    {stage:>14}: p50 {latencies['p50'] * 1000:9.2f} ms, p90 {latencies['p90'] * 1000:9.2f} ms, "
+              f"p99 {latencies['p99'] * 1000:9.2f} ms ({latencies['count']} spans)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the throughput of the pipeline offline.')
+    parser.add_argument('--config', default=os.path.join(ROOT_DIR, 'config.toml'))
+    parser.add_argument('--datasets', nargs='+', default=['samples', 'synthetic:10000'],
+                        help="CSV files of comments, 'samples' for every sample thread, 'synthetic:<count>'.")
+    parser.add_argument('--profile', default='full', choices=list(PROFILES))
+    parser.add_argument('--real', nargs='*', default=[], choices=ENGINES,
+                        help='Use the real engines instead of their stand-ins.')
+    parser.add_argument('--tts-latency', type=float, default=0.0, help='Seconds per chunk of the fake TTS.')
+    parser.add_argument('--record-latency', type=float, default=0.0,
+                        help='Seconds per second of video of the fake recorder, 1.0 is real time.')
+    parser.add_argument('--cache', action='store_true', help='Keep the artifact cache enabled.')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--save', help='Save the results to this JSON file.')
+    parser.add_argument('--baseline', help='Compare the results with this JSON file.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown against the baseline.')
+    arguments = parser.parse_args()
+
+    # Templates and samples are found relative to the root of the repository
+    os.chdir(ROOT_DIR)
+    with open(arguments.config) as file:
+        configuration = profile_configuration(toml.load(file), arguments.profile)
+    configuration['data_source'].update({'samples': True, 'comments_qty': 0})
+    configuration.setdefault('cache', {})['enabled'] = arguments.cache
+    if 'recorder' not in arguments.real:
+        # Patches do not reach the recorder processes, the stand-in records in the pipeline threads
+        configuration.setdefault('pipeline', {})['video_workers'] = 1
+
+    patches = engine_patches(arguments.real, arguments.tts_latency, arguments.record_latency)
+
+    results = {}
+    for dataset in expand_datasets(arguments.datasets):
+        key = f'{os.path.basename(dataset)}/{arguments.profile}'
+        results[key] = benchmark(configuration, load_dataset(dataset), patches, arguments.repeat)
+        print_result(key, results[key])
+
+    if arguments.save:
+        with open(arguments.save, 'w') as file:
+            json.dump(results, file, indent=4)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            regressions = compare_with_baseline(results, json.load(file), arguments.tolerance)
+        if regressions:
+            print('Regressions against the baseline:')
+            for regression in regressions:
+                print(f'    {regression}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Measure the cold start of main.py for every configuration profile.
+
+Every measurement runs in a fresh interpreter that imports main, the stages the profile enables and the engines
+those stages import on their first call (TTS, moviepy, selenium), which is what `python main.py` pays before the
+first comment is processed.
+
+Usage:
+    python benchmarks/startup.py [--repeat 5] [--save results.json] [--baseline results.json] [--tolerance 0.2]
+"""
+import argparse
+import copy
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import toml
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+PROFILES = {
+    'html': {'html_generation': {'enabled': True}, 'audio_generation': {'enabled': False},
+             'video_generation': {'enabled': False}, 'combining': {'enabled': False}},
+    'audio': {'html_generation': {'enabled': False}, 'audio_generation': {'enabled': True},
+              'video_generation': {'enabled': False}, 'combining': {'enabled': False}},
+    'video': {'html_generation': {'enabled': True}, 'audio_generation': {'enabled': False},
+              'video_generation': {'enabled': True}, 'combining': {'enabled': False}},
+    'full': {'html_generation': {'enabled': True}, 'audio_generation': {'enabled': True},
+             'video_generation': {'enabled': True}, 'combining': {'enabled': True}},
+}
+
+STARTUP_SNIPPET = """
+import json, resource, sys, time
+start = time.perf_counter()
+import main
+from src.cli.stages import enabled_stages, load_engines, load_stage
+configuration = json.loads(sys.argv[1])
+for stage in enabled_stages(configuration):
+    load_stage(stage)
+    load_engines(stage)
+print(json.dumps({'import_time': time.perf_counter() - start,
+                  'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+
+def profile_configuration(configuration, profile):
+    """Apply the overrides of a profile to a copy of the configuration."""
+    configuration = copy.deepcopy(configuration)
+    for section, values in PROFILES[profile].items():
+        configuration.setdefault(section, {}).update(values)
+    return configuration
+
+
+def measure_startup(configuration, repeat):
+    """
+    Measure the cold start of a configuration in fresh interpreters.
+
+    :return The median wall time of the interpreter, the median import time and the peak RSS.
+    :rtype dict
+    """
+    wall_times, import_times, max_rss = [], [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', STARTUP_SNIPPET, json.dumps(configuration)],
+                                cwd=ROOT_DIR, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        wall_times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return {'error': result.stderr.strip().splitlines()[-1]}
+        measurement = json.loads(result.stdout.strip().splitlines()[-1])
+        import_times.append(measurement['import_time'])
+        max_rss.append(measurement['max_rss_mb'])
+
+    return {
+        'wall_time': statistics.median(wall_times),
+        'import_time': statistics.median(import_times),
+        'max_rss_mb': max(max_rss)
+    }
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Return the profiles whose cold start is slower than the baseline by more than the tolerance."""
+    regressions = []
+    for profile, result in results.items():
+        previous = baseline.get(profile)
+        if not previous or 'wall_time' not in previous or 'wall_time' not in result:
+            continue
+        if result['wall_time'] > previous['wall_time'] * (1 + tolerance):
+            regressions.append(profile)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the cold start of main.py per configuration profile.')
+    parser.add_argument('--config', default=os.path.join(ROOT_DIR, 'config.toml'))
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save', help='Save the results to this JSON file.')
+    parser.add_argument('--baseline', help='Compare the results with this JSON file.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown against the baseline.')
+    arguments = parser.parse_args()
+
+    with open(arguments.config) as file:
+        configuration = toml.load(file)
+
+    results = {}
+    for profile in arguments.profiles:
+        results[profile] = measure_startup(profile_configuration(configuration, profile), arguments.repeat)
+        result = results[profile]
+        if 'error' in result:
+            print(f"{profile:>6}: failed ({result['error']})")
+        else:
+            print(f"{profile:>6}: {result['wall_time'] * 1000:8.1f} ms wall, "
+                  f"{result['import_time'] * 1000:8.1f} ms imports, {result['max_rss_mb']:7.1f} MB RSS")
+
+    if arguments.save:
+        with open(arguments.save, 'w') as file:
+            json.dump(results, file, indent=4)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            regressions = compare_with_baseline(results, json.load(file), arguments.tolerance)
+        if regressions:
+            print(f"Cold start regressed for: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Compare the real-time factor of Coqui TTS synthesis per chunk and batched across comments.
+
+The real-time factor is the synthesis time divided by the duration of the synthesized speech, lower is faster. The
+chunks of a synthetic thread are synthesized by as many pipeline threads as comments synthesized at the same time:
+
+    in-process    every thread sends its chunks one after the other to the model shared by the process
+    per chunk     every thread sends its chunks one after the other to the warm TTS workers
+    queued        every thread queues all of its chunks at once, which the TTS server sends to the workers one by one
+    batched       every thread queues all of its chunks at once, which the TTS server sends to the workers in length
+                  buckets
+
+The model is the sine wave stand-in of engines.py, with a fixed cost per call and per character, unless --real
+loads the Coqui model.
+
+Usage:
+    python benchmarks/tts_batching.py [--comments 40] [--workers 2] [--threads 4] [--batch-size 16] [--real]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from unittest.mock import patch
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+import engines  # noqa: E402
+from pipeline import synthetic_comments  # noqa: E402
+
+
+def comment_chunks(comments):
+    """Return the chunks of text of every comment, as generate_audio_mozilla_tts splits them."""
+    from src.audio_generation.generate_audio import preprocess_text, split_text_into_chunks
+
+    return [split_text_into_chunks(preprocess_text(comment.comment)) for comment in comments]
+
+
+def synthesize_in_process(model_name, chunks):
+    from src.audio_generation.generate_audio import load_tts_model
+
+    tts = load_tts_model(model_name)
+    return [tts.tts_to_samples(chunk) for chunk in chunks]
+
+
+def synthesize_per_chunk(server, model_name, chunks):
+    return [server.synthesize(model_name, chunk) for chunk in chunks]
+
+
+def synthesize_queued(server, model_name, chunks):
+    return [future.result() for future in [server.submit(model_name, chunk) for chunk in chunks]]
+
+
+def measure(synthesize, chunks_by_comment, threads):
+    """
+    Synthesize the chunks of every comment with a pool of pipeline threads.
+
+    :return The wall time and the duration of the synthesized speech, in seconds.
+    :rtype tuple[float, float]
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        results = [future.result() for future in [executor.submit(synthesize, chunks)
+                                                  for chunks in chunks_by_comment]]
+    elapsed = time.perf_counter() - start
+
+    duration = sum(len(samples) / sample_rate for audio in results for samples, sample_rate in audio)
+    return elapsed, duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the real-time factor of per-chunk and batched TTS.')
+    parser.add_argument('--comments', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=2, help='TTS worker processes.')
+    parser.add_argument('--threads', type=int, default=4, help='Pipeline threads synthesizing comments.')
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--batch-wait', type=float, default=0)
+    parser.add_argument('--torch-threads', type=int, default=0)
+    parser.add_argument('--call-latency', type=float, default=0.02, help='Seconds per call of the stand-in model.')
+    parser.add_argument('--char-latency', type=float, default=0.0002,
+                        help='Seconds per character of the stand-in model.')
+    parser.add_argument('--real', action='store_true', help='Synthesize with the Coqui model instead.')
+    parser.add_argument('--model', default='tts_models/en/ljspeech/tacotron2-DDC')
+    arguments = parser.parse_args()
+
+    from src.audio_generation.tts_server import TTSServer
+
+    chunks_by_comment = comment_chunks(synthetic_comments(arguments.comments))
+    chunk_count = sum(len(chunks) for chunks in chunks_by_comment)
+    print(f"{arguments.comments} comments, {chunk_count} chunks, {arguments.threads} pipeline threads, "
+          f"{arguments.workers} TTS workers")
+
+    patches = []
+    # The stand-in model reaches the workers by forking, the real model is loaded by spawned workers
+    mp_context = multiprocessing.get_context('spawn')
+    if not arguments.real:
+        patches.append(patch('src.audio_generation.generate_audio.TTS',
+                             engines.sine_tts_model(arguments.call_latency, arguments.char_latency)))
+        mp_context = multiprocessing.get_context('fork')
+
+    for patcher in patches:
+        patcher.start()
+    try:
+        runs = {'in-process': (None, lambda server: partial(synthesize_in_process, arguments.model)),
+                'per chunk': (1, lambda server: partial(synthesize_per_chunk, server, arguments.model)),
+                'queued': (1, lambda server: partial(synthesize_queued, server, arguments.model)),
+                'batched': (arguments.batch_size, lambda server: partial(synthesize_queued, server, arguments.model))}
+        for name, (batch_size, make_synthesize) in runs.items():
+            server = None
+            if batch_size is not None:
+                server = TTSServer(arguments.workers, arguments.torch_threads, [arguments.model], mp_context,
+                                   batch_size, arguments.batch_wait)
+                # The workers load their models before the measurement
+                server.synthesize(arguments.model, 'Warm up.')
+            try:
+                elapsed, duration = measure(make_synthesize(server), chunks_by_comment, arguments.threads)
+            finally:
+                if server is not None:
+                    server.shutdown()
+            print(f"{name:>12}: {elapsed:7.2f} s for {duration:7.1f} s of speech, "
+                  f"real-time factor {elapsed / duration:.4f}")
+    finally:
+        for patcher in patches:
+            patcher.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,67 +1,346 @@
+import argparse
+import json
 import os
-from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 from src.audio_generation.audio_collection import collect_audio_files
+from src.audio_generation.tts_server import create_tts_server, tts_model_name
+from src.cache.artifact_cache import cached_task, audio_artifact_key, video_artifact_key, combined_artifact_key, \
+    evict_artifacts
 from src.cli.configuration import get_configuration
-from src.cli.converters import convert_data_to_dataframe
-from src.cli.inputs import generate_audio_files, record_videos, combine_video_audio_task, get_comments, \
-    create_output_directory
-from src.html.generate_html import generate_html
+from src.cli.governor import DEFAULT_ESTIMATES_MB, create_governor, governed_task, print_admission_report
+from src.cli.converters import convert_data_to_comments
+from src.cli.batch import SharedResources, read_jobs, run_batch, new_run_id
+from src.cli.inputs import get_comments, create_output_directory, stream_comments, comments_complete, is_streaming
+from src.cli.journal import journaled_task, read_journal
+from src.cli.pipeline import Stage, run_pipeline, limited_task, raise_for_errors
+from src.cli.stages import enabled_stages, lazy_function, load_stage
+from src.reddit.comments import CommentCollection
+from src.tracing.trace import start_tracing, stop_tracing, trace_span, traced_task
 from src.video.combine_videos import concatenate_videos
+from src.video.recorder_pool import create_recorder_pool, run_in_pool
 from src.video.store_metadata import store_metadata
 
+# The gTTS client imports requests and gTTS, which runs without audio or with Coqui TTS do not need, the phrase
+# cache imports numpy, which runs without audio do not need, and the noise reducer imports noisereduce and pydub
+create_gtts_client = lazy_function('src.audio_generation.gtts_client', 'create_gtts_client')
+create_noise_reducer = lazy_function('src.audio_generation.noise_processing', 'create_noise_reducer')
+create_phrase_cache = lazy_function('src.cache.phrase_cache', 'create_phrase_cache')
+save_phrase_cache_report = lazy_function('src.cache.phrase_cache', 'save_phrase_cache_report')
 
-def main():
-    output_dir = create_output_directory()
 
-    configuration = get_configuration('./config.toml', output_dir)
+def parse_arguments(args=None):
+    parser = argparse.ArgumentParser(description='Render the top comments of a Reddit post into a video.')
+    parser.add_argument('--resume', metavar='OUTPUT_DIR',
+                        help='Resume an interrupted run, redoing only its missing or corrupt artifacts.')
+    parser.add_argument('--batch', metavar='QUEUE_FILE',
+                        help='Render every post of a JSONL queue of jobs instead of the post in config.toml.')
+    parser.add_argument('--jobs', type=int,
+                        help='The number of batch jobs that run at the same time (default: [batch] workers).')
+    parser.add_argument('--trace', action='store_true',
+                        help='Save a Chrome trace of every stage (default: [tracing] enabled).')
+    return parser.parse_args(args)
 
-    data = get_comments(configuration)[:configuration['data_source']['comments_qty']]
 
-    print(data[:10])
+def main(args=None):
+    arguments = parse_arguments(args)
+    completed = {}
+
+    if arguments.batch:
+        return main_batch(arguments.batch, arguments.jobs, arguments.trace)
+
+    if arguments.resume:
+        output_dir = arguments.resume
+        if not os.path.isdir(output_dir):
+            raise FileNotFoundError(f"Output directory '{output_dir}' not found.")
+        completed = read_journal(output_dir)
+        print(f"Resuming {output_dir} with {len(completed)} completed stages in the journal")
+
+        # The interrupted run is resumed with its own configuration and comments
+        config_file = os.path.join(output_dir, 'updated_config.toml')
+        if not os.path.exists(config_file):
+            config_file = './config.toml'
+    else:
+        output_dir = create_output_directory()
+        config_file = './config.toml'
+
+    configuration = get_configuration(config_file, output_dir)
+
+    # The spans of every stage and subprocess are merged into output_dir/trace.json
+    tracing_enabled = arguments.trace or configuration.get('tracing', {}).get('enabled', False)
+    if tracing_enabled:
+        start_tracing(os.path.join(output_dir, 'trace'))
+
+    tts_server = None
+    try:
+        # The TTS workers load their models while the comments are fetched
+        tts_server = create_tts_server(configuration)
+
+        # Comments are loaded once and shared by every stage. The comments of an interrupted streaming run are streamed
+        # again, and the journaled stages of an index that now holds another comment are redone
+        comments_file = os.path.join(output_dir, 'comments.csv')
+        if arguments.resume and comments_complete(configuration['data_source'], comments_file):
+            comments = CommentCollection.from_csv(comments_file)
+        else:
+            comments = load_comments(configuration, output_dir)
+            if comments is None:
+                print("No comments to process.")
+                return
+
+        run(configuration, output_dir, comments, completed, tts_server=tts_server)
+    finally:
+        if tts_server is not None:
+            tts_server.shutdown()
+        if tracing_enabled:
+            print(f"Trace saved in {stop_tracing()}")
+
+
+def main_batch(queue_file, workers=None, trace=False):
+    """
+    Render every post of a JSONL queue of jobs, sharing TTS, browser and ffmpeg slots between the jobs.
+
+    :param queue_file: The path to the JSONL queue, see read_jobs.
+    :param workers: The number of jobs that run at the same time.
+    :param trace: Save a single Chrome trace of every job, even if tracing is disabled in the configuration.
+    :return The result of every job.
+    :rtype list[dict]
+    """
+    jobs = read_jobs(queue_file)
+    configuration = get_configuration('./config.toml')
+    pipeline_configuration = configuration.get('pipeline', {})
+    if workers is None:
+        workers = configuration.get('batch', {}).get('workers', 1)
+    batch_id = new_run_id()
+
+    # Tracing starts before the shared recorder processes, so that they trace too
+    tracing_enabled = trace or configuration.get('tracing', {}).get('enabled', False)
+    if tracing_enabled:
+        start_tracing(f'batch_{batch_id}_trace')
+
+    resources = SharedResources(audio_slots=pipeline_configuration.get('audio_workers', 1),
+                                video_slots=pipeline_configuration.get('video_workers', 1),
+                                ffmpeg_slots=pipeline_configuration.get('combining_workers', 2),
+                                governor=create_governor(configuration),
+                                tts_server=create_tts_server(configuration),
+                                gtts_client=create_gtts_client(configuration),
+                                noise_reducer=create_noise_reducer(configuration))
+
+    def run_job(job_configuration, output_dir):
+        comments = load_comments(job_configuration, output_dir)
+        if comments is None:
+            raise ValueError("No comments to process.")
+        run(job_configuration, output_dir, comments, resources=resources)
+
+    try:
+        results = run_batch(jobs, configuration, run_job, workers)
+    finally:
+        resources.shutdown()
+        if tracing_enabled:
+            print(f"Trace saved in {stop_tracing(f'batch_{batch_id}_trace.json')}")
+
+    if resources.governor is not None:
+        save_admission_report(resources.governor, f'batch_{batch_id}_admission.json')
+
+    summary_file = f'batch_{batch_id}.json'
+    with open(summary_file, 'w') as file:
+        json.dump(results, file, indent=4)
+
+    failed = [result['id'] for result in results if result['status'] != 'done']
+    print(f"{len(results) - len(failed)}/{len(results)} jobs done, summary saved in {summary_file}")
+    if failed:
+        print(f"Failed jobs: {', '.join(failed)}")
+
+    return results
+
+
+def load_comments(configuration, output_dir):
+    """
+    Load the comments of a run and keep a copy in its output directory, so the run can be resumed.
+
+    With streaming enabled, the comments fetched from Reddit are returned as a generator, which writes the copy
+    comment by comment.
+    """
+    data_source = configuration['data_source']
+    if is_streaming(data_source):
+        return stream_comments(data_source, os.path.join(output_dir, 'comments.csv'))
+
+    with trace_span('fetch', 'stage', source=configuration['data_source'].get('url')):
+        data, _ = get_comments(configuration)
+    if data is None:
+        return None
+    comments = convert_data_to_comments(data)[:configuration['data_source']['comments_qty'] or None]
+    comments.to_csv(os.path.join(output_dir, 'comments.csv'))
+    return comments
+
+
+def save_admission_report(governor, report_file):
+    """Print how long the stages waited for memory and save the report, to size the machines."""
+    report = governor.report()
+    print_admission_report(report)
+    with open(report_file, 'w') as file:
+        json.dump(report, file, indent=4)
+
+
+def run(configuration, output_dir, comments, completed=None, resources=None, tts_server=None):
+    """
+    Run the enabled stages for every comment.
+
+    :param configuration: The configuration of the run.
+    :param output_dir: The directory where the artifacts of the run are written.
+    :param comments: The comments to render, a CommentCollection or a generator of comments in rank order, which is
+        consumed while the stages run.
+    :param completed: The journal of an interrupted attempt of the run, when it is resumed.
+    :param resources: Resources shared with other runs of a batch.
+    :param tts_server: The TTS workers of the run, started by the caller so that they load their models while the
+        comments are fetched. The caller shuts them down. Without one, run starts and shuts down its own.
+    :return None
+    """
+    if isinstance(comments, CommentCollection):
+        print(comments[:10])
+        items = comments.items()
+    else:
+        # Every comment enters the stages as soon as it is fetched
+        items = enumerate(comments)
 
     extension = configuration['video_generation']['extension']
     tts_library = configuration['audio_generation']['tts_library']
     version = configuration['html_generation']['version']
     audio_collection_source = configuration['audio_collection']['source_folder']
+    pipeline_configuration = configuration.get('pipeline', {})
+    cache_configuration = configuration.get('cache', {})
+    cache_enabled = cache_configuration.get('enabled', False)
+    cache_dir = cache_configuration.get('directory', '.cache/artifacts')
 
-    html_generation_enabled = configuration['html_generation']['enabled']
-    video_generation_enabled = configuration['video_generation']['enabled']
-    audio_generation_enabled = configuration['audio_generation']['enabled']
-    combining_enabled = configuration['combining']['enabled']
     audio_collection_enabled = configuration['audio_collection']['enabled']
 
+    # Only the enabled stages are imported, with their heavy dependencies
+    stage_names = enabled_stages(configuration)
+
     combined_mp4 = None
-    if combining_enabled:
+    if 'combining' in stage_names:
         combined_mp4 = os.path.join(output_dir, f'output.{extension}')
 
-    # Generate audio files for comments
-    if audio_generation_enabled:
-        generate_audio_files(convert_data_to_dataframe(data), tts_library, output_dir)
-    elif audio_collection_enabled:
+    # Collected audio files have to be in place before any comment is recorded
+    if 'audio' not in stage_names and audio_collection_enabled:
         collect_audio_files(audio_collection_source, output_dir)
 
-    # Record videos for comments
-    if video_generation_enabled and html_generation_enabled:
-        record_videos(convert_data_to_dataframe(data), version, output_dir, extension)
-    elif html_generation_enabled:
-        for index, row in convert_data_to_dataframe(data).iterrows():
-            html_file = os.path.join(output_dir, f'comment_{index}.html')
-            generate_html(row, html_file, version)
+    def output_file(suffix):
+        return lambda index: os.path.join(output_dir, f'comment_{index}{suffix}')
+
+    # Heavy work is only admitted while it fits in the memory budget, shared with the other runs of a batch
+    if resources is not None:
+        governor = resources.governor
+    else:
+        governor = create_governor(configuration)
+
+    def wrap(func, name, stage, key_func, suffix, downstream=(), slots=None):
+        # Only the work itself is traced, so waits for a slot or for memory show up as gaps in the timeline
+        func = traced_task(func, name)
+        if governor is not None and name in DEFAULT_ESTIMATES_MB:
+            func = governed_task(func, governor, name)
+        # Work shared with the other runs of a batch waits for a free slot
+        if slots is not None:
+            func = limited_task(func, slots)
+        # Comments whose inputs did not change since a previous run are linked from the artifact cache
+        if cache_enabled and key_func is not None:
+            func = cached_task(func, cache_dir, key_func, output_file(suffix))
+        # Completed stages are journaled, so an interrupted run can be resumed
+        return journaled_task(func, output_dir, stage, output_file(suffix), completed, downstream)
+
+    # Each comment moves through its stages on its own, every stage with its own concurrency limit
+    stages = []
+    own_tts_server = gtts_client = phrase_cache = noise_reducer = None
+    if 'audio' in stage_names:
+        # Coqui models stay loaded in warm worker processes, shared with the other runs of a batch, and gTTS
+        # requests share the connections and the rate limit of a single client. The noise profile of every model is
+        # taken once and shared by all its comments
+        if resources is not None:
+            audio_server, audio_client = resources.tts_server, resources.gtts_client
+            audio_noise_reducer = resources.noise_reducer
+        else:
+            audio_server = tts_server
+            if audio_server is None:
+                audio_server = own_tts_server = create_tts_server(configuration)
+            audio_client = gtts_client = create_gtts_client(configuration)
+            audio_noise_reducer = noise_reducer = create_noise_reducer(configuration)
+        # Chunks of text read by any comment of any run are kept on disk, so repeated phrases are read only once
+        phrase_cache = create_phrase_cache(configuration)
+        noise_reduction = audio_noise_reducer is not None
+        # Comments are read by the first of the configured Coqui models, the one the TTS workers load first
+        model_name = tts_model_name(configuration)
+        key_model_name = model_name if tts_library != 'gtts' else None
+        audio_task = wrap(partial(load_stage('audio'), tts_library=tts_library, output_dir=output_dir,
+                                  tts_server=audio_server, gtts_client=audio_client, phrase_cache=phrase_cache,
+                                  noise_reducer=audio_noise_reducer, model_name=model_name),
+                          'audio', 'audio',
+                          lambda index, row: audio_artifact_key(row, tts_library, noise_reduction, key_model_name),
+                          '.mp3', ('mp4', 'with_audio'), resources and resources.audio_slots)
+        stages.append(Stage('audio', audio_task, pipeline_configuration.get('audio_workers', 1)))
+
+    recorder_pool = None
+    if 'video' in stage_names:
+        video_workers = pipeline_configuration.get('video_workers', 1)
+        video_task = partial(load_stage('video'), output_dir=output_dir, version=version, extension=extension)
+        if resources is not None:
+            if resources.recorder_pool is not None:
+                video_task = partial(run_in_pool, resources.recorder_pool, video_task)
+        elif video_workers > 1:
+            # Recordings capture the screen, so parallel ones each need their own virtual display
+            recorder_pool = create_recorder_pool(video_workers)
+            video_task = partial(run_in_pool, recorder_pool, video_task)
+        video_task = wrap(video_task, 'video', 'mp4',
+                          lambda index, row: video_artifact_key(row, version, extension, output_file('.mp3')(index)),
+                          f'.{extension}', ('with_audio',), resources and resources.video_slots)
+        stages.append(Stage('video', video_task, video_workers))
+    elif 'html' in stage_names:
+        html_task = wrap(partial(load_stage('html'), output_dir=output_dir, version=version), 'html', 'html', None,
+                         '.html')
+        stages.append(Stage('html', html_task, pipeline_configuration.get('html_workers', 1)))
+
+    if 'combining' in stage_names:
+        combining_task = wrap(partial(load_stage('combining'), output_dir=output_dir), 'combining', 'with_audio',
+                              lambda index, row: combined_artifact_key(output_file('.mp4')(index),
+                                                                       output_file('.mp3')(index)),
+                              '_with_audio.mp4', slots=resources and resources.ffmpeg_slots)
+        stages.append(Stage('combining', combining_task, pipeline_configuration.get('combining_workers', 2)))
+
+    try:
+        errors = run_pipeline(items, stages)
+    finally:
+        if recorder_pool is not None:
+            recorder_pool.shutdown()
+        if own_tts_server is not None:
+            own_tts_server.shutdown()
+        if gtts_client is not None:
+            gtts_client.close()
+        if noise_reducer is not None:
+            noise_reducer.close()
+        if governor is not None and resources is None:
+            governor.close()
+            save_admission_report(governor, os.path.join(output_dir, 'admission.json'))
+        if phrase_cache is not None:
+            save_phrase_cache_report(phrase_cache, os.path.join(output_dir, 'phrase_cache.json'))
+
+    # Failed comments would leave holes in the video, so the run fails instead of concatenating the others
+    raise_for_errors(errors)
 
-    # Combine video and audio files in parallel
-    if combining_enabled and audio_generation_enabled and video_generation_enabled:
-        with ThreadPoolExecutor() as executor:
-            futures = [executor.submit(combine_video_audio_task, index, row, output_dir) for index, row in
-                       convert_data_to_dataframe(data).iterrows()]
-            for future in futures:
-                future.result()  # Wait for all futures to complete
+    if cache_enabled:
+        evict_artifacts(cache_dir, cache_configuration.get('max_size_mb', 2048) * 1024 * 1024)
 
-    store_metadata(output_dir)
+    with trace_span('store_metadata', 'stage'):
+        store_metadata(output_dir)
 
     # Concatenate all the MP4 files into one
-    if combined_mp4 is not None and combining_enabled and audio_generation_enabled and video_generation_enabled:
-        concatenate_videos(os.path.join(output_dir), combined_mp4)
+    if combined_mp4 is not None:
+        if os.path.exists(combined_mp4):
+            # Left over from the interrupted attempt of a resumed run
+            os.remove(combined_mp4)
+        if resources is not None:
+            with resources.ffmpeg_slots, trace_span('concat', 'stage', output=combined_mp4):
+                concatenate_videos(os.path.join(output_dir), combined_mp4)
+        else:
+            with trace_span('concat', 'stage', output=combined_mp4):
+                concatenate_videos(os.path.join(output_dir), combined_mp4)
 
     print(f"Images and video saved in {output_dir}")
 
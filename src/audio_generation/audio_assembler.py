@@ -0,0 +1,79 @@
+"""
+Assemble the speech of the chunks of a text in memory, and encode it with a single encoder process.
+
+The samples of every chunk are copied once into a buffer that is preallocated for the whole text and doubled when
+it runs out, so assembling a long comment takes linear time, where appending pydub segments copies everything
+assembled so far on every chunk. The buffer is then streamed to one ffmpeg process as 16-bit PCM, without writing
+the chunks to disk and reading them back.
+"""
+import subprocess
+
+import numpy as np
+
+DEFAULT_SAMPLE_RATE = 22050
+# Bytes of PCM written to the encoder at a time
+ENCODE_BLOCK = 1 << 16
+
+
+class AudioAssembler:
+    """The mono samples of the chunks of a text, in chunk order."""
+
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, capacity=0):
+        """
+        :param sample_rate: The sample rate of every chunk.
+        :param capacity: The samples to preallocate, e.g. an estimate of the speech of the whole text.
+        """
+        self.sample_rate = sample_rate
+        self.buffer = np.empty(max(1, capacity), dtype=np.float32)
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def samples(self):
+        """The samples assembled so far, a view of the buffer."""
+        return self.buffer[:self.length]
+
+    @property
+    def duration(self):
+        """The duration of the samples assembled so far, in seconds."""
+        return self.length / self.sample_rate
+
+    def append(self, samples):
+        """Append the samples of a chunk, floats between -1 and 1."""
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        end = self.length + len(samples)
+        if end > len(self.buffer):
+            buffer = np.empty(max(end, 2 * len(self.buffer)), dtype=np.float32)
+            buffer[:self.length] = self.samples
+            self.buffer = buffer
+        self.buffer[self.length:end] = samples
+        self.length = end
+
+    def to_pcm16(self):
+        """Return the samples as little-endian 16-bit PCM."""
+        return (np.clip(self.samples, -1, 1) * 32767).astype('<i2')
+
+    def write_mp3(self, output_file):
+        """
+        Encode the samples to an MP3 file with ffmpeg, streaming them to its standard input.
+
+        :raises RuntimeError: if ffmpeg fails
+        """
+        command = ['ffmpeg', '-y', '-loglevel', 'error', '-f', 's16le', '-ar', str(self.sample_rate), '-ac', '1',
+                   '-i', 'pipe:0', '-f', 'mp3', output_file]
+        pcm = memoryview(self.to_pcm16()).cast('B')
+        # Only errors are logged, so stderr cannot fill up while the samples are written
+        with subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+            try:
+                for start in range(0, len(pcm), ENCODE_BLOCK):
+                    process.stdin.write(pcm[start:start + ENCODE_BLOCK])
+            except BrokenPipeError:
+                # ffmpeg exited early, its errors tell why
+                pass
+            finally:
+                process.stdin.close()
+            errors = process.stderr.read()
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg could not encode {output_file}: {errors.decode(errors='replace').strip()}")
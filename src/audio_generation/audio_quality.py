@@ -0,0 +1,165 @@
+"""
+Detect bad synthesized speech in memory, block by block, right after a chunk is synthesized.
+
+Tacotron models fail in recognizable ways: they stop attending to the text and go silent, get stuck on a sound, loop
+over the same syllables, or never stop. The checker follows the loudness of the samples in overlapping frames of about
+23 ms:
+
+    silence     a run of frames quieter than SILENCE_DB lasting more than MAX_SILENCE seconds
+    looping     LOOP_SECONDS of mostly loud frames, nearly all of them as loud as the frames one period earlier, for a
+                period between MIN_LOOP_PERIOD and MAX_LOOP_PERIOD seconds: a stuck sound repeats at every period,
+                a loop at its own
+    runaway     speech much longer than the text could take to read
+
+The frames of a block are checked at once with NumPy, for every period at a time, and only the latest frames and their
+matches are kept between blocks, so a chunk can be checked as it is produced.
+"""
+import numpy as np
+
+FRAME_SECONDS = 512 / 22050
+# Frames overlap, so a loop is found whatever its period
+HOP_SECONDS = 128 / 22050
+SILENCE_DB = -45.0
+MAX_SILENCE = 2.0
+# Loudness of matching frames differs by less than this
+LOOP_TOLERANCE_DB = 3.0
+LOOP_SECONDS = 1.5
+# The share of the frames of a loop matching, and the share of them that are loud
+LOOP_MATCHES = 0.95
+LOOP_LOUDNESS = 0.5
+MIN_LOOP_PERIOD = 0.15
+MAX_LOOP_PERIOD = 3.0
+# Reading a text takes about 0.07 seconds per character
+MAX_SECONDS_PER_CHARACTER = 0.25
+RUNAWAY_SLACK = 2.0
+
+
+class QualityChecker:
+    """Follows the loudness of the samples of a chunk, and finds the first problem in them."""
+
+    def __init__(self, sample_rate, characters=None):
+        """
+        :param sample_rate: The sample rate of the samples.
+        :param characters: The length of the text of the chunk, to detect runaway speech. Not checked if None.
+        """
+        self.sample_rate = sample_rate
+        self.frame_size = max(1, round(FRAME_SECONDS * sample_rate))
+        self.hop_size = max(1, round(HOP_SECONDS * sample_rate))
+        hop_seconds = self.hop_size / sample_rate
+        self.max_silent_frames = int(MAX_SILENCE / hop_seconds)
+        self.lags = np.arange(max(1, int(MIN_LOOP_PERIOD / hop_seconds)), int(MAX_LOOP_PERIOD / hop_seconds) + 1)
+        self.max_samples = None
+        if characters is not None:
+            self.max_samples = int((characters * MAX_SECONDS_PER_CHARACTER + RUNAWAY_SLACK) * sample_rate)
+
+        self.pending = np.empty(0, dtype=np.float32)
+        self.samples = 0
+        self.silent_run = 0
+        # The loudness of the latest frames, as far back as the longest period, and the matches of the latest window
+        self.history = np.full(self.lags[-1] + 1, np.nan)
+        loop_frames = int(LOOP_SECONDS / hop_seconds)
+        self.recent_matches = np.zeros((loop_frames, len(self.lags)), dtype=bool)
+        self.recent_loud = np.zeros(loop_frames, dtype=bool)
+        self.problem = None
+
+    def frame_loudness(self, samples, frame_count):
+        """Return the loudness of the first frames of samples, in dB relative to full scale."""
+        energy = np.concatenate([[0.0], np.cumsum(np.square(samples, dtype=np.float64))])
+        starts = np.arange(frame_count) * self.hop_size
+        mean_square = (energy[starts + self.frame_size] - energy[starts]) / self.frame_size
+        return 10 * np.log10(np.maximum(mean_square, 1e-20))
+
+    def feed(self, samples):
+        """
+        Check the next block of samples.
+
+        :param samples: The samples, floats between -1 and 1.
+        :return The problem found so far, None if the speech looks fine.
+        :rtype str or None
+        """
+        if self.problem is not None:
+            return self.problem
+        samples = np.concatenate([self.pending, np.asarray(samples, dtype=np.float32).reshape(-1)])
+        self.samples += len(samples) - len(self.pending)
+        frame_count = max(0, (len(samples) - self.frame_size) // self.hop_size + 1)
+        # The samples of the next frames, which start in this block
+        self.pending = samples[frame_count * self.hop_size:]
+
+        if self.max_samples is not None and self.samples > self.max_samples:
+            self.problem = f"runaway speech longer than {self.max_samples / self.sample_rate:.1f} seconds"
+            return self.problem
+        if frame_count:
+            loudness = self.frame_loudness(samples, frame_count)
+            self.problem = self.check_silence(loudness) or self.check_loops(loudness)
+        return self.problem
+
+    def check_silence(self, loudness):
+        silent = loudness < SILENCE_DB
+        # The silent runs between the loud frames of the block, the first continuing the run of the previous block
+        breaks = np.flatnonzero(~silent)
+        if len(breaks) == 0:
+            longest = self.silent_run + len(silent)
+            self.silent_run = longest
+        else:
+            runs = np.diff(np.concatenate([[-1], breaks, [len(silent)]])) - 1
+            runs[0] += self.silent_run
+            longest = runs.max()
+            self.silent_run = runs[-1]
+        if longest > self.max_silent_frames:
+            return f"silence longer than {MAX_SILENCE:.1f} seconds"
+        return None
+
+    def check_loops(self, loudness):
+        # Whether every frame matches the frame one period earlier, for every period, as frames x periods
+        frames = np.concatenate([self.history, loudness])
+        positions = len(self.history) + np.arange(len(loudness))
+        # Silence is as loud as SILENCE_DB, so the quiet edges of a repeated sound match the silence around it
+        frames = np.maximum(frames, SILENCE_DB).astype(np.float32)
+        # A period is rarely a whole number of frames, so a frame matches the frames around one period earlier
+        lags = np.arange(self.lags[0] - 1, self.lags[-1] + 2)
+        with np.errstate(invalid='ignore'):
+            close = np.abs(frames[positions, None] - frames[positions[:, None] - lags]) < LOOP_TOLERANCE_DB
+        matches = close[:, :-2] | close[:, 1:-1] | close[:, 2:]
+
+        # The loud frames matching and the loud frames in the window of LOOP_SECONDS ending at every frame of the
+        # block, which starts in the previous blocks
+        loud = np.concatenate([self.recent_loud, loudness >= SILENCE_DB])
+        matches = np.concatenate([self.recent_matches, matches & loud[-len(loudness):, None]])
+        window = len(self.recent_loud)
+        match_counts = np.zeros((len(matches) + 1, len(self.lags)), dtype=np.int32)
+        np.cumsum(matches, axis=0, dtype=np.int32, out=match_counts[1:])
+        loud_counts = np.cumsum(np.concatenate([[0], loud]))
+        window_matches = match_counts[window + 1:] - match_counts[1:-window]
+        window_loud = loud_counts[window + 1:] - loud_counts[1:-window]
+        self.recent_matches = matches[-window:]
+        self.recent_loud = loud[-window:]
+        self.history = frames[-len(self.history):]
+
+        # Silence alone is left to the silence check, a loop is mostly loud
+        looping = ((window_matches >= LOOP_MATCHES * window_loud[:, None])
+                   & (window_loud >= LOOP_LOUDNESS * window)[:, None])
+        if looping.any():
+            # A loop also matches itself at every multiple of its period
+            period = self.lags[np.argmax(looping.any(axis=0))] * self.hop_size / self.sample_rate
+            return f"output stuck or looping with a period of {period:.2f} seconds"
+        return None
+
+
+def check_audio_quality(samples, sample_rate, characters=None, block_size=1 << 16):
+    """
+    Check synthesized speech for long silences, stuck or looping output and runaway length.
+
+    :param samples: The samples of the speech, floats between -1 and 1.
+    :param sample_rate: The sample rate of the samples.
+    :param characters: The length of the text that was read, to detect runaway speech.
+    :param block_size: The samples checked at a time. The check stops at the first block with a problem.
+    :return The problem found, or None if the speech looks fine.
+    :rtype str or None
+    """
+    checker = QualityChecker(sample_rate, characters)
+    samples = np.asarray(samples)
+    for start in range(0, max(1, len(samples)), block_size):
+        problem = checker.feed(samples[start:start + block_size])
+        if problem is not None:
+            return problem
+    return None
@@ -0,0 +1,155 @@
+"""
+A local stand-in for the Google Translate TTS endpoint of gTTS, in tests and benchmarks.
+
+It answers every request like the endpoint does, with "audio" that is the text and language of the request, so the
+order of the chunks can be checked in the output. It can add latency to every request and refuse requests beyond a
+rate limit, and it counts the requests in flight at the same time.
+
+Usage:
+    python -m src.audio_generation.fake_gtts [--port 8766] [--latency 0.2] [--rate-limit 10]
+"""
+import argparse
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from src.audio_generation.gtts_client import RPC_PATH
+
+
+def fake_audio(text, language):
+    """Return the audio the stand-in answers for a text."""
+    return f'[{language}:{text}]'.encode('utf-8')
+
+
+def parse_request(body):
+    """Return the text and language of a request body built by gTTS."""
+    rpc = json.loads(parse_qs(body.decode('utf-8'))['f.req'][0])
+    text, language = json.loads(rpc[0][0][1])[:2]
+    return text, language
+
+
+def response_body(audio):
+    """Return a response of the endpoint holding MP3 audio."""
+    payload = json.dumps([['wrb.fr', 'jQ1olc', json.dumps([base64.b64encode(audio).decode('ascii')]), None, None,
+                           None, 'generic']], separators=(',', ':'))
+    return f")]}}'\n\n{len(payload)}\n{payload}\n".encode('utf-8')
+
+
+class FakeGoogleTTS:
+    """The gTTS endpoint served over HTTP."""
+
+    def __init__(self, latency=0.0, rate_limit=None):
+        """
+        :param latency: The seconds every request takes.
+        :param rate_limit: The requests accepted per second, None for no limit.
+        """
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.request_count = 0
+        self.refused_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.window = (0.0, 0)
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self, host='127.0.0.1', port=0):
+        fake_gtts = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so clients can reuse their connections
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                fake_gtts.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), name='fake-gtts', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def admit(self):
+        """Count a request against the rate limit, returning whether it is accepted."""
+        with self.lock:
+            self.request_count += 1
+            if self.rate_limit is None:
+                return True
+            now = time.monotonic()
+            window_start, used = self.window
+            if now - window_start >= 1:
+                window_start, used = now, 0
+            self.window = (window_start, used + 1)
+            if used + 1 > self.rate_limit:
+                self.refused_count += 1
+                return False
+            return True
+
+    def handle(self, request):
+        body = request.rfile.read(int(request.headers.get('Content-Length') or 0))
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if urlparse(request.path).path != RPC_PATH:
+                status, content = 404, b''
+            elif self.admit():
+                status, content = 200, response_body(fake_audio(*parse_request(body)))
+            else:
+                status, content = 429, b''
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json; charset=utf-8')
+        request.send_header('Content-Length', str(len(content)))
+        if status == 429:
+            request.send_header('Retry-After', '1')
+        request.end_headers()
+        request.wfile.write(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a stand-in for the gTTS endpoint.')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds every request takes.')
+    parser.add_argument('--rate-limit', type=float, help='Requests accepted per second.')
+    arguments = parser.parse_args()
+
+    fake_gtts = FakeGoogleTTS(latency=arguments.latency, rate_limit=arguments.rate_limit).start(port=arguments.port)
+    print(f"Serving the gTTS endpoint at {fake_gtts.base_url}")
+    try:
+        fake_gtts.thread.join()
+    except KeyboardInterrupt:
+        fake_gtts.stop()
+
+
+if __name__ == '__main__':
+    main()
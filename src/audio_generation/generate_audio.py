@@ -2,14 +2,56 @@ import json
 import os
 import re
 import textwrap
+import threading
 import time
 
-import librosa
 import numpy as np
 from TTS.api import TTS
-from gtts import gTTS
-from pydub import AudioSegment
-from tqdm import tqdm
+
+from src.audio_generation.audio_assembler import AudioAssembler
+from src.audio_generation.audio_quality import check_audio_quality
+from src.audio_generation.gtts_client import GTTSClient
+from src.tracing.trace import trace_span
+
+
+# Read by every Coqui model to take the profile of its noise, so every clip is denoised the same in every run
+NOISE_REFERENCE_TEXT = 'The quick brown fox jumps over the lazy dog, then rests in the shade for a while.'
+
+# TTS models are loaded once per process and shared by every comment and every job of a batch
+tts_models = {}
+tts_models_lock = threading.Lock()
+
+
+class SerializedTTS:
+    """
+    A TTS model synthesizing one text at a time.
+
+    Coqui models keep the state of the current synthesis on the model itself and are not thread-safe, so the
+    threads sharing a model take turns on it.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+
+    def tts_to_samples(self, text):
+        """
+        Synthesize a text.
+
+        :return The samples of the speech and their sample rate.
+        :rtype tuple[numpy.ndarray, int]
+        """
+        with self.lock:
+            samples = self.model.tts(text=text)
+            return np.asarray(samples, dtype=np.float32), self.model.synthesizer.output_sample_rate
+
+
+def load_tts_model(model_name):
+    """Return the TTS model with the given name, loading it on first use."""
+    with tts_models_lock:
+        if model_name not in tts_models:
+            tts_models[model_name] = SerializedTTS(TTS(model_name=model_name, progress_bar=True, gpu=False))
+        return tts_models[model_name]
 
 
 def ensure_directory_exists(file_path):
@@ -18,12 +60,6 @@ def ensure_directory_exists(file_path):
         os.makedirs(directory)
 
 
-def append_temp_to_final(temp_filename, final_filename):
-    with open(temp_filename, 'rb') as temp_file:
-        with open(final_filename, 'ab') as final_file:
-            final_file.write(temp_file.read())
-
-
 def split_text_into_phrases(text, max_length, chunk_size):
     split_by_max_length = textwrap.wrap(text, max_length)
     split_into_chunks = [textwrap.wrap(chunk, chunk_size) for chunk in split_by_max_length]
@@ -31,30 +67,46 @@ def split_text_into_phrases(text, max_length, chunk_size):
     return split_into_chunks
 
 
-def generate_audio_gtts(text, output_file='output.mp3', language='en', metadata=None):
+def generate_audio_gtts(text, output_file='output.mp3', language='en', metadata=None, gtts_client=None,
+                        phrase_cache=None):
+    """
+    Synthesize a text with gTTS, its chunks at the same time, and write their audio to an MP3 file in chunk order.
+
+    :param gtts_client: The client sending the requests, shared with the other comments of a run. A client of its
+        own is used by default.
+    :param phrase_cache: Serves the chunks read before instead of sending them to gTTS, and keeps the others.
+    """
     chunk_size = 200
     chunks = split_text_into_phrases(text, 50, chunk_size)
-    temp_filename = 'temp.mp3'
     ensure_directory_exists(output_file)
 
     start_time = time.time()
-    chunk_times = []
-
-    try:
-        with tqdm(total=len(chunks), desc='Generating Audio with gTTS') as pbar:
-            for chunk in chunks:
-                chunk_start_time = time.time()
-                tts = gTTS(text=chunk, lang=language, slow=False)
-                tts.save(temp_filename)
-                append_temp_to_final(temp_filename, output_file)
-                chunk_end_time = time.time()
-                chunk_times.append(chunk_end_time - chunk_start_time)
-                pbar.update(1)
-                print(f"Chunk generated in {chunk_end_time - chunk_start_time:.2f} seconds")
-                time.sleep(0.1)
-    finally:
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+    results = [None] * len(chunks)
+    cache_keys = [None] * len(chunks)
+    if phrase_cache is not None:
+        cache_keys = [phrase_cache.key(chunk, 'gtts', language=language) for chunk in chunks]
+        for i, key in enumerate(cache_keys):
+            audio = phrase_cache.get(key)
+            if audio is not None:
+                results[i] = (audio, 0.0)
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        client = gtts_client or GTTSClient()
+        try:
+            synthesized = client.synthesize_chunks([chunks[i] for i in missing], language)
+        finally:
+            if gtts_client is None:
+                client.close()
+        for i, result in zip(missing, synthesized):
+            results[i] = result
+            if phrase_cache is not None:
+                phrase_cache.put(cache_keys[i], result[0])
+    chunk_times = [chunk_time for _, chunk_time in results]
+
+    with open(output_file, 'wb') as file:
+        for audio, _ in results:
+            file.write(audio)
 
     total_time = time.time() - start_time
     print(f"Audio file generated: {output_file}")
@@ -103,69 +155,155 @@ def split_text_into_chunks(text, chunk_size=200):
     return chunks
 
 
-def check_audio_quality(file_path):
-    y, sr = librosa.load(file_path, sr=None)
-    silent_threshold = 20
-    silent_segments = librosa.effects.split(y, top_db=silent_threshold)
-    silent_durations = [(end - start) / sr for start, end in silent_segments]
-
-    if any(duration > 2 for duration in silent_durations):
-        print("Detected long silent segments in the audio.")
-        return False
+def generate_audio_chunk(tts, text_chunk, max_retries=10, phrase_cache=None, cache_key=None, quality_retries=2):
+    """
+    Synthesize a chunk of text, retrying on errors and on poor speech.
 
-    rms = librosa.feature.rms(y=y)
-    rms_diff = np.diff(rms[0])
-    if np.any(rms_diff == 0):
-        print("Detected possible repetitions in the audio.")
-        return False
+    The speech of every attempt is checked for long silences, stuck or looping output and runaway length as soon as
+    it is synthesized. A chunk still poor after its quality retries is kept rather than failing the comment.
 
-    return True
+    With a phrase cache, a chunk read before is served from the cache, and a synthesized chunk is added to it.
 
+    :param phrase_cache: The phrase cache, None to always synthesize the chunk.
+    :param cache_key: The key of the chunk in the phrase cache.
+    :param quality_retries: The attempts synthesizing a chunk again because its speech is poor.
+    :return The samples and the sample rate of the chunk, None if every attempt failed, and the seconds it took.
+    :rtype tuple[tuple[numpy.ndarray, int] or None, float]
+    """
+    if phrase_cache is not None:
+        audio = phrase_cache.get_samples(cache_key)
+        if audio is not None:
+            return audio, 0.0
 
-def generate_audio_chunk(tts, text_chunk, output_file, max_retries=10):
+    poor_audio = None
     retry_count = 0
     while retry_count < max_retries:
         chunk_start_time = time.time()
         try:
-            tts.tts_to_file(text=text_chunk, file_path=output_file)
+            with trace_span('tts_chunk', 'tts', engine='tts', attempt=retry_count, characters=len(text_chunk)):
+                audio = tts.tts_to_samples(text_chunk)
             chunk_end_time = time.time()
             if chunk_end_time - chunk_start_time > 60:
                 raise Exception("Chunk generation took too long")
-            return True, chunk_end_time - chunk_start_time
         except Exception as e:
             retry_count += 1
             print(f"Error generating audio chunk: {e}. Retrying {retry_count}/{max_retries}")
-    return False, 0
+            continue
+
+        problem = check_audio_quality(*audio, characters=len(text_chunk))
+        if problem is not None:
+            poor_audio = (audio, chunk_end_time - chunk_start_time)
+            if quality_retries > 0:
+                quality_retries -= 1
+                retry_count += 1
+                print(f"Poor audio quality: {problem}. Retrying {retry_count}/{max_retries}")
+                continue
+            print(f"Poor audio quality: {problem}. Keeping the chunk")
+            return poor_audio
+        if phrase_cache is not None:
+            phrase_cache.put_samples(cache_key, *audio)
+        return audio, chunk_end_time - chunk_start_time
+    return poor_audio or (None, 0)
+
+
+def generate_queued_chunk(future, tts, text_chunk, phrase_cache=None, cache_key=None):
+    """
+    Wait for a chunk queued on the TTS server, and synthesize it again with retries if it failed or its speech is
+    poor.
+
+    :param phrase_cache: The phrase cache the chunk is added to, if any.
+    :param cache_key: The key of the chunk in the phrase cache.
+    :return The samples and the sample rate of the chunk, None if it failed, and the seconds it was waited for.
+    :rtype tuple[tuple[numpy.ndarray, int] or None, float]
+    """
+    start_time = time.time()
+    try:
+        with trace_span('tts_chunk', 'tts', engine='tts', queued=True, characters=len(text_chunk)):
+            audio = future.result()
+        chunk_time = time.time() - start_time
+    except Exception as e:
+        print(f"Error generating audio chunk: {e}. Retrying")
+        return generate_audio_chunk(tts, text_chunk, phrase_cache=phrase_cache, cache_key=cache_key)
+
+    problem = check_audio_quality(*audio, characters=len(text_chunk))
+    if problem is not None:
+        print(f"Poor audio quality: {problem}. Retrying")
+        # The queued attempt counts as the first one
+        return generate_audio_chunk(tts, text_chunk, phrase_cache=phrase_cache, cache_key=cache_key,
+                                    quality_retries=1)
+    if phrase_cache is not None:
+        phrase_cache.put_samples(cache_key, *audio)
+    return audio, chunk_time
 
 
 def generate_audio_mozilla_tts(text, output_file='output.mp3', model_name='tts_models/en/ljspeech/tacotron2-DDC',
-                               metadata=None):
+                               metadata=None, tts_server=None, phrase_cache=None, noise_reducer=None):
+    """
+    Synthesize a text with a Coqui TTS model, chunk by chunk, and write its speech to an MP3 file.
+
+    :param tts_server: The warm worker processes synthesizing the chunks. The model is loaded in this process by
+        default.
+    :param phrase_cache: Serves the chunks read before instead of synthesizing them, and keeps the others.
+    :param noise_reducer: Reduces the background noise of the speech against the noise profile of the model, taken
+        from its reading of NOISE_REFERENCE_TEXT, before it is encoded. None keeps the speech as synthesized.
+    """
     ensure_directory_exists(output_file)
     processed_text = preprocess_text(text)
     text_chunks = split_text_into_chunks(processed_text)
-    tts = TTS(model_name=model_name, progress_bar=True, gpu=False)
+    # Warm worker processes synthesize the chunks if they are running, otherwise the model is loaded in this process
+    tts = tts_server.model(model_name) if tts_server is not None else load_tts_model(model_name)
 
     start_time = time.time()
     chunk_times = []
-    temp_files = []
+    assembler = None
+
+    cache_keys = [None] * len(text_chunks)
+    if phrase_cache is not None:
+        cache_keys = [phrase_cache.key(chunk, 'tts', model_name) for chunk in text_chunks]
+
+    queued = None
+    if tts_server is not None:
+        # The chunks read before are served from the phrase cache. Every other chunk is queued at once, so every
+        # worker gets one and the server can batch them with other comments
+        cached = [phrase_cache.get_samples(key) if phrase_cache is not None else None for key in cache_keys]
+        queued = [tts_server.submit(model_name, chunk) if audio is None else audio
+                  for chunk, audio in zip(text_chunks, cached)]
 
     for i, chunk in enumerate(text_chunks):
-        temp_file = f"{os.path.splitext(output_file)[0]}_part_{i}.wav"
-        success, chunk_time = generate_audio_chunk(tts, chunk, temp_file)
-        if success:
-            chunk_times.append(chunk_time)
-            temp_files.append(temp_file)
-            print(f"Chunk {i + 1}/{len(text_chunks)} generated in {chunk_time:.2f} seconds")
+        if queued is not None and isinstance(queued[i], tuple):
+            audio, chunk_time = queued[i], 0.0
+        elif queued is not None:
+            audio, chunk_time = generate_queued_chunk(queued[i], tts, chunk, phrase_cache, cache_keys[i])
         else:
+            audio, chunk_time = generate_audio_chunk(tts, chunk, phrase_cache=phrase_cache, cache_key=cache_keys[i])
+        if audio is None:
             print(f"Failed to generate audio for chunk: {chunk}")
             return
-
-    combined = AudioSegment.empty()
-    for temp_file in temp_files:
-        combined += AudioSegment.from_wav(temp_file)
-        os.remove(temp_file)
-
-    combined.export(output_file, format="mp3")
+        samples, sample_rate = audio
+        if assembler is None:
+            # Room for the speech of the whole text at about 12 characters per second, grown if it runs longer
+            assembler = AudioAssembler(sample_rate, int(sample_rate * len(processed_text) / 12))
+        assembler.append(samples)
+        chunk_times.append(chunk_time)
+        print(f"Chunk {i + 1}/{len(text_chunks)} generated in {chunk_time:.2f} seconds")
+
+    assembler = assembler or AudioAssembler()
+    if noise_reducer is not None and len(assembler):
+        # The reference is read once per model and run, from the phrase cache if it was read before
+        reference_key = phrase_cache.key(NOISE_REFERENCE_TEXT, 'tts', model_name) if phrase_cache is not None else None
+
+        def reference():
+            audio, _ = generate_audio_chunk(tts, NOISE_REFERENCE_TEXT, phrase_cache=phrase_cache,
+                                            cache_key=reference_key)
+            return audio
+
+        with trace_span('noise_reduction', 'tts', seconds=assembler.duration):
+            denoised = noise_reducer.reduce(assembler.samples, assembler.sample_rate, model_name, reference)
+        assembler = AudioAssembler(assembler.sample_rate, len(denoised))
+        assembler.append(denoised)
+
+    with trace_span('audio_export', 'tts', chunks=len(chunk_times)):
+        assembler.write_mp3(output_file)
 
     total_time = time.time() - start_time
     print(f"Audio file generated: {output_file}")
@@ -0,0 +1,167 @@
+"""
+A client of the Google Translate TTS endpoint that gTTS uses, synthesizing the chunks of a text at the same time.
+
+gTTS sends its requests one after the other, each on a new connection. The client builds the same requests with
+gTTS, sends the requests of every chunk from a pool of threads over a session that keeps its connections alive, and
+spaces them out under a rate limit. The audio of the chunks is returned in memory, in chunk order.
+"""
+import base64
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from gtts import gTTS
+from requests.adapters import HTTPAdapter
+
+from src.reddit.comment_fetcher import AdaptiveRateLimiter, to_float
+from src.tracing.trace import trace_span
+
+DEFAULT_BASE_URL = 'https://translate.google.com'
+RPC_PATH = '/_/TranslateWebserverUi/data/batchexecute'
+AUDIO_PATTERN = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+# The first wait before retrying a refused or failed request, doubled on every retry, unless the endpoint says how
+# long to wait with Retry-After
+BACKOFF_SECONDS = 0.5
+
+
+class GTTSError(Exception):
+    """Raised when the TTS endpoint keeps failing or answers without audio."""
+
+
+def request_bodies(text, language):
+    """Return the bodies of the requests gTTS sends for a text, one per part of at most 100 characters."""
+    return gTTS(text=text, lang=language, slow=False).get_bodies()
+
+
+def backoff_seconds(attempt, headers):
+    """Return how long to wait before retrying a refused or failed request: Retry-After, or an exponential backoff."""
+    retry_after = to_float(headers.get('Retry-After'))
+    if retry_after is not None:
+        return max(0.0, retry_after)
+    # Jitter keeps the workers from retrying at the same time
+    return BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.0)
+
+
+def audio_from_response(content):
+    """
+    Extract the MP3 audio from a response of the TTS endpoint.
+
+    :raises GTTSError: if the response holds no audio
+    """
+    for line in content.decode('utf-8').splitlines():
+        if 'jQ1olc' in line:
+            match = AUDIO_PATTERN.search(line)
+            if match:
+                return base64.b64decode(match.group(1).encode('ascii'))
+    raise GTTSError('The TTS endpoint answered without audio')
+
+
+class GTTSClient:
+    """Synthesizes the chunks of texts with gTTS, several requests at the same time over pooled connections."""
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, workers=4, rate=None, max_retries=3, timeout=30):
+        """
+        :param base_url: The endpoint server, https://translate.google.com or a stand-in server in tests.
+        :param workers: The most requests in flight at the same time.
+        :param rate: The most requests sent per second, None for no limit. The rate is halved when the endpoint
+            refuses a request.
+        :param max_retries: The retries of a refused or failed request, each after an exponential backoff.
+        :param timeout: The timeout of a request in seconds.
+        """
+        self.url = f"{base_url.rstrip('/')}{RPC_PATH}"
+        self.workers = max(1, workers)
+        self.rate_limiter = AdaptiveRateLimiter(rate=rate, max_rate=rate, min_rate=min(0.5, rate)) if rate else None
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        # One connection per worker is kept alive between requests, and between the comments sharing the client
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update(gTTS.GOOGLE_TTS_HEADERS)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='gtts')
+
+    def post(self, body):
+        """
+        Send a request to the endpoint, retrying refused and failed requests.
+
+        :return The MP3 audio of the request.
+        :rtype bytes
+        :raises GTTSError: if the request still fails after every retry
+        """
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                response = self.session.post(self.url, data=body, timeout=self.timeout)
+            except requests.ConnectionError:
+                if attempt == self.max_retries:
+                    raise GTTSError(f"Could not connect to {self.url}")
+                time.sleep(2 ** attempt * 0.1)
+                continue
+            if self.rate_limiter is not None:
+                self.rate_limiter.update(response.status_code, response.headers)
+
+            if response.status_code == 429 or response.status_code >= 500:
+                # The endpoint is backed off whether or not the requests are rate limited
+                if attempt < self.max_retries:
+                    time.sleep(backoff_seconds(attempt, response.headers))
+                continue
+            if response.status_code != 200:
+                raise GTTSError(f"The TTS endpoint answered {response.status_code}")
+            return audio_from_response(response.content)
+
+        raise GTTSError(f"Gave up on a TTS request after {self.max_retries + 1} attempts")
+
+    def synthesize(self, text, language='en', index=0):
+        """
+        Synthesize a chunk of text.
+
+        :return The MP3 audio of the chunk and the seconds it took.
+        :rtype tuple[bytes, float]
+        """
+        start_time = time.time()
+        with trace_span('tts_chunk', 'tts', engine='gtts', chunk=index, characters=len(text)):
+            audio = b''.join(self.post(body) for body in request_bodies(text, language))
+        return audio, time.time() - start_time
+
+    def synthesize_chunks(self, chunks, language='en'):
+        """
+        Synthesize chunks of text at the same time.
+
+        :param chunks: The chunks of text.
+        :param language: The language of the text.
+        :return The MP3 audio of every chunk and the seconds it took, in chunk order.
+        :rtype list[tuple[bytes, float]]
+        :raises GTTSError: if a chunk could not be synthesized
+        """
+        futures = [self.executor.submit(self.synthesize, chunk, language, i) for i, chunk in enumerate(chunks)]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def create_gtts_client(configuration):
+    """
+    Create the gTTS client of the [audio_generation] section of a configuration.
+
+    :param configuration: The run configuration.
+    :return The client, or None if the audio is not synthesized with gTTS.
+    :rtype GTTSClient or None
+    """
+    audio_configuration = configuration.get('audio_generation', {})
+    if not audio_configuration.get('enabled', False) or audio_configuration.get('tts_library') != 'gtts':
+        return None
+    return GTTSClient(audio_configuration.get('gtts_url', DEFAULT_BASE_URL), audio_configuration.get('gtts_workers', 4),
+                      audio_configuration.get('gtts_rate') or None)
@@ -3,7 +3,7 @@ import os
 import re
 
 from src.audio_generation.generate_audio import generate_audio_gtts, generate_audio_mozilla_tts
-from src.audio_generation.noise_processing import remove_background_noise
+from src.audio_generation.noise_processing import NoiseReducer
 
 
 def main():
@@ -56,11 +56,13 @@ def main():
     elif tts_choice == 'm':
         model_name = input(
             "Enter the TTS model name for Mozilla TTS (default: tts_models/en/ljspeech/tacotron2-DCA): ") or "tts_models/en/ljspeech/tacotron2-DCA"
-        output_file_mozilla_tts = os.path.join(output_dir, f"output_audio_generation_mozilla_tts_{timestamp}.wav")
+        output_file_mozilla_tts = os.path.join(output_dir, f"output_audio_generation_mozilla_tts_{timestamp}.mp3")
         print("Generating audio using Mozilla TTS...")
-        generate_audio_mozilla_tts(text, output_file=output_file_mozilla_tts, model_name=model_name)
+        # The background noise is reduced before the speech is encoded
+        with NoiseReducer() as noise_reducer:
+            generate_audio_mozilla_tts(text, output_file=output_file_mozilla_tts, model_name=model_name,
+                                       noise_reducer=noise_reducer)
         print(f"Mozilla TTS audio saved to {output_file_mozilla_tts}")
-        remove_background_noise(output_file_mozilla_tts, output_file_mozilla_tts)
 
     else:
         print("Invalid choice. Please enter 'g' for gTTS or 'm' for Mozilla TTS.")
@@ -1,6 +1,36 @@
-from pydub import AudioSegment
+"""
+Reduce the background noise of synthesized speech, in overlapping blocks spread over a pool of processes.
+
+The samples of an audio file are read straight from the raw buffer of its AudioSegment, one row per channel, and
+long recordings are cut into blocks of BLOCK_SECONDS. Every block is denoised with PADDING_SECONDS of the
+neighbouring blocks on each side, which are dropped again, so the blocks join without clicks.
+
+The noise of a TTS model is the noise floor of its vocoder, the same in every clip it reads. Its profile, the
+quietest frames of a fixed reference clip read by the model, is taken once per run and every clip of the model is
+gated against it with stationary spectral gating, so a clip is denoised the same whichever clip was read first.
+Without a profile, noisereduce estimates the noise of every block on its own.
+
+Clips shorter than a block, most comments, are denoised in the calling thread, only longer ones are spread over the
+pool.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
 import noisereduce as nr
 import numpy as np
+from pydub import AudioSegment
+
+BLOCK_SECONDS = 30.0
+PADDING_SECONDS = 0.5
+# The noise profile of a model is its quietest frames, as much as PROFILE_SECONDS of them
+PROFILE_FRAME = 2048
+PROFILE_SECONDS = 1.0
+# The hop of the short-time Fourier transform of noisereduce. Blocks start on its frames, so they are cut into the
+# same frames as the whole recording
+STFT_HOP = 256
+# The types of the samples of an AudioSegment, by sample width, as pydub reads them
+SAMPLE_TYPES = {1: np.int8, 2: np.dtype('<i2'), 4: np.dtype('<i4')}
 
 
 def load_audio(file_path):
@@ -17,27 +47,203 @@ def save_audio(audio_segment, file_path):
     audio_segment.export(file_path, format="wav")
 
 
-def reduce_noise(audio_segment):
+def segment_samples(audio_segment):
     """
-    Reduce background noise in an AudioSegment.
+    Return the samples of an AudioSegment without copying them.
+
+    :return A read-only view of the raw buffer with one row per channel, and the full scale of the samples.
+    :rtype tuple[numpy.ndarray, int]
+    """
+    sample_type = SAMPLE_TYPES.get(audio_segment.sample_width)
+    if sample_type is None:
+        raise ValueError(f"Unsupported sample width: {audio_segment.sample_width} bytes")
+    # The samples of the channels are interleaved, frame by frame
+    samples = np.frombuffer(audio_segment.raw_data, dtype=sample_type).reshape(-1, audio_segment.channels).T
+    return samples, 1 << (8 * audio_segment.sample_width - 1)
+
+
+def noise_profile(samples, sample_rate, seconds=PROFILE_SECONDS):
+    """
+    Return the quietest frames of a clip, in clip order, as the profile of its noise.
+
+    Frames of digital silence hold no noise and are skipped.
+
+    :param samples: The samples of the clip, one row per channel or a single channel.
+    :return The samples of the profile, or None if the clip has no noise to profile.
+    :rtype numpy.ndarray or None
     """
-    # Convert AudioSegment to numpy array
-    samples = np.array(audio_segment.get_array_of_samples())
+    samples = np.atleast_2d(samples).mean(axis=0)
+    frame_count = len(samples) // PROFILE_FRAME
+    if frame_count == 0:
+        return None
+    frames = samples[:frame_count * PROFILE_FRAME].reshape(frame_count, PROFILE_FRAME)
+    energy = np.mean(np.square(frames, dtype=np.float64), axis=1)
+    quietest = np.argsort(energy)
+    quietest = quietest[energy[quietest] > 0][:max(1, int(seconds * sample_rate / PROFILE_FRAME))]
+    if len(quietest) == 0:
+        return None
+    return frames[np.sort(quietest)].reshape(-1).astype(np.float32)
+
+
+def block_ranges(length, block_size, padding):
+    """
+    Cut samples into blocks.
+
+    :return The start and end of every block, and of the samples it is denoised with, padding included.
+    :rtype list[tuple[int, int, int, int]]
+    """
+    return [(start, min(start + block_size, length), max(0, start - padding), min(length, start + block_size + padding))
+            for start in range(0, length, block_size)]
+
+
+def reduce_block(samples, sample_rate, profile):
+    """Denoise a block of samples, one row per channel, against a noise profile, or on its own without one."""
+    if profile is None:
+        return nr.reduce_noise(y=samples, sr=sample_rate, chunk_size=None)
+    return nr.reduce_noise(y=samples, sr=sample_rate, stationary=True, y_noise=profile, chunk_size=None)
 
-    # Perform noise reduction
-    reduced_noise_samples = nr.reduce_noise(y=samples, sr=audio_segment.frame_rate)
 
-    # Convert numpy array back to AudioSegment
-    reduced_noise_audio_segment = audio_segment._spawn(reduced_noise_samples.tobytes())
+class NoiseReducer:
+    """Denoises clips in blocks over a pool of processes, with one noise profile per TTS voice or model."""
 
-    return reduced_noise_audio_segment
+    def __init__(self, workers=2, block_seconds=BLOCK_SECONDS, padding_seconds=PADDING_SECONDS, mp_context=None):
+        """
+        :param workers: The worker processes denoising blocks at the same time, 0 to denoise in the calling thread.
+        :param block_seconds: The length of a block.
+        :param padding_seconds: The samples of the neighbouring blocks each block is denoised with, on each side.
+        :param mp_context: The multiprocessing context of the workers, spawn by default.
+        """
+        self.workers = workers
+        self.block_seconds = block_seconds
+        self.padding_seconds = padding_seconds
+        self.mp_context = mp_context
+        self.pool = None
+        self.profiles = {}
+        self.lock = threading.Lock()
+        # Held while a reference clip is read, so every model reads its reference once
+        self.profile_lock = threading.Lock()
 
+    def executor(self):
+        """Return the pool of workers, started on first use."""
+        with self.lock:
+            if self.pool is None:
+                # Clips are denoised from pipeline threads, forking a multi-threaded process is not safe
+                self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=self.mp_context or multiprocessing.get_context('spawn'))
+            return self.pool
 
-def remove_background_noise(input_file, output_file):
+    def profile(self, profile_key, reference=None):
+        """
+        Return the noise profile of a voice or model, taken from its reference clip the first time.
+
+        :param profile_key: The TTS voice or model.
+        :param reference: Returns the samples and the sample rate of the reference clip of the voice or model, or None
+            if it could not be read.
+        :return The noise profile, or None if the voice or model has none yet and no reference clip.
+        :rtype numpy.ndarray or None
+        """
+        if profile_key is None:
+            return None
+        with self.lock:
+            profile = self.profiles.get(profile_key)
+        if profile is not None or reference is None:
+            return profile
+        with self.profile_lock:
+            with self.lock:
+                profile = self.profiles.get(profile_key)
+            if profile is None:
+                clip = reference()
+                profile = noise_profile(*clip) if clip is not None else None
+                if profile is not None:
+                    with self.lock:
+                        self.profiles[profile_key] = profile
+        return profile
+
+    def reduce(self, samples, sample_rate, profile_key=None, reference=None):
+        """
+        Denoise samples.
+
+        :param samples: Floats between -1 and 1, one row per channel or a single channel.
+        :param sample_rate: The sample rate of the samples.
+        :param profile_key: The TTS voice or model that read the samples, whose noise profile is shared by all its
+            clips. Without one, the noise of every block is estimated on its own.
+        :param reference: Returns the reference clip of the voice or model, read the first time its profile is
+            needed, see profile.
+        :return The denoised samples, in the shape of the samples.
+        :rtype numpy.ndarray
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        channels = np.atleast_2d(samples)
+        profile = self.profile(profile_key, reference)
+
+        ranges = block_ranges(channels.shape[1], max(1, int(self.block_seconds * sample_rate / STFT_HOP)) * STFT_HOP,
+                              int(self.padding_seconds * sample_rate / STFT_HOP) * STFT_HOP)
+        # A single block gains nothing from the pool, it would only be sent to a worker and back
+        if self.workers > 0 and len(ranges) > 1:
+            pool = self.executor()
+            blocks = [pool.submit(reduce_block, channels[:, padded_start:padded_end], sample_rate, profile)
+                      for _, _, padded_start, padded_end in ranges]
+            blocks = [block.result() for block in blocks]
+        else:
+            blocks = [reduce_block(channels[:, padded_start:padded_end], sample_rate, profile)
+                      for _, _, padded_start, padded_end in ranges]
+
+        denoised = np.empty_like(channels)
+        for (start, end, padded_start, _), block in zip(ranges, blocks):
+            denoised[:, start:end] = block[:, start - padded_start:end - padded_start]
+        return denoised.reshape(samples.shape)
+
+    def reduce_segment(self, audio_segment, profile_key=None, reference=None):
+        """Denoise an AudioSegment, and return the denoised AudioSegment."""
+        samples, full_scale = segment_samples(audio_segment)
+        denoised = self.reduce(samples / np.float32(full_scale), audio_segment.frame_rate, profile_key, reference)
+        denoised = np.clip(np.rint(denoised * full_scale), -full_scale, full_scale - 1).astype(samples.dtype)
+        # Interleave the channels again
+        return audio_segment._spawn(np.ascontiguousarray(denoised.T).tobytes())
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def reduce_noise(audio_segment, noise_reducer=None, profile_key=None, reference=None):
+    """
+    Reduce background noise in an AudioSegment.
+
+    :param noise_reducer: The noise reducer with the workers and noise profiles of the run. The AudioSegment is
+        denoised in this thread by default.
+    :param profile_key: The TTS voice or model that read the audio.
+    :param reference: Returns the reference clip of the voice or model, see NoiseReducer.profile.
+    """
+    return (noise_reducer or NoiseReducer(workers=0)).reduce_segment(audio_segment, profile_key, reference)
+
+
+def remove_background_noise(input_file, output_file, noise_reducer=None, profile_key=None, reference=None):
     """
     Load an audio file, reduce background noise, and save the result.
     """
     audio = load_audio(input_file)
-    reduced_noise_audio = reduce_noise(audio)
+    reduced_noise_audio = reduce_noise(audio, noise_reducer, profile_key, reference)
     save_audio(reduced_noise_audio, output_file)
     print(f"Background noise removed. Cleaned audio saved as: {output_file}")
+
+
+def create_noise_reducer(configuration):
+    """
+    Create the noise reducer of the [audio_generation] section of a configuration.
+
+    :param configuration: The run configuration.
+    :return The noise reducer, or None if the speech is not denoised.
+    :rtype NoiseReducer or None
+    """
+    audio_configuration = configuration.get('audio_generation', {})
+    if not audio_configuration.get('enabled', False) or not audio_configuration.get('noise_reduction', False) \
+            or audio_configuration.get('tts_library') != 'tts':
+        return None
+    return NoiseReducer(audio_configuration.get('noise_workers', 2))
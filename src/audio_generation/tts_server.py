@@ -0,0 +1,258 @@
+"""
+Warm TTS worker processes that load the TTS models once and synthesize the audio of every comment.
+
+Loading a Coqui model takes seconds and its inference runs one text at a time, so the models live in long-lived worker
+processes instead: each worker loads the configured models when it starts, then serves synthesis requests from the
+pipeline threads of every run and every job of a batch.
+
+Every comment queues all of its chunks of text at once, so a single pipeline thread keeps every worker busy. With
+batching, the chunks queued by every comment are gathered, sorted by length and sent to the workers in buckets of
+chunks of similar length, one request per bucket instead of one per chunk.
+"""
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+DEFAULT_MODEL = 'tts_models/en/ljspeech/tacotron2-DDC'
+
+
+def init_tts_worker(model_names, torch_threads):
+    """
+    Initialize a TTS worker process: limit the threads of torch and load the models before the first request.
+
+    :param model_names: The TTS models to load.
+    :param torch_threads: The threads each worker uses for inference, the torch default if 0.
+    """
+    if torch_threads:
+        # Read by the OpenMP and MKL runtimes when torch is imported, which has not happened yet in a new worker
+        os.environ['OMP_NUM_THREADS'] = os.environ['MKL_NUM_THREADS'] = str(torch_threads)
+        try:
+            import torch
+            torch.set_num_threads(torch_threads)
+        except ImportError:
+            pass
+
+    from src.audio_generation.generate_audio import load_tts_model
+    for model_name in model_names:
+        load_tts_model(model_name)
+    print(f"TTS worker {os.getpid()} loaded {', '.join(model_names)}")
+
+
+def synthesize(model_name, text):
+    """
+    Synthesize a text with a model of the worker process, loading the model if it is not loaded.
+
+    :return The samples of the speech and their sample rate, sent back to the pipeline process.
+    :rtype tuple[numpy.ndarray, int]
+    """
+    from src.audio_generation.generate_audio import load_tts_model
+    return load_tts_model(model_name).tts_to_samples(text)
+
+
+def synthesize_batch(model_name, texts):
+    """
+    Synthesize a bucket of texts with a model of the worker process.
+
+    The Coqui API synthesizes one text per call, so the texts of a bucket run back to back on the warm model.
+
+    :return The samples and sample rate of every text, or the exception raised for it.
+    :rtype list
+    """
+    results = []
+    for text in texts:
+        try:
+            results.append(synthesize(model_name, text))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def length_buckets(requests, bucket_count):
+    """
+    Split synthesis requests into buckets of requests for the same model and of similar text lengths.
+
+    The requests of a model are sorted by length and cut into at most bucket_count buckets of about as many
+    characters each, so that the workers synthesizing the buckets finish at about the same time.
+
+    :param requests: The (model name, text, future) tuple of every request.
+    :param bucket_count: The most buckets per model.
+    :return The buckets, each sorted by text length.
+    :rtype list[list[tuple]]
+    """
+    by_model = {}
+    for request in requests:
+        by_model.setdefault(request[0], []).append(request)
+
+    buckets = []
+    for model_requests in by_model.values():
+        model_requests.sort(key=lambda request: len(request[1]))
+        share = sum(len(request[1]) for request in model_requests) / bucket_count
+        bucket, characters = [], 0
+        for request in model_requests:
+            if bucket and characters + len(request[1]) / 2 > share:
+                buckets.append(bucket)
+                bucket, characters = [], 0
+            bucket.append(request)
+            characters += len(request[1])
+        buckets.append(bucket)
+    return buckets
+
+
+class ChunkBatcher:
+    """Gathers the synthesis requests of every comment and sends them to the TTS workers in length buckets."""
+
+    def __init__(self, pool, workers, batch_size, batch_wait):
+        """
+        :param pool: The process pool of the TTS workers.
+        :param workers: The number of workers, which share the requests gathered at the same time.
+        :param batch_size: The most requests gathered before they are sent to the workers.
+        :param batch_wait: The seconds the first request waits for others to arrive.
+        """
+        self.pool = pool
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name='tts-batcher', daemon=True)
+        self.thread.start()
+
+    def submit(self, model_name, text):
+        """Queue a text to synthesize, and return the future of its samples and sample rate."""
+        future = Future()
+        self.requests.put((model_name, text, future))
+        return future
+
+    def gather(self, first):
+        """Gather the requests that arrive shortly after the first one, and whether the batcher was closed."""
+        requests = [first]
+        deadline = time.monotonic() + self.batch_wait
+        while len(requests) < self.batch_size:
+            try:
+                request = self.requests.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if request is None:
+                return requests, True
+            requests.append(request)
+        return requests, False
+
+    def run(self):
+        closed = False
+        while not closed:
+            first = self.requests.get()
+            if first is None:
+                break
+            requests, closed = self.gather(first)
+            # Every worker gets a share of the requests gathered together
+            for bucket in length_buckets(requests, self.workers):
+                self.dispatch(bucket)
+
+    def dispatch(self, bucket):
+        """Send a bucket of requests to a worker, and resolve their futures once it is synthesized."""
+        model_name = bucket[0][0]
+        result = self.pool.submit(synthesize_batch, model_name, [request[1] for request in bucket])
+
+        def resolve(result):
+            exception = result.exception()
+            outcomes = result.result() if exception is None else [exception] * len(bucket)
+            for (_, _, future), outcome in zip(bucket, outcomes):
+                if isinstance(outcome, Exception):
+                    future.set_exception(outcome)
+                else:
+                    future.set_result(outcome)
+
+        result.add_done_callback(resolve)
+
+    def close(self):
+        """Send the requests still queued and stop gathering."""
+        self.requests.put(None)
+        self.thread.join()
+
+
+class RemoteTTS:
+    """A model of the TTS workers, used like a TTS model: the synthesis runs in a worker process."""
+
+    def __init__(self, server, model_name):
+        self.server = server
+        self.model_name = model_name
+
+    def tts_to_samples(self, text):
+        return self.server.synthesize(self.model_name, text)
+
+
+class TTSServer:
+    """A pool of warm TTS worker processes."""
+
+    def __init__(self, workers=1, torch_threads=0, model_names=(DEFAULT_MODEL,), mp_context=None, batch_size=1,
+                 batch_wait=0):
+        """
+        :param workers: The number of worker processes, i.e. of texts synthesized at the same time.
+        :param torch_threads: The threads each worker uses for inference, the torch default if 0. Workers that
+            share the cores of the machine run faster with workers * torch_threads at most the number of cores.
+        :param model_names: The TTS models every worker loads when it starts.
+        :param mp_context: The multiprocessing context of the workers, spawn by default.
+        :param batch_size: The most chunks of text gathered and sent to the workers together, 1 sends every chunk
+            on its own.
+        :param batch_wait: The seconds a chunk waits for the chunks of other comments, with batching. With 0, only
+            the chunks already queued are gathered: the workers synthesize one by one, so waiting delays them.
+        """
+        # Requests are submitted from pipeline threads, forking a multi-threaded process is not safe
+        self.pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=mp_context or multiprocessing.get_context('spawn'),
+                                        initializer=init_tts_worker, initargs=(tuple(model_names), torch_threads))
+        # The workers start loading their models right away, while the comments are still being fetched
+        for _ in range(workers):
+            self.pool.submit(os.getpid)
+        self.batcher = ChunkBatcher(self.pool, workers, batch_size, batch_wait) if batch_size > 1 else None
+
+    def model(self, model_name):
+        """Return a model of the workers, to pass where a TTS model is expected."""
+        return RemoteTTS(self, model_name)
+
+    def submit(self, model_name, text):
+        """Queue a text to synthesize in a worker process, and return the future of its samples and sample rate."""
+        if self.batcher is not None:
+            return self.batcher.submit(model_name, text)
+        return self.pool.submit(synthesize, model_name, text)
+
+    def synthesize(self, model_name, text):
+        """Synthesize a text in a worker process and wait for its samples and sample rate."""
+        return self.submit(model_name, text).result()
+
+    def shutdown(self):
+        if self.batcher is not None:
+            self.batcher.close()
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+
+def tts_model_name(configuration):
+    """Return the Coqui model reading the comments of a configuration, the first of [audio_generation] tts_models."""
+    return (configuration.get('audio_generation', {}).get('tts_models') or [DEFAULT_MODEL])[0]
+
+
+def create_tts_server(configuration):
+    """
+    Create the TTS workers of the [audio_generation] section of a configuration.
+
+    :param configuration: The run configuration.
+    :return The TTS server, or None if the audio is synthesized in the pipeline threads or with gTTS.
+    :rtype TTSServer or None
+    """
+    audio_configuration = configuration.get('audio_generation', {})
+    workers = audio_configuration.get('tts_workers', 0)
+    if not audio_configuration.get('enabled', False) or audio_configuration.get('tts_library') != 'tts' \
+            or workers <= 0:
+        return None
+    return TTSServer(workers, audio_configuration.get('torch_threads', 0),
+                     audio_configuration.get('tts_models', [DEFAULT_MODEL]),
+                     batch_size=audio_configuration.get('tts_batch_size', 1),
+                     batch_wait=audio_configuration.get('tts_batch_wait', 0))
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+from src.cli.stages import lazy_function
+from src.tracing.trace import trace_span
+
+get_mp3_length_v2 = lazy_function('src.video.record_html', 'get_mp3_length_v2')
+
+TEMPLATES_DIR = 'src/html/templates'
+
+
+def hash_parts(*parts):
+    """
+    Hash the given parts into a single hexadecimal key.
+
+    :param parts: The values identifying an artifact. They must be JSON serializable.
+    :return The SHA-256 hexadecimal digest of the parts.
+    :rtype str
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def hash_file(file_path, block_size=1 << 20):
+    """
+    Hash the content of a file.
+
+    :param file_path: The path to the file to hash.
+    :param block_size: The number of bytes read at a time.
+    :return The SHA-256 hexadecimal digest of the file content.
+    :rtype str
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_directory(directory):
+    """
+    Hash the names and contents of all files in a directory.
+
+    :param directory: The directory to hash.
+    :return The SHA-256 hexadecimal digest of the directory, or an empty string if it does not exist.
+    :rtype str
+    """
+    if not os.path.isdir(directory):
+        return ''
+    entries = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file in sorted(files):
+            file_path = os.path.join(root, file)
+            entries.append((os.path.relpath(file_path, directory), hash_file(file_path)))
+    return hash_parts(entries)
+
+
+def audio_artifact_key(row, tts_library, noise_reduction=False, model_name=None):
+    """
+    Return the cache key of a comment's mp3: its text, the TTS library and model that read it and whether it is
+    denoised.
+    """
+    parts = ('audio', tts_library, row['comment'])
+    if model_name is not None:
+        parts += (model_name,)
+    if noise_reduction:
+        parts += ('noise_reduction',)
+    return hash_parts(*parts)
+
+
+def video_artifact_key(row, version, extension, mp3_file):
+    """
+    Return the cache key of a comment's recording.
+
+    The recording is fully determined by the rendered HTML, i.e. the comment data and the template files of the
+    version, and by how long it is played, i.e. the duration of the audio.
+    """
+    row = row.to_dict() if hasattr(row, 'to_dict') else dict(row)
+    template_hash = hash_directory(os.path.join(TEMPLATES_DIR, version))
+    return hash_parts('video', version, template_hash, extension, row, get_mp3_length_v2(mp3_file))
+
+
+def combined_artifact_key(mp4_file, mp3_file):
+    """Return the cache key of a recording muxed with its audio, or None if either input is missing."""
+    if not os.path.exists(mp4_file) or not os.path.exists(mp3_file):
+        return None
+    return hash_parts('combined', hash_file(mp4_file), hash_file(mp3_file))
+
+
+def artifact_path(cache_dir, key, extension):
+    """Return the path of an artifact inside the cache directory."""
+    return os.path.join(cache_dir, key[:2], f'{key}{extension}')
+
+
+def link_file(source, destination):
+    """Hard-link source to destination, copying it instead if both are not on the same filesystem."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def fetch_artifact(cache_dir, key, destination):
+    """
+    Place a cached artifact at the destination path.
+
+    The artifact is hard-linked, so stages must write new files rather than rewrite cached ones in place.
+
+    :param cache_dir: The cache directory.
+    :param key: The cache key of the artifact.
+    :param destination: The path where the artifact is expected.
+    :return True if the artifact was found in the cache, False otherwise.
+    :rtype bool
+    """
+    cached_file = artifact_path(cache_dir, key, os.path.splitext(destination)[1])
+    if not os.path.exists(cached_file):
+        return False
+
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        link_file(cached_file, destination)
+    except FileNotFoundError:
+        # Evicted by a concurrent run of a batch since it was found
+        return False
+
+    # Mark the artifact as recently used for the eviction policy
+    try:
+        os.utime(cached_file)
+    except FileNotFoundError:
+        pass
+    print(f"Reused cached artifact for {destination}")
+    return True
+
+
+def store_artifact(cache_dir, key, source):
+    """
+    Add a freshly built artifact to the cache.
+
+    :param cache_dir: The cache directory.
+    :param key: The cache key of the artifact.
+    :param source: The path of the built artifact.
+    :return None
+    """
+    cached_file = artifact_path(cache_dir, key, os.path.splitext(source)[1])
+    if os.path.exists(cached_file):
+        return
+
+    os.makedirs(os.path.dirname(cached_file), exist_ok=True)
+    temp_file = f'{cached_file}.{uuid.uuid4().hex}.tmp'
+    link_file(source, temp_file)
+    os.replace(temp_file, cached_file)
+
+
+def evict_artifacts(cache_dir, max_size_bytes):
+    """
+    Remove the least recently used artifacts until the cache fits in the given size.
+
+    :param cache_dir: The cache directory.
+    :param max_size_bytes: The maximum total size of the cache in bytes.
+    :return The number of removed artifacts.
+    :rtype int
+    """
+    removed, _ = evict_least_recently_used(cache_dir, max_size_bytes)
+    return removed
+
+
+def evict_least_recently_used(cache_dir, max_size_bytes, target_size_bytes=None):
+    """
+    Remove the least recently used artifacts of a cache larger than the given size, until it fits in the target size.
+
+    The runs of a batch evict the same cache concurrently, so artifacts that another run removed in the meantime
+    are skipped, and artifacts that are still being stored are left alone.
+
+    :param cache_dir: The cache directory.
+    :param max_size_bytes: The maximum total size of the cache in bytes.
+    :param target_size_bytes: The size a cache larger than max_size_bytes is evicted down to, max_size_bytes by
+        default. A lower target leaves room for the next artifacts, so the cache is not walked again on every store.
+    :return The number of removed artifacts and their total size in bytes.
+    :rtype tuple[int, int]
+    """
+    if not os.path.isdir(cache_dir):
+        return 0, 0
+    if target_size_bytes is None:
+        target_size_bytes = max_size_bytes
+
+    artifacts = []
+    for root, dirs, files in os.walk(cache_dir):
+        for file in files:
+            if file.endswith('.tmp'):
+                continue
+            file_path = os.path.join(root, file)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            artifacts.append((stat.st_mtime, stat.st_size, file_path))
+
+    total_size = sum(size for _, size, _ in artifacts)
+    if total_size <= max_size_bytes:
+        return 0, 0
+    removed = removed_size = 0
+    for _, size, file_path in sorted(artifacts):
+        if total_size <= target_size_bytes:
+            break
+        try:
+            os.remove(file_path)
+            removed += 1
+            removed_size += size
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+    if removed:
+        print(f"Evicted {removed} artifacts from {cache_dir}")
+    return removed, removed_size
+
+
+def cached_task(func, cache_dir, key_func, output_file_func):
+    """
+    Wrap a pipeline stage function so that its output is served from the cache when its inputs did not change.
+
+    :param func: The stage function, called as ``func(index, row)``.
+    :param cache_dir: The cache directory.
+    :param key_func: Returns the cache key for ``(index, row)``, or None if the artifact must not be cached.
+    :param output_file_func: Returns the path of the artifact the stage produces for ``index``.
+    :return The wrapped stage function.
+    """
+    def task(index, row):
+        key = key_func(index, row)
+        output_file = output_file_func(index)
+        if key is not None:
+            with trace_span('cache_fetch', 'cache', comment=index):
+                if fetch_artifact(cache_dir, key, output_file):
+                    return
+
+        func(index, row)
+
+        if key is not None and os.path.exists(output_file):
+            with trace_span('cache_store', 'cache', comment=index):
+                store_artifact(cache_dir, key, output_file)
+
+    return task
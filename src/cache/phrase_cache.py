@@ -0,0 +1,199 @@
+"""
+A disk cache of the speech synthesized for chunks of text, shared by every comment and every run.
+
+Threads repeat a lot of text: quoted parents, "This.", the same comment rendered again the next day. Every chunk is
+cached under its normalized text and the engine, model, voice and language that read it, so a chunk read before is
+not sent to a TTS engine again. Coqui chunks are stored as 16-bit WAV, gTTS chunks as the MP3 the endpoint sent.
+
+The cache is capped in size and evicts the least recently used chunks, like the artifact cache, down to
+EVICTION_TARGET of its cap.
+"""
+import json
+import os
+import re
+import threading
+import uuid
+import wave
+
+import numpy as np
+
+from src.cache.artifact_cache import artifact_path, evict_least_recently_used, hash_parts
+
+# The engines that read text without its case. Coqui cleaners lowercase the text, gTTS reads "US" and "us" differently
+CASE_INSENSITIVE_ENGINES = ('tts',)
+# A full cache is evicted down to this share of its size cap, so it is not walked again on every chunk it stores
+EVICTION_TARGET = 0.9
+
+
+def normalize_phrase(text, fold_case=True):
+    """Return the text of a chunk as the TTS engines read it: without repeated whitespace, and without case."""
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.lower() if fold_case else text
+
+
+def directory_size(directory):
+    """Return the total size of the files in a directory, in bytes."""
+    size = 0
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            try:
+                size += os.path.getsize(os.path.join(root, file))
+            except FileNotFoundError:
+                pass
+    return size
+
+
+def write_wav(file_path, samples, sample_rate):
+    """Write mono samples, floats between -1 and 1, as a 16-bit WAV file."""
+    with wave.open(file_path, 'wb') as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(sample_rate)
+        file.writeframes((np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes())
+
+
+def read_wav(file_path):
+    """
+    Read a file written by write_wav.
+
+    :return The samples and their sample rate.
+    :rtype tuple[numpy.ndarray, int]
+    """
+    with wave.open(file_path, 'rb') as file:
+        frames = file.readframes(file.getnframes())
+        sample_rate = file.getframerate()
+    return np.frombuffer(frames, dtype='<i2').astype(np.float32) / 32767, sample_rate
+
+
+class PhraseCache:
+    """The speech of chunks of text, in a directory, with the hits and misses of this run."""
+
+    def __init__(self, directory, max_size_bytes):
+        """
+        :param directory: The cache directory, created if it does not exist.
+        :param max_size_bytes: The size beyond which the cache is evicted, down to EVICTION_TARGET of it.
+        """
+        self.directory = directory
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self.size = directory_size(directory)
+
+    def key(self, text, engine, model=None, voice=None, language=None):
+        """Return the cache key of a chunk of text read by a TTS engine."""
+        return hash_parts('phrase', engine, model, voice, language,
+                          normalize_phrase(text, fold_case=engine in CASE_INSENSITIVE_ENGINES))
+
+    def count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def find(self, key, extension):
+        """Return the path of a cached chunk marked as recently used, or None if it is not cached."""
+        cached_file = artifact_path(self.directory, key, extension)
+        try:
+            # Mark the chunk as recently used for the eviction policy
+            os.utime(cached_file)
+        except FileNotFoundError:
+            self.count(False)
+            return None
+        self.count(True)
+        return cached_file
+
+    def get(self, key, extension='.mp3'):
+        """Return the bytes of a cached chunk, or None if it is not cached."""
+        cached_file = self.find(key, extension)
+        if cached_file is None:
+            return None
+        try:
+            with open(cached_file, 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            # Evicted by a concurrent run since it was found
+            return None
+
+    def get_samples(self, key):
+        """
+        Return the samples of a cached chunk.
+
+        :return The samples and their sample rate, or None if the chunk is not cached.
+        :rtype tuple[numpy.ndarray, int] or None
+        """
+        cached_file = self.find(key, '.wav')
+        if cached_file is None:
+            return None
+        try:
+            return read_wav(cached_file)
+        except (FileNotFoundError, EOFError, wave.Error):
+            return None
+
+    def store(self, key, extension, write):
+        """Add a chunk written by write(file_path) to the cache, then evict it if it grew beyond its size cap."""
+        cached_file = artifact_path(self.directory, key, extension)
+        os.makedirs(os.path.dirname(cached_file), exist_ok=True)
+        temp_file = f'{cached_file}.{uuid.uuid4().hex}.tmp'
+        write(temp_file)
+        size = os.path.getsize(temp_file)
+        os.replace(temp_file, cached_file)
+
+        with self.lock:
+            self.size += size
+            evict = self.size > self.max_size_bytes
+        if evict:
+            _, removed_size = evict_least_recently_used(self.directory, self.max_size_bytes,
+                                                        int(self.max_size_bytes * EVICTION_TARGET))
+            with self.lock:
+                self.size = max(0, self.size - removed_size)
+
+    def put(self, key, data, extension='.mp3'):
+        """Add the bytes of a chunk to the cache."""
+        def write(file_path):
+            with open(file_path, 'wb') as file:
+                file.write(data)
+
+        self.store(key, extension, write)
+
+    def put_samples(self, key, samples, sample_rate):
+        """Add the samples of a chunk to the cache."""
+        self.store(key, '.wav', lambda file_path: write_wav(file_path, samples, sample_rate))
+
+    def statistics(self):
+        """
+        Return the hits and misses of this run and the size of the cache.
+
+        :rtype dict
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'size_bytes': self.size}
+
+
+def save_phrase_cache_report(phrase_cache, file_path):
+    """Write the statistics of the phrase cache of a run to a JSON file, and print them."""
+    statistics = phrase_cache.statistics()
+    with open(file_path, 'w') as file:
+        json.dump(statistics, file, indent=4)
+    print(f"Phrase cache: {statistics['hits']} hits, {statistics['misses']} misses "
+          f"({statistics['hit_rate']:.0%} hit rate)")
+
+
+def create_phrase_cache(configuration):
+    """
+    Create the phrase cache of the [cache] section of a configuration.
+
+    :param configuration: The run configuration.
+    :return The phrase cache, or None if it is disabled.
+    :rtype PhraseCache or None
+    """
+    cache_configuration = configuration.get('cache', {})
+    if not cache_configuration.get('enabled', False) or not cache_configuration.get('phrases', False):
+        return None
+    return PhraseCache(cache_configuration.get('phrase_directory', '.cache/phrases'),
+                       cache_configuration.get('phrase_max_size_mb', 512) * 1024 * 1024)
@@ -0,0 +1,147 @@
+import copy
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import toml
+
+from src.video.recorder_pool import create_recorder_pool
+
+
+class SharedResources:
+    """
+    Expensive resources shared by every job of a batch.
+
+    The slots bound how many comments are synthesized, recorded and muxed at the same time across all jobs, the
+    recorder pool keeps its virtual displays and browsers between jobs, and the memory governor admits the work of
+    every job against a single memory budget. The TTS server keeps the TTS models of every job loaded in its
+    worker processes; without it the models are loaded once per process by the audio stage itself. The gTTS client
+    shares its connections and its rate limit between the comments of every job, and the noise reducer its worker
+    processes and the noise profiles of the TTS models. Without a recorder pool the browsers are kept open by the
+    video stage of this process.
+    """
+
+    def __init__(self, audio_slots=1, video_slots=1, ffmpeg_slots=2, governor=None, tts_server=None,
+                 gtts_client=None, noise_reducer=None):
+        self.audio_slots = threading.BoundedSemaphore(max(1, audio_slots))
+        self.video_slots = threading.BoundedSemaphore(max(1, video_slots))
+        self.ffmpeg_slots = threading.BoundedSemaphore(max(1, ffmpeg_slots))
+        self.recorder_pool = create_recorder_pool(video_slots) if video_slots > 1 else None
+        self.governor = governor
+        self.tts_server = tts_server
+        self.gtts_client = gtts_client
+        self.noise_reducer = noise_reducer
+
+    def shutdown(self):
+        if self.recorder_pool is not None:
+            self.recorder_pool.shutdown()
+        if self.tts_server is not None:
+            self.tts_server.shutdown()
+        if self.gtts_client is not None:
+            self.gtts_client.close()
+        if self.noise_reducer is not None:
+            self.noise_reducer.close()
+        if self.governor is not None:
+            self.governor.close()
+
+
+def new_run_id(prefix=''):
+    """
+    Return a run ID that is unique even for runs started in the same second.
+
+    :param prefix: An optional prefix, e.g. the ID of a batch job.
+    :return The timestamp of the run followed by the prefix and a random suffix.
+    :rtype str
+    """
+    parts = [time.strftime("%Y%m%d-%H%M%S")]
+    if prefix:
+        parts.append(str(prefix))
+    parts.append(uuid.uuid4().hex[:8])
+    return '-'.join(parts)
+
+
+def read_jobs(queue_file):
+    """
+    Read a JSONL queue of batch jobs.
+
+    Every line is a job with the post ``url``, an optional ``id`` and optional ``overrides`` of the configuration,
+    e.g. ``{"url": "...", "overrides": {"html_generation": {"version": "v3"}}}``.
+
+    :param queue_file: The path to the JSONL queue.
+    :return The jobs, in queue order.
+    :rtype list[dict]
+    """
+    jobs = []
+    with open(queue_file) as queue:
+        for line_number, line in enumerate(queue, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            job = json.loads(line)
+            if not job.get('url'):
+                raise ValueError(f"Job on line {line_number} of '{queue_file}' has no 'url'.")
+            job.setdefault('id', f'job{line_number}')
+            job.setdefault('overrides', {})
+            jobs.append(job)
+    return jobs
+
+
+def merge_configuration(configuration, job):
+    """
+    Apply the URL and overrides of a job to a copy of the base configuration.
+
+    :param configuration: The base configuration.
+    :param job: The job as returned by read_jobs.
+    :return The configuration of the job.
+    :rtype dict
+    """
+    merged = copy.deepcopy(configuration)
+    for section, values in job['overrides'].items():
+        if isinstance(values, dict):
+            merged.setdefault(section, {}).update(values)
+        else:
+            merged[section] = values
+
+    data_source = merged.setdefault('data_source', {})
+    data_source['url'] = job['url']
+    data_source['samples'] = False
+    # Nobody is there to answer prompts in a batch
+    data_source['default_name'] = True
+    return merged
+
+
+def run_batch(jobs, configuration, run_job, workers=1):
+    """
+    Run batch jobs with a bounded pool of workers.
+
+    :param jobs: The jobs as returned by read_jobs.
+    :param configuration: The base configuration the job overrides are applied to.
+    :param run_job: Runs a single job, called as ``run_job(configuration, output_dir)``.
+    :param workers: The number of jobs that run at the same time.
+    :return The result of every job, in queue order.
+    :rtype list[dict]
+    """
+    def run(job):
+        output_dir = f'output_{new_run_id(job["id"])}'
+        os.makedirs(output_dir)
+        job_configuration = merge_configuration(configuration, job)
+        with open(os.path.join(output_dir, 'updated_config.toml'), 'w') as output_file:
+            toml.dump(job_configuration, output_file)
+
+        start_time = time.time()
+        result = {'id': job['id'], 'url': job['url'], 'output_dir': output_dir}
+        try:
+            run_job(job_configuration, output_dir)
+            result['status'] = 'done'
+        except Exception as e:
+            print(f"Job {job['id']} failed: {e}")
+            result['status'] = 'failed'
+            result['error'] = str(e)
+        result['duration'] = time.time() - start_time
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='job') as executor:
+        return list(executor.map(run, jobs))
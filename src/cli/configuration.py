@@ -3,8 +3,6 @@ import time
 
 import toml
 
-from src.cli.inputs import get_version, get_tts_library
-
 
 def read_config(file_path):
     if not os.path.exists(file_path):
@@ -17,6 +15,9 @@ def read_config(file_path):
 
 
 def query_input(block, section, config_folder_path):
+    # Imported here, the prompts are only needed when the configuration leaves a value empty
+    from src.cli.inputs import get_version, get_tts_library
+
     if block.get('enabled', True):
         for key, value in block.items():
             if 'version' in block and block['version'] == "":
@@ -1,7 +1,11 @@
-import pandas as pd
+import sys
+
+from src.reddit.comments import CommentCollection
 
 
 def convert_data_to_dataframe(data):
+    import pandas as pd
+
     print(f"Original data: {data}")
 
     # Check if the first element of the tuple is a DataFrame
@@ -16,3 +20,24 @@ def convert_data_to_dataframe(data):
     print(f"Converted data: {data}")
 
     return data
+
+
+def convert_data_to_comments(data):
+    """
+    Convert the data returned by get_comments into a CommentCollection.
+
+    :param data: A CommentCollection, a pandas DataFrame, or a tuple whose first element is one of them.
+    :return The comments.
+    :rtype CommentCollection
+    """
+    if isinstance(data, tuple):
+        data = data[0]
+
+    if isinstance(data, CommentCollection):
+        return data
+    # Data can only be a DataFrame if pandas was imported, runs that never use it do not pay for its import
+    pd = sys.modules.get('pandas')
+    if pd is not None and isinstance(data, pd.DataFrame):
+        return CommentCollection.from_dataframe(data)
+
+    raise TypeError("The 'data' parameter must be a CommentCollection, a pandas DataFrame or a tuple containing one.")
@@ -0,0 +1,282 @@
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+from src.tracing.trace import trace_span
+
+MEGABYTE = 1024 * 1024
+
+# Starting estimates of the memory a heavy stage needs, until its peak has been measured: a Coqui model and its
+# inference, a Chrome instance with ffmpeg grabbing the screen, a moviepy mux with its ffmpeg. Rendering HTML is
+# too light to be worth measuring.
+DEFAULT_ESTIMATES_MB = {
+    'audio': 2000,
+    'video': 800,
+    'combining': 500,
+}
+
+# A measured peak below this fraction of the configured guess is not trusted to replace it: the run may have reused
+# memory loaded by an earlier one, e.g. a cached TTS model, or ended between two samples
+PLAUSIBLE_FRACTION = 0.25
+
+
+def process_rss(pid):
+    """
+    Return the resident memory of a process in bytes, or 0 if it cannot be read.
+
+    :param pid: The process ID.
+    :rtype int
+    """
+    try:
+        with open(f'/proc/{pid}/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def child_processes():
+    """Return the IDs of the children of every process, by parent process ID."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as file:
+                # The command name can contain spaces, the fields after it cannot
+                parent_pid = int(file.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent_pid, []).append(int(entry))
+    return children
+
+
+def process_tree_rss(pid=None):
+    """
+    Return the resident memory of a process and all its descendants in bytes: the recorder processes, Chrome,
+    chromedriver and ffmpeg.
+
+    Without /proc only the peak resident memory of the process itself is known, which is returned instead.
+
+    :param pid: The root of the process tree, the current process by default.
+    :rtype int
+    """
+    pid = pid or os.getpid()
+    if not os.path.isdir('/proc'):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    children = child_processes()
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        total += process_rss(current)
+        pending.extend(children.get(current, []))
+    return total
+
+
+def total_memory():
+    """Return the physical memory of the machine in bytes."""
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+
+class MemoryGovernor:
+    """
+    Admit heavy work only while the memory it needs fits in a budget.
+
+    Every stage type reserves its estimated peak memory while it runs. The estimate starts from a configured guess
+    and follows the largest growth of the resident memory of the process tree measured while a stage of that type
+    ran successfully, once one of them reached a plausible fraction of the guess. Until then the guess is kept.
+
+    The growth of the whole tree is measured, so stages that overlap see the growth of each other. The reservations
+    of the stages that ran next to a stage are subtracted from its growth, which errs on the side of measuring too
+    little, and the plausibility threshold keeps such measurements from shrinking the guess.
+    Work is always admitted when nothing else runs, so a stage larger than the budget still runs, on its own.
+    """
+
+    def __init__(self, budget_bytes, estimates=None, sample_interval=0.25):
+        """
+        :param budget_bytes: The memory all admitted work can use together.
+        :param estimates: The estimated peak memory of each stage type in bytes, until it is measured.
+        :param sample_interval: The seconds between two measurements of the memory of the process tree.
+        """
+        self.budget = budget_bytes
+        self.estimates = dict(estimates or {})
+        self.guesses = dict(self.estimates)
+        self.measured = set()
+        self.condition = threading.Condition()
+        self.reserved = 0
+        self.admitted = 0
+        self.running = []
+        self.waits = {}
+        self.peaks = {}
+        self.overlapped = {}
+
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample_periodically, args=(sample_interval,),
+                                        name='memory-sampler', daemon=True)
+        self.sampler.start()
+
+    def estimate(self, stage):
+        """Return the memory reserved for a stage in bytes."""
+        return self.estimates.get(stage, 0)
+
+    @contextmanager
+    def admit(self, stage):
+        """
+        Wait until the estimated memory of a stage fits in the budget, and reserve it while the block runs.
+
+        :param stage: The stage type, e.g. 'audio'.
+        """
+        start = time.perf_counter()
+        with trace_span('admission', 'admission', stage=stage):
+            with self.condition:
+                estimate = self.estimate(stage)
+                while self.admitted and self.reserved + estimate > self.budget:
+                    self.condition.wait()
+                    # Measurements of the running stages may have changed the estimate
+                    estimate = self.estimate(stage)
+                self.reserved += estimate
+                self.admitted += 1
+                self.waits.setdefault(stage, []).append(time.perf_counter() - start)
+
+        # The process tree is measured outside of the lock, it takes a scan of /proc
+        rss = process_tree_rss()
+        work = {'stage': stage, 'start_rss': rss, 'peak_rss': rss, 'reserved': estimate, 'concurrent': 0}
+        with self.condition:
+            # Work running at the same time grows the same process tree
+            for other in self.running:
+                other['concurrent'] += estimate
+                work['concurrent'] += other['reserved']
+            self.running.append(work)
+
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            rss = process_tree_rss()
+            with self.condition:
+                self.running.remove(work)
+                self.reserved -= work['reserved']
+                self.admitted -= 1
+                # A failed stage may have stopped before its peak, its growth says nothing about the stage
+                if succeeded:
+                    growth = max(work['peak_rss'], rss) - work['start_rss'] - work['concurrent']
+                    self.record_peak(stage, max(0, growth), overlapped=work['concurrent'] > 0)
+                self.condition.notify_all()
+
+    def record_peak(self, stage, growth, overlapped=False):
+        """
+        Record the memory growth measured while a stage ran successfully.
+
+        The configured guess is kept as long as it is larger than every measurement and no measurement was
+        plausible. After a plausible measurement, the estimate is the largest measurement.
+
+        :param stage: The stage type.
+        :param growth: The growth of the process tree in bytes, without the reservations of concurrent stages.
+        :param overlapped: Whether other stages ran at the same time.
+        """
+        self.peaks[stage] = max(self.peaks.get(stage, 0), growth)
+        if overlapped:
+            self.overlapped[stage] = self.overlapped.get(stage, 0) + 1
+
+        guess = self.guesses.get(stage, 0)
+        if stage not in self.measured and growth >= guess * PLAUSIBLE_FRACTION:
+            self.measured.add(stage)
+        if stage in self.measured:
+            self.estimates[stage] = self.peaks[stage]
+        else:
+            self.estimates[stage] = max(guess, self.peaks[stage])
+
+    def sample(self):
+        """Measure the memory of the process tree and update the peak of every running stage."""
+        rss = process_tree_rss()
+        with self.condition:
+            for work in self.running:
+                work['peak_rss'] = max(work['peak_rss'], rss)
+
+    def sample_periodically(self, interval):
+        while not self.stopped.wait(interval):
+            if self.running:
+                self.sample()
+
+    def report(self):
+        """
+        Return how long every stage type waited for admission and how much memory it needed.
+
+        :rtype dict
+        """
+        with self.condition:
+            report = {'budget_mb': self.budget / MEGABYTE, 'stages': {}}
+            for stage, waits in self.waits.items():
+                ordered = sorted(waits)
+                report['stages'][stage] = {
+                    'admitted': len(waits),
+                    'total_wait': sum(waits),
+                    'max_wait': ordered[-1],
+                    'p90_wait': ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))],
+                    'peak_mb': self.peaks.get(stage, 0) / MEGABYTE,
+                    'estimate_mb': self.estimate(stage) / MEGABYTE,
+                    'measured': stage in self.measured,
+                    'overlapped': self.overlapped.get(stage, 0),
+                }
+            return report
+
+    def close(self):
+        self.stopped.set()
+
+
+def create_governor(configuration):
+    """
+    Create the memory governor of the [memory] section of a configuration.
+
+    :param configuration: The run configuration.
+    :return The governor, or None if admission control is disabled.
+    :rtype MemoryGovernor or None
+    """
+    memory_configuration = configuration.get('memory', {})
+    if not memory_configuration.get('enabled', False):
+        return None
+
+    # Without a budget, admitted work can use most of the machine
+    budget_mb = memory_configuration.get('budget_mb') or total_memory() * 0.8 / MEGABYTE
+    estimates = {stage: memory_configuration.get(f'{stage}_mb', default_mb) * MEGABYTE
+                 for stage, default_mb in DEFAULT_ESTIMATES_MB.items()}
+    return MemoryGovernor(budget_mb * MEGABYTE, estimates, memory_configuration.get('sample_interval', 0.25))
+
+
+def governed_task(func, governor, stage):
+    """
+    Wrap a pipeline stage function so that it only runs once the governor admits it.
+
+    :param func: The stage function, called as ``func(index, row)``.
+    :param governor: The memory governor.
+    :type governor: MemoryGovernor
+    :param stage: The stage type the memory is reserved for.
+    :return The wrapped stage function.
+    """
+    def task(index, row):
+        with governor.admit(stage):
+            return func(index, row)
+
+    return task
+
+
+def print_admission_report(report):
+    """
+    Print how long every stage type waited for admission and the memory it reserves.
+
+    Peaks are measured on the whole process tree. For runs that overlapped other stages, the reservations of those
+    stages are subtracted, so these peaks are lower bounds.
+    """
+    print(f"Memory budget: {report['budget_mb']:.0f} MB")
+    for stage, stage_report in sorted(report['stages'].items()):
+        source = 'measured' if stage_report['measured'] else 'configured guess'
+        print(f"  {stage}: {stage_report['admitted']} admitted, waited {stage_report['total_wait']:.1f} s in total "
+              f"(p90 {stage_report['p90_wait']:.2f} s, max {stage_report['max_wait']:.2f} s), "
+              f"peak {stage_report['peak_mb']:.0f} MB, reserves {stage_report['estimate_mb']:.0f} MB ({source})")
+        if stage_report['overlapped']:
+            print(f"    {stage_report['overlapped']} run(s) overlapped other stages: their reservations were "
+                  f"subtracted from the tree growth, so the peak may be too low")
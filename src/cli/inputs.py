@@ -1,12 +1,27 @@
+import csv
 import os
 import time
 
-import pandas as pd
+from src.audio_generation.tts_server import DEFAULT_MODEL
+from src.cli.converters import convert_data_to_comments
+from src.cli.stages import lazy_function
+from src.html.generate_html import generate_html
+from src.reddit.columnar import COLUMNS_EXTENSION
+from src.reddit.comments import FIELDNAMES, CommentCollection
+from src.reddit.dataset_manifest import SAMPLES_DIR, DatasetManifest, end_offset
+from src.video.recorder_pool import create_recorder_pool
 
-from src.audio_generation.generate_audio import generate_audio_gtts, generate_audio_mozilla_tts
-from src.reddit.fetch_subreddit import fetch_subreddit
-from src.video.combine_video_audio import combine_video_audio
-from src.video.record_html import record_mp4_task
+# Heavy dependencies (TTS, noisereduce, praw, moviepy, selenium) are only imported by the stages that use them
+generate_audio_gtts = lazy_function('src.audio_generation.generate_audio', 'generate_audio_gtts')
+generate_audio_mozilla_tts = lazy_function('src.audio_generation.generate_audio', 'generate_audio_mozilla_tts')
+fetch_subreddit = lazy_function('src.reddit.fetch_subreddit', 'fetch_subreddit')
+stream_subreddit = lazy_function('src.reddit.fetch_subreddit', 'stream_subreddit')
+default_file_name = lazy_function('src.reddit.fetch_subreddit', 'default_file_name')
+combine_video_audio = lazy_function('src.video.combine_video_audio', 'combine_video_audio')
+record_mp4_task = lazy_function('src.video.record_html', 'record_mp4_task')
+
+# Written next to the comments of a streaming run once every comment to render was streamed
+COMPLETE_SUFFIX = '.complete'
 
 
 def list_csv_files(directory):
@@ -21,6 +36,18 @@ def list_csv_files(directory):
     return sorted([f for f in os.listdir(directory) if f.endswith('.csv')])
 
 
+def list_dataset_files(directory):
+    """
+    Return a sorted list of the CSV files and columnar datasets in the specified directory.
+
+    :param directory: The directory to search for datasets.
+    :type directory: str
+    :return A sorted list of dataset file names.
+    :rtype list[str]
+    """
+    return sorted([f for f in os.listdir(directory) if f.endswith(('.csv', COLUMNS_EXTENSION))])
+
+
 def list_folders(directory):
     """
     Return a sorted list of folder names present in the given directory.
@@ -33,7 +60,8 @@ def list_folders(directory):
     return sorted([f for f in os.listdir(directory) if os.path.isdir(os.path.join(directory, f))])
 
 
-def fetch_comments(configuration):
+def post_and_limit(configuration):
+    """Return the URL of the post and the number of top comments of a [data_source] section, prompting if unset."""
     if configuration['url']:
         post_url = configuration['url']
     else:
@@ -43,38 +71,135 @@ def fetch_comments(configuration):
         limit = configuration['comments_qty']
     else:
         limit = int(input('Enter the number of top comments to fetch (required): '))
+    return post_url, limit
 
-    # Fetch top comments from the subreddit post
-    fetch_subreddit(post_url, limit, configuration['default_name'])
 
-    # List CSV files in the samples directory
-    samples_dir = 'samples'
-    csv_files = list_csv_files(samples_dir)
+def fetcher_options(configuration):
+    """Return the fetcher and cache options of fetch_subreddit configured in a [data_source] section."""
+    # Every thread is expanded with concurrent requests if configured
+    options = {}
+    if configuration.get('fetcher') == 'concurrent':
+        options = {'base_url': configuration.get('base_url', 'https://oauth.reddit.com'),
+                   'workers': configuration.get('fetch_workers', 8)}
+    if configuration.get('cache_ttl') or configuration.get('delta'):
+        # Repeated runs on the same post read its comments from disk until the time to live expires
+        options.update(cache_file=configuration.get('cache_file', '.cache/reddit.sqlite'),
+                       cache_ttl=configuration.get('cache_ttl', 0))
+    return options
+
+
+def stream_comments(configuration, comments_file):
+    """
+    Fetch the top comments of a post and yield them in rank order while the others are still being extracted.
+
+    The dataset of the post is written to the samples directory once every comment was extracted. Every rendered
+    comment is written to comments_file before it is yielded, and a marker next to it once the last one was, so an
+    interrupted run can be resumed, see comments_complete.
+
+    :param configuration: The [data_source] section of the configuration.
+    :param comments_file: The copy of the rendered comments in the output directory of the run.
+    :return A generator of the comments to render.
+    """
+    if configuration.get('delta'):
+        raise ValueError('The delta mode compares every comment with the previous fetch, it cannot stream them')
+    post_url, limit = post_and_limit(configuration)
+    output_file = os.path.join(SAMPLES_DIR, default_file_name(post_url, configuration.get('dataset_format', 'csv')))
+
+    # Replies come after the top comments they belong to, like load_comments only the first rows are rendered
+    render_limit = configuration['comments_qty'] or None
+    complete_file = comments_file + COMPLETE_SUFFIX
+    if os.path.exists(complete_file):
+        os.remove(complete_file)
+    rendered = 0
+    with open(comments_file, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        for comment in stream_subreddit(post_url, limit, output_file, **fetcher_options(configuration)):
+            if render_limit is None or rendered < render_limit:
+                # The comment is on disk before its stages start
+                writer.writerow(comment.to_dict())
+                csvfile.flush()
+                rendered += 1
+                yield comment
+    open(complete_file, 'w').close()
+
+
+def is_streaming(configuration):
+    """Return whether the comments of a [data_source] section are streamed while they are fetched."""
+    return bool(configuration.get('streaming')) and not configuration.get('samples')
+
+
+def comments_complete(configuration, comments_file):
+    """
+    Return whether the copy of the comments of a run holds every comment to render, so a resumed run can use it.
+
+    The copy of a streaming run is written comment by comment, it is only complete once its marker is written.
+
+    :param configuration: The [data_source] section of the configuration of the run.
+    :param comments_file: The copy of the rendered comments in the output directory of the run.
+    :rtype bool
+    """
+    if not os.path.exists(comments_file):
+        return False
+    return not is_streaming(configuration) or os.path.exists(comments_file + COMPLETE_SUFFIX)
 
-    if not csv_files:
+
+def fetch_comments(configuration):
+    post_url, limit = post_and_limit(configuration)
+
+    # Fetch top comments from the subreddit post
+    options = fetcher_options(configuration)
+    if configuration.get('delta'):
+        options['delta'] = True
+    if configuration.get('dataset_format', 'csv') != 'csv':
+        options['dataset_format'] = configuration['dataset_format']
+    comments = fetch_subreddit(post_url, limit, configuration['default_name'], **options)
+    if configuration.get('delta'):
+        # Every comment is rendered, the artifacts of those that did not change come from the artifact cache
+        print(f"Comments to render again: {[rank for rank, _ in comments.updated]}")
+        comments = comments.comments
+    if configuration['default_name'] and comments is not None:
+        # The fetched comments are used as they are, without reading them back from disk
+        return comments
+
+    manifest = DatasetManifest(SAMPLES_DIR)
+    # Datasets that are not in the manifest come first, then the recorded ones from the oldest to the latest fetch
+    entries = {entry['file_name']: entry for entry in manifest.entries()}
+    dataset_files = [file for file in list_dataset_files(SAMPLES_DIR) if file not in entries]
+    dataset_files += [file for file in entries if os.path.exists(os.path.join(SAMPLES_DIR, file))]
+
+    if not dataset_files:
         print("No CSV files found in the samples directory.")
         return None
 
     # Display CSV file options to the user
     print("Select a CSV file:")
-    for i, file in enumerate(csv_files):
-        print(f"{i + 1}: {file}")
+    for i, file in enumerate(dataset_files):
+        entry = entries.get(file)
+        if entry is None:
+            print(f"{i + 1}: {file}")
+        else:
+            fetched_at = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['fetched_at']))
+            print(f"{i + 1}: {file} ({entry['rows']} comments of post {entry['post_id']}, fetched {fetched_at})")
 
     # Prompt for CSV file selection
-    csv_file_index = None
+    dataset_index = None
     if configuration['default_name']:
-        csv_file_index = len(csv_files)
+        dataset_index = len(dataset_files)
     else:
-        while csv_file_index not in range(1, len(csv_files) + 1):
+        while dataset_index not in range(1, len(dataset_files) + 1):
             try:
-                csv_file_index = int(input(f"Enter the number corresponding to the CSV file (1-{len(csv_files)}): "))
+                dataset_index = int(input(f"Enter the number corresponding to the CSV file "
+                                          f"(1-{len(dataset_files)}): "))
             except ValueError:
                 pass
 
-    csv_file = os.path.join(samples_dir, csv_files[csv_file_index - 1])
+    dataset_file = dataset_files[dataset_index - 1]
 
-    # Read CSV Data
-    return pd.read_csv(csv_file)
+    # Read only the rows that are rendered
+    entry = entries.get(dataset_file)
+    return CommentCollection.load(os.path.join(SAMPLES_DIR, dataset_file), limit,
+                                  end_offset(entry, limit) if entry is not None else None)
 
 
 def combine_video_audio_task(index, row, output_dir):
@@ -106,21 +231,57 @@ def select_version(templates_dir):
     return version
 
 
-def generate_audio_files(data, tts_library, output_dir):
+def generate_audio_task(index, row, tts_library, output_dir, tts_server=None, gtts_client=None, phrase_cache=None,
+                        noise_reducer=None, model_name=DEFAULT_MODEL):
+    """
+    Generate the audio file for a single comment using the specified TTS library, and Coqui model with 'tts'.
+
+    With a TTS server, the Coqui models of its warm worker processes synthesize the audio. With a gTTS client, the
+    requests of every comment share its connections and its rate limit. With a phrase cache, the chunks of text
+    read before by any comment of any run are not synthesized again. With a noise reducer, the background noise of
+    the Coqui speech is reduced against the noise profile of its model.
+    """
+    if tts_library == 'gtts':
+        generate_audio_gtts(row['comment'], f'{output_dir}/comment_{index}.mp3', 'en', gtts_client=gtts_client,
+                            phrase_cache=phrase_cache)
+    else:
+        generate_audio_mozilla_tts(row['comment'], f'{output_dir}/comment_{index}.mp3', model_name,
+                                   tts_server=tts_server, phrase_cache=phrase_cache, noise_reducer=noise_reducer)
+
+
+def generate_html_task(index, row, output_dir, version):
+    """Generate the HTML file for a single comment using the specified HTML template version."""
+    html_file = os.path.join(output_dir, f'comment_{index}.html')
+    generate_html(row, html_file, version)
+
+
+def generate_audio_files(data, tts_library, output_dir, tts_server=None, gtts_client=None, phrase_cache=None,
+                         noise_reducer=None, model_name=DEFAULT_MODEL):
     """Generate audio files for each comment in the data using the specified TTS library."""
 
-    for index, row in data.iterrows():
-        if tts_library == 'gtts':
-            generate_audio_gtts(row['comment'], 'en', f'{output_dir}/comment_{index}.mp3')
-        else:
-            generate_audio_mozilla_tts(row['comment'], f'{output_dir}/comment_{index}.mp3')
+    for index, row in convert_data_to_comments(data).items():
+        generate_audio_task(index, row, tts_library, output_dir, tts_server, gtts_client, phrase_cache, noise_reducer,
+                            model_name)
 
 
-def record_videos(data, version, output_dir, extension):
-    """Record videos for each comment in the data using the specified HTML template version."""
+def record_videos(data, version, output_dir, extension='mp4', workers=1):
+    """
+    Record videos for each comment in the data using the specified HTML template version.
+
+    With more than one worker, the comments are recorded side by side by a pool of recorder processes, each with its
+    own virtual display and browser.
+    """
+
+    if workers <= 1:
+        for index, row in convert_data_to_comments(data).items():
+            record_mp4_task(index, row, output_dir, version, extension)
+        return
 
-    for index, row in data.iterrows():
-        record_mp4_task(index, row, output_dir, version, extension)
+    with create_recorder_pool(workers) as pool:
+        futures = [pool.submit(record_mp4_task, index, row, output_dir, version, extension)
+                   for index, row in convert_data_to_comments(data).items()]
+        for future in futures:
+            future.result()
 
 
 def get_comments(configuration):
@@ -130,7 +291,8 @@ def get_comments(configuration):
 
     if use_default:
         # Default comment data
-        data = pd.read_csv('samples/comments.csv')
+        data = CommentCollection.from_csv('samples/comments.csv',
+                                          configuration['data_source'].get('comments_qty') or None)
     else:
         data = fetch_comments(configuration['data_source'])
         if data is None:
@@ -164,6 +326,13 @@ def create_output_directory():
     # Create a directory with the current timestamp
     timestamp = time.strftime("%Y%m%d-%H%M%S")
     output_dir = f'output_{timestamp}'
-    os.makedirs(output_dir, exist_ok=True)
 
-    return output_dir
+    # Runs started in the same second get a numbered directory instead of sharing one
+    suffix = 0
+    while True:
+        try:
+            os.makedirs(output_dir)
+            return output_dir
+        except FileExistsError:
+            suffix += 1
+            output_dir = f'output_{timestamp}-{suffix}'
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from src.video.store_metadata import probe_duration
+
+JOURNAL_FILE = 'journal.jsonl'
+MEDIA_EXTENSIONS = ('.mp3', '.mp4', '.mkv')
+
+journal_lock = threading.Lock()
+
+
+class CompletedStages(dict):
+    """The artifacts of the completed stages of a run by (index, stage), with the key of the row each was built from."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rows = {}
+
+
+def row_key(row):
+    """Return a short hash of a comment, to tell whether an index still holds the same comment."""
+    row = row.to_dict() if hasattr(row, 'to_dict') else dict(row)
+    return hashlib.sha1(json.dumps(row, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def record_stage(output_dir, index, stage, artifact, row=None):
+    """
+    Append a completed stage of a comment to the journal of a run.
+
+    Every entry is flushed to disk before returning, so the journal survives the run being killed.
+
+    :param output_dir: The output directory of the run.
+    :param index: The index of the comment.
+    :param stage: The completed stage: audio, html, mp4 or with_audio.
+    :param artifact: The path of the file the stage produced.
+    :param row: The comment the artifact was built from, whose key is recorded with the stage.
+    :return None
+    """
+    entry = {'index': index, 'stage': stage, 'artifact': artifact, 'time': time.time()}
+    if row is not None:
+        entry['row'] = row_key(row)
+    entry = json.dumps(entry)
+    with journal_lock:
+        with open(os.path.join(output_dir, JOURNAL_FILE), 'a') as journal:
+            journal.write(entry + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+
+
+def read_journal(output_dir):
+    """
+    Read the completed stages of a run.
+
+    :param output_dir: The output directory of the run.
+    :return A dictionary mapping (index, stage) to the artifact path recorded for it, with the keys of the rows the
+        artifacts were built from in its rows attribute.
+    :rtype CompletedStages
+    """
+    completed = CompletedStages()
+    journal_file = os.path.join(output_dir, JOURNAL_FILE)
+    if not os.path.exists(journal_file):
+        return completed
+
+    with open(journal_file) as journal:
+        for line in journal:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # The last line is cut short if the run was killed while writing it
+                continue
+            completed[(entry['index'], entry['stage'])] = entry['artifact']
+            if 'row' in entry:
+                completed.rows[(entry['index'], entry['stage'])] = entry['row']
+            else:
+                completed.rows.pop((entry['index'], entry['stage']), None)
+
+    return completed
+
+
+def is_artifact_valid(file_path):
+    """
+    Check that an artifact exists and, for audio and video files, that ffprobe can read a duration from it.
+
+    :param file_path: The path of the artifact.
+    :return True if the artifact can be used as it is.
+    :rtype bool
+    """
+    if not os.path.isfile(file_path) or os.path.getsize(file_path) == 0:
+        return False
+    if file_path.endswith(MEDIA_EXTENSIONS):
+        duration = probe_duration(file_path)
+        return duration is not None and duration > 0
+    return True
+
+
+def journaled_task(func, output_dir, stage, output_file_func, completed=None, downstream=()):
+    """
+    Wrap a pipeline stage function so that its completion is journaled and journaled work is not redone.
+
+    :param func: The stage function, called as ``func(index, row)``.
+    :param output_dir: The output directory of the run.
+    :param stage: The name of the stage in the journal.
+    :param output_file_func: Returns the path of the artifact the stage produces for ``index``.
+    :param completed: The journal of a previous attempt of the run, as returned by read_journal. Entries of
+        downstream stages are dropped from it when this stage has to be redone. An entry recorded for another comment
+        at the same index, e.g. after the post was fetched again and ranked differently, is redone too.
+    :param downstream: The stages built from this stage's artifact.
+    :return The wrapped stage function.
+    """
+    completed = CompletedStages() if completed is None else completed
+    rows = getattr(completed, 'rows', {})
+
+    def task(index, row):
+        output_file = output_file_func(index)
+        same_row = (index, stage) not in rows or rows[(index, stage)] == row_key(row)
+        if (index, stage) in completed and same_row and is_artifact_valid(output_file):
+            print(f"Skipping {stage} of comment {index}, already completed")
+            return
+
+        # A missing or corrupt artifact is rebuilt from scratch, some stages append to an existing file
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        for downstream_stage in downstream:
+            completed.pop((index, downstream_stage), None)
+
+        func(index, row)
+
+        if os.path.exists(output_file):
+            record_stage(output_dir, index, stage, output_file, row)
+
+    return task
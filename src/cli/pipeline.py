@@ -0,0 +1,114 @@
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+Stage = namedtuple('Stage', ['name', 'func', 'workers'])
+
+
+class PipelineError(Exception):
+    """Raised when a stage failed for some of the comments of a run."""
+
+    def __init__(self, errors):
+        """
+        :param errors: The (stage name, exception) tuple of every failed item, by index, as returned by run_pipeline.
+        """
+        self.errors = errors
+        failures = ', '.join(f"comment {index} in stage '{stage}': {exception}"
+                             for index, (stage, exception) in sorted(errors.items()))
+        super().__init__(f"{len(errors)} comment(s) failed: {failures}")
+
+
+def raise_for_errors(errors):
+    """Raise a PipelineError if run_pipeline returned errors."""
+    if errors:
+        raise PipelineError(errors)
+
+
+def run_pipeline(items, stages):
+    """
+    Run every item through a chain of stages, each stage with its own worker pool.
+
+    An item enters the next stage as soon as it leaves the previous one, so different stages work on different
+    comments at the same time instead of waiting for the whole batch. An item whose stage raises is dropped from
+    the remaining stages; the other items keep going.
+
+    Items are consumed as they are produced: the first stage starts on the first item while a generator is still
+    producing the next ones. An error raised by the iterable is raised once the items already submitted are done.
+
+    :param items: An iterable of (index, row) pairs, e.g. ``DataFrame.iterrows()`` or a generator of fetched comments.
+    :type items: iterable
+    :param stages: The stages to run, in order. Each stage function is called as ``func(index, row)``.
+    :type stages: list[Stage]
+    :return A dictionary mapping the index of every failed item to a (stage name, exception) tuple.
+    :rtype dict
+    """
+    errors = {}
+    if not stages:
+        # A generator may write its results once it is exhausted
+        for _ in items:
+            pass
+        return errors
+
+    executors = [ThreadPoolExecutor(max_workers=max(1, stage.workers), thread_name_prefix=stage.name)
+                 for stage in stages]
+    lock = threading.Lock()
+    finished = threading.Event()
+    # The number of items in flight, and whether every item was submitted
+    remaining = [0]
+    exhausted = [False]
+
+    def finish():
+        with lock:
+            remaining[0] -= 1
+            if exhausted[0] and remaining[0] == 0:
+                finished.set()
+
+    def submit(stage_index, index, row):
+        future = executors[stage_index].submit(stages[stage_index].func, index, row)
+        future.add_done_callback(lambda f: on_done(stage_index, index, row, f))
+
+    def on_done(stage_index, index, row, future):
+        exception = future.exception()
+        if exception is not None:
+            print(f"Stage '{stages[stage_index].name}' failed for comment {index}: {exception}")
+            with lock:
+                errors[index] = (stages[stage_index].name, exception)
+            finish()
+        elif stage_index + 1 < len(stages):
+            submit(stage_index + 1, index, row)
+        else:
+            finish()
+
+    try:
+        for index, row in items:
+            with lock:
+                remaining[0] += 1
+            submit(0, index, row)
+        with lock:
+            exhausted[0] = True
+            if remaining[0] == 0:
+                finished.set()
+        finished.wait()
+    finally:
+        for executor in executors:
+            executor.shutdown(wait=True)
+
+    return errors
+
+
+def limited_task(func, slots):
+    """
+    Wrap a stage function so that it only runs while it holds one of the given slots.
+
+    Stages of different runs that share the same slots never exceed the slot count together.
+
+    :param func: The stage function, called as ``func(index, row)``.
+    :param slots: The semaphore holding the slots.
+    :type slots: threading.Semaphore
+    :return The wrapped stage function.
+    """
+    def task(index, row):
+        with slots:
+            return func(index, row)
+
+    return task
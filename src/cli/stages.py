@@ -0,0 +1,105 @@
+import importlib
+
+# Stage functions by stage name. Their modules, and the heavy libraries those import (TTS, torch, librosa, moviepy,
+# selenium), are only imported once a stage is enabled.
+STAGES = {
+    'audio': ('src.cli.inputs', 'generate_audio_task'),
+    'html': ('src.cli.inputs', 'generate_html_task'),
+    'video': ('src.video.record_html', 'record_mp4_task'),
+    'combining': ('src.cli.inputs', 'combine_video_audio_task'),
+}
+
+# Modules the stage functions import on their first call, through LazyFunction proxies
+ENGINES = {
+    'audio': ('src.audio_generation.generate_audio',),
+    'html': (),
+    'video': ('src.video.record_html',),
+    'combining': ('src.video.combine_video_audio',),
+}
+
+
+def resolve_function(module_name, function_name):
+    """Import a module and return one of its functions."""
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+class LazyFunction:
+    """
+    A function that imports its module on first call.
+
+    Modules keep a module-level name for the function, so it can still be patched in tests, without paying for
+    the import of its dependencies when it is never called.
+    """
+    __slots__ = ['module_name', 'function_name', 'function']
+
+    def __init__(self, module_name, function_name):
+        self.module_name = module_name
+        self.function_name = function_name
+        self.function = None
+
+    def load(self):
+        if self.function is None:
+            self.function = resolve_function(self.module_name, self.function_name)
+        return self.function
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __reduce__(self):
+        # Worker processes receive the real function, not the proxy
+        return resolve_function, (self.module_name, self.function_name)
+
+    def __repr__(self):
+        return f"LazyFunction({self.module_name}.{self.function_name})"
+
+
+def lazy_function(module_name, function_name):
+    """Return a proxy for a function that imports its module on first call."""
+    return LazyFunction(module_name, function_name)
+
+
+def enabled_stages(configuration):
+    """
+    Return the names of the per-comment stages a configuration enables, in pipeline order.
+
+    :param configuration: The run configuration.
+    :return The enabled stage names, e.g. ['audio', 'video', 'combining'].
+    :rtype list[str]
+    """
+    html_generation_enabled = configuration['html_generation']['enabled']
+    video_generation_enabled = configuration['video_generation']['enabled']
+    audio_generation_enabled = configuration['audio_generation']['enabled']
+    combining_enabled = configuration['combining']['enabled']
+
+    stages = []
+    if audio_generation_enabled:
+        stages.append('audio')
+    if video_generation_enabled and html_generation_enabled:
+        stages.append('video')
+    elif html_generation_enabled:
+        stages.append('html')
+    if combining_enabled and audio_generation_enabled and video_generation_enabled:
+        stages.append('combining')
+    return stages
+
+
+def load_stage(name):
+    """
+    Import and return the function of a stage.
+
+    :param name: The name of the stage in STAGES.
+    :return The stage function.
+    """
+    function = resolve_function(*STAGES[name])
+    return function.load() if isinstance(function, LazyFunction) else function
+
+
+def load_engines(name):
+    """
+    Import the modules a stage imports on its first call, with the heavy libraries they depend on.
+
+    :param name: The name of the stage in STAGES.
+    :return The imported modules.
+    :rtype list
+    """
+    return [importlib.import_module(module_name) for module_name in ENGINES[name]]
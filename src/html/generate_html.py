@@ -1,12 +1,21 @@
+import fcntl
 import json
 import os
 import re
 import shutil
+import sys
+import threading
 import time
 
-import pandas as pd
 from jinja2 import Template
 
+from src.reddit.comments import Comment
+from src.tracing.trace import trace_span
+
+# html_metadata.json is shared by every comment of a run, so appends to it are serialized: between the threads of a
+# process by this lock, and between the recorder processes by a lock on a file next to it
+metadata_lock = threading.Lock()
+
 
 def split_by_newlines(text):
     """Splits the input string by any amount of new lines."""
@@ -80,13 +89,14 @@ def render_html(row, template_content, css_content, js_content):
     # Safely retrieve 'comment' from row, providing a default value if it does not exist
     comment = row.get('comment', '')
 
-    html_content = template.render(
-        author=row.get('author', 'Unknown Author'),  # Handle missing 'author' key with default value
-        votes=row.get('votes', 0),  # Handle missing 'votes' key with default value
-        comment=json.dumps(comment),
-        css_content=css_content,
-        js_content=js_content
-    )
+    with trace_span('render_html', 'html'):
+        html_content = template.render(
+            author=row.get('author', 'Unknown Author'),  # Handle missing 'author' key with default value
+            votes=row.get('votes', 0),  # Handle missing 'votes' key with default value
+            comment=json.dumps(comment),
+            css_content=css_content,
+            js_content=js_content
+        )
     generation_time = time.time() - start_time
     return html_content, generation_time
 
@@ -101,6 +111,38 @@ def write_output_file(output_file, content):
     return size, write_time
 
 
+def append_metadata(metadata_file, metadata):
+    """
+    Append the metadata of a comment to the metadata file of its run.
+
+    The file is rewritten through a temporary file, so it is never seen half written, and under a lock that also
+    serializes the recorder processes that render comments of the same run.
+
+    :param metadata_file: The path of the JSON metadata file.
+    :param metadata: The metadata of the comment.
+    """
+    with metadata_lock, open(f'{metadata_file}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # Read existing metadata if the file exists
+            if os.path.exists(metadata_file):
+                with open(metadata_file, 'r') as file:
+                    existing_metadata = json.load(file)
+            else:
+                existing_metadata = []
+
+            # Append the new metadata to the existing metadata
+            existing_metadata.append(metadata)
+
+            # Write the updated metadata back to the JSON file
+            temp_file = f'{metadata_file}.{os.getpid()}.tmp'
+            with open(temp_file, 'w') as file:
+                json.dump(existing_metadata, file, indent=4)
+            os.replace(temp_file, metadata_file)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
 def generate_html(row, output_file, version='v1'):
     split_comments = version not in ['v1', 'v2']
     combine_assets = version not in ['v4']
@@ -118,13 +160,14 @@ def generate_html(row, output_file, version='v1'):
     else:
         copy_css_js_files(version, os.path.dirname(output_file))
 
-    # Ensure row is a dictionary and JSON serializable
-    if isinstance(row, pd.Series):
+    # Ensure row is a dictionary and JSON serializable. A row can only be a Series if pandas was imported.
+    pd = sys.modules.get('pandas')
+    if isinstance(row, Comment) or (pd is not None and isinstance(row, pd.Series)):
         row = row.to_dict()
         if split_comments:
             row['comment'] = split_by_newlines(row['comment'])
     elif not isinstance(row, dict):
-        raise TypeError("Row must be a dictionary or a Pandas Series convertible to a dictionary")
+        raise TypeError("Row must be a dictionary, a Comment or a Pandas Series convertible to a dictionary")
 
     # Initialize metadata for this HTML generation
     metadata = {
@@ -173,18 +216,6 @@ def generate_html(row, output_file, version='v1'):
     # Define the path for the metadata file
     metadata_file = os.path.join(os.path.dirname(output_file), 'html_metadata.json')
 
-    # Read existing metadata if the file exists
-    if os.path.exists(metadata_file):
-        with open(metadata_file, 'r') as file:
-            existing_metadata = json.load(file)
-    else:
-        existing_metadata = []
-
-    # Append the new metadata to the existing metadata
-    existing_metadata.append(metadata)
-
-    # Write the updated metadata back to the JSON file
-    with open(metadata_file, 'w') as file:
-        json.dump(existing_metadata, file, indent=4)
+    append_metadata(metadata_file, metadata)
 
     print(f"Metadata written to '{metadata_file}'")
@@ -0,0 +1,145 @@
+"""
+A compact columnar file format for comment datasets, read through a memory map.
+
+The file starts with a header and a directory of columns, followed by the data of every column:
+
+    header       magic (4 bytes), version (uint16), column count (uint16), row count (uint64)
+    directory    per column: name length (uint16), name (UTF-8), type (1 byte), data offset (uint64), data size (uint64)
+    int column   one little-endian int64 per row
+    str column   row count + 1 little-endian uint64 offsets into the UTF-8 bytes that follow them
+
+Reading a prefix of the rows, or only some of the columns, only touches the bytes of those values: nothing is parsed
+or decoded for the rows and columns that are not read.
+"""
+import mmap
+import struct
+import sys
+from array import array
+
+COLUMNS_EXTENSION = '.cols'
+MAGIC = b'RCOL'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQ')
+NAME_LENGTH = struct.Struct('<H')
+DESCRIPTOR = struct.Struct('<cQQ')
+INT_COLUMN = b'i'
+STR_COLUMN = b's'
+
+
+def to_little_endian(values, typecode):
+    """Return the bytes of the values as little-endian 64-bit integers."""
+    data = array(typecode, values)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tobytes()
+
+
+def from_little_endian(buffer, typecode, count):
+    """Return the first count little-endian 64-bit integers of a buffer."""
+    if sys.byteorder == 'little':
+        return buffer[:count * 8].cast(typecode)
+    data = array(typecode, buffer[:count * 8])
+    data.byteswap()
+    return data
+
+
+def encode_column(values):
+    """
+    Encode the values of a column.
+
+    :return The type of the column and its data.
+    :rtype tuple[bytes, bytes]
+    """
+    if all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+        return INT_COLUMN, to_little_endian(values, 'q')
+
+    encoded = [str(value).encode('utf-8') for value in values]
+    offsets = [0]
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    return STR_COLUMN, to_little_endian(offsets, 'Q') + b''.join(encoded)
+
+
+def write_columns(file_path, columns):
+    """
+    Write a dataset as columns.
+
+    :param file_path: The path of the file.
+    :param columns: The values of every column by name, all of the same length. Columns of integers are stored as
+        int64, any other column as text.
+    :type columns: dict[str, list]
+    """
+    row_counts = {len(values) for values in columns.values()}
+    if len(row_counts) > 1:
+        raise ValueError(f"The columns have different lengths: {sorted(row_counts)}")
+    row_count = row_counts.pop() if row_counts else 0
+
+    encoded = [(name.encode('utf-8'),) + encode_column(values) for name, values in columns.items()]
+    offset = HEADER.size + sum(NAME_LENGTH.size + len(name) + DESCRIPTOR.size for name, _, _ in encoded)
+    with open(file_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(encoded), row_count))
+        for name, column_type, data in encoded:
+            file.write(NAME_LENGTH.pack(len(name)) + name + DESCRIPTOR.pack(column_type, offset, len(data)))
+            offset += len(data)
+        for _, _, data in encoded:
+            file.write(data)
+
+
+def read_header(buffer):
+    """
+    Read the header and the directory of columns.
+
+    :return The row count and the (type, data offset, data size) of every column by name.
+    :rtype tuple[int, dict]
+    """
+    if len(buffer) < HEADER.size:
+        raise ValueError(f"Not a columnar dataset of version {VERSION}")
+    magic, version, column_count, row_count = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a columnar dataset of version {VERSION}")
+
+    position = HEADER.size
+    directory = {}
+    for _ in range(column_count):
+        (length,) = NAME_LENGTH.unpack_from(buffer, position)
+        position += NAME_LENGTH.size
+        name = bytes(buffer[position:position + length]).decode('utf-8')
+        position += length
+        directory[name] = DESCRIPTOR.unpack_from(buffer, position)
+        position += DESCRIPTOR.size
+    return row_count, directory
+
+
+def read_column(buffer, column_type, offset, size, row_count, count):
+    """Read the first count values of a column of row_count values."""
+    data = buffer[offset:offset + size]
+    if column_type == INT_COLUMN:
+        return from_little_endian(data, 'q', count).tolist()
+
+    offsets = from_little_endian(data, 'Q', count + 1)
+    # The text follows the offsets of every row
+    start = (row_count + 1) * 8
+    return [str(data[start + offsets[i]:start + offsets[i + 1]], 'utf-8') for i in range(count)]
+
+
+def read_columns(file_path, limit=None, columns=None):
+    """
+    Read a dataset written by write_columns.
+
+    :param file_path: The path of the file.
+    :param limit: The maximum number of rows to read.
+    :param columns: The names of the columns to read, every column by default. Unknown names are ignored.
+    :return The values of every column read, by name, and the number of rows read.
+    :rtype tuple[dict[str, list], int]
+    """
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        buffer = memoryview(mapped)
+        try:
+            row_count, directory = read_header(buffer)
+            count = row_count if limit is None else min(limit, row_count)
+            names = directory if columns is None else [name for name in columns if name in directory]
+            values = {name: read_column(buffer, *directory[name], row_count, count) for name in names}
+        finally:
+            # The map cannot be closed while views of it are alive, even in the traceback of an error
+            buffer.release()
+    return values, count
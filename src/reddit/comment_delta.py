@@ -0,0 +1,72 @@
+from src.reddit.comments import Comment, CommentCollection
+
+
+def record_key(record):
+    """
+    Return the key of an extracted comment in a snapshot.
+
+    A reply can be rendered twice, under a selected parent and as a top comment of its own, but never twice at the
+    same indentation.
+    """
+    return record['id'], record['indent']
+
+
+class CommentDelta:
+    """
+    The comments of a post compared with its previous snapshot.
+
+    Ranks are positions in the rendered comments, i.e. the index of their artifacts (comment_<rank>.mp3).
+    """
+
+    def __init__(self, comments, new, changed, moved, removed):
+        """
+        :param comments: Every comment of the new snapshot, in rank order.
+        :param new: The (rank, comment) pairs of comments that were not in the previous snapshot.
+        :param changed: The (rank, comment) pairs of comments whose author, votes, text or indentation changed.
+        :param moved: The (previous rank, rank) pairs of unchanged comments with another rank.
+        :param removed: The keys of comments of the previous snapshot that are gone.
+        """
+        self.comments = comments
+        self.new = new
+        self.changed = changed
+        self.moved = moved
+        self.removed = removed
+
+    @property
+    def updated(self):
+        """The (rank, comment) pairs that have to be rendered again, in rank order."""
+        return sorted(self.new + self.changed, key=lambda item: item[0])
+
+    def __repr__(self):
+        return (f"CommentDelta({len(self.comments)} comments: {len(self.new)} new, {len(self.changed)} changed, "
+                f"{len(self.moved)} moved, {len(self.removed)} removed)")
+
+
+def compare_with_snapshot(previous, records):
+    """
+    Compare extracted comments with the previous snapshot of the post, by comment ID.
+
+    :param previous: The previous snapshot, (rank, record) pairs by record key. Empty for the first fetch.
+    :type previous: dict
+    :param records: The extracted comments, in rank order, each with the ID of the comment.
+    :type records: list[dict]
+    :return The delta between both snapshots.
+    :rtype CommentDelta
+    """
+    comments = CommentCollection.from_records(records)
+    new, changed, moved = [], [], []
+    keys = set()
+    for rank, (record, comment) in enumerate(zip(records, comments)):
+        key = record_key(record)
+        keys.add(key)
+        if key not in previous:
+            new.append((rank, comment))
+            continue
+        previous_rank, previous_record = previous[key]
+        if Comment.from_dict(previous_record) != comment:
+            changed.append((rank, comment))
+        elif previous_rank != rank:
+            moved.append((previous_rank, rank))
+
+    removed = [key for key in previous if key not in keys]
+    return CommentDelta(comments, new, changed, moved, removed)
@@ -0,0 +1,372 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.reddit.comment_tree import select_top_comments
+
+DEFAULT_BASE_URL = 'https://oauth.reddit.com'
+# morechildren accepts at most 100 comment IDs per request
+MORE_CHILDREN_BATCH = 100
+
+
+class RateLimitError(Exception):
+    """Raised when Reddit keeps refusing requests after every retry."""
+
+
+class ServerError(Exception):
+    """Raised when Reddit keeps failing requests with server errors after every retry."""
+
+
+class Replies(list):
+    """The replies of a comment, with the list() of praw's CommentForest: every descendant, breadth first."""
+
+    def list(self):
+        descendants = []
+        queue = deque(self)
+        while queue:
+            comment = queue.popleft()
+            descendants.append(comment)
+            queue.extend(comment.replies)
+        return descendants
+
+
+class FetchedComment:
+    """A comment of the Reddit JSON API, with the attributes of a praw comment that the pipeline reads."""
+    __slots__ = ['id', 'parent_id', 'author', 'score', 'body', 'edited', 'replies']
+
+    def __init__(self, id, parent_id, author, score, body, edited=None):
+        self.id = id
+        self.parent_id = parent_id
+        self.author = author
+        self.score = score
+        self.body = body
+        # The time of the last edit, None if the comment was never edited
+        self.edited = edited
+        self.replies = Replies()
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['name'], data['parent_id'], data.get('author') or '[deleted]', data.get('score', 0),
+                   data.get('body', ''), data.get('edited') or None)
+
+    def __repr__(self):
+        return f"FetchedComment({self.id}, score={self.score})"
+
+
+class AdaptiveRateLimiter:
+    """
+    Space out requests to stay under Reddit's rate limit.
+
+    The rate grows by a small step after every accepted request and is halved when a request is refused or fails
+    with a server error, and it never exceeds what the X-Ratelimit-Remaining and X-Ratelimit-Reset headers allow
+    until the window resets.
+    """
+
+    def __init__(self, rate=10.0, min_rate=0.5, max_rate=100.0, increase=0.5):
+        """
+        :param rate: The starting rate in requests per second.
+        :param min_rate: The lowest rate the limiter backs off to.
+        :param max_rate: The highest rate the limiter grows to.
+        :param increase: The rate added after every accepted request.
+        """
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Wait for the next request slot."""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + 1 / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+    def update(self, status_code, headers):
+        """
+        Adapt the rate to the response of a request.
+
+        :param status_code: The HTTP status of the response.
+        :param headers: The headers of the response.
+        """
+        with self.lock:
+            if status_code == 429 or status_code >= 500:
+                self.rate = max(self.min_rate, self.rate / 2)
+                retry_after = to_float(headers.get('Retry-After'))
+                if retry_after:
+                    self.next_time = max(self.next_time, time.monotonic() + retry_after)
+                return
+
+            self.rate = min(self.max_rate, self.rate + self.increase)
+            remaining = to_float(headers.get('X-Ratelimit-Remaining'))
+            reset = to_float(headers.get('X-Ratelimit-Reset'))
+            if remaining is not None and reset is not None:
+                if remaining < 1:
+                    self.next_time = max(self.next_time, time.monotonic() + reset)
+                else:
+                    self.rate = max(self.min_rate, min(self.rate, remaining / max(reset, 1)))
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_post_url(post_url):
+    """
+    Return the ID of the post of a Reddit URL, e.g. '1ejq3hs' for https://www.reddit.com/r/x/comments/1ejq3hs/title/.
+
+    :raises ValueError: if the URL is not the URL of a post
+    """
+    parsed_url = urlparse(post_url)
+    match = re.search(r'/comments/([a-z0-9]+)', parsed_url.path)
+    if match:
+        return match.group(1)
+    if parsed_url.netloc == 'redd.it' and parsed_url.path.strip('/'):
+        return parsed_url.path.strip('/')
+    raise ValueError(f"Not the URL of a Reddit post: {post_url}")
+
+
+def auth_url_for(base_url):
+    """Return the token endpoint for a base URL: www.reddit.com for oauth.reddit.com, the server itself otherwise."""
+    if urlparse(base_url).netloc == 'oauth.reddit.com':
+        return 'https://www.reddit.com/api/v1/access_token'
+    return f"{base_url.rstrip('/')}/api/v1/access_token"
+
+
+class CommentFetcher:
+    """
+    Fetch every comment of a post from the Reddit JSON API.
+
+    The first page of the post comes with most of the tree. The "load more comments" and "continue this thread"
+    stubs are then expanded by several requests at the same time, and stubs found in their responses are queued
+    as they arrive, until the whole tree is loaded.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, user_agent=None, client_id=None, client_secret=None, workers=8,
+                 rate_limiter=None, max_retries=5, timeout=30):
+        """
+        :param base_url: The API server, https://oauth.reddit.com or a stand-in server in tests and benchmarks.
+        :param user_agent: The User-Agent Reddit asks every client to set.
+        :param client_id: The client ID of the Reddit app, an app-only token is requested when it is set.
+        :param client_secret: The client secret of the Reddit app.
+        :param workers: The most requests in flight at the same time.
+        :param rate_limiter: Spaces out the requests, an AdaptiveRateLimiter by default.
+        :param max_retries: The retries of a refused or failed request.
+        :param timeout: The timeout of a request in seconds.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.workers = max(1, workers)
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.request_count = 0
+        self.count_lock = threading.Lock()
+
+        # One connection per worker is kept alive between requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = user_agent or 'subreddit-video-overview'
+        if client_id and client_secret:
+            self.session.headers['Authorization'] = f"bearer {self.access_token(client_id, client_secret)}"
+
+    def access_token(self, client_id, client_secret):
+        """Request an app-only OAuth token."""
+        response = self.session.post(auth_url_for(self.base_url), auth=(client_id, client_secret),
+                                     data={'grant_type': 'client_credentials'}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['access_token']
+
+    def get(self, path, params=None):
+        """
+        Send a GET request to the API, retrying refused and failed requests.
+
+        :raises RateLimitError: if the request is still refused after every retry
+        :raises ServerError: if the request still fails with a server error after every retry
+        """
+        params = dict(params or {}, raw_json=1)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(f'{self.base_url}{path}', params=params, timeout=self.timeout)
+            except requests.ConnectionError:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(2 ** attempt * 0.1)
+                continue
+            with self.count_lock:
+                self.request_count += 1
+            self.rate_limiter.update(response.status_code, response.headers)
+
+            if response.status_code == 429 or response.status_code >= 500:
+                continue
+            response.raise_for_status()
+            return response.json()
+
+        if response.status_code == 429:
+            raise RateLimitError(f"Gave up on {path} after {self.max_retries + 1} attempts")
+        raise ServerError(f"Gave up on {path} after {self.max_retries + 1} attempts, the last failed with HTTP "
+                          f"{response.status_code}")
+
+    def fetch_post(self, post_id):
+        """Fetch the first page of a post, as a listing of comments and stubs."""
+        _, comments = self.get(f'/comments/{post_id}.json', {'limit': 500, 'sort': 'top'})
+        return comments['data']['children']
+
+    def fetch_more_children(self, post_id, comment_ids):
+        """Expand a "load more comments" stub, as a flat list of comments and stubs."""
+        data = self.get('/api/morechildren.json', {'api_type': 'json', 'link_id': f't3_{post_id}',
+                                                    'children': ','.join(comment_ids), 'sort': 'top'})
+        return data['json']['data']['things']
+
+    def fetch_thread(self, post_id, comment_id):
+        """Expand a "continue this thread" stub, as a listing whose only comment is the parent of the stub."""
+        _, comments = self.get(f'/comments/{post_id}/_/{comment_id}.json', {'limit': 500, 'sort': 'top'})
+        return comments['data']['children']
+
+    def fetch_comments(self, post_url):
+        """
+        Fetch every comment of a post.
+
+        :param post_url: The URL of the post.
+        :return The top-level comments of the post, each with its replies.
+        :rtype list[FetchedComment]
+        """
+        post_id = parse_post_url(post_url)
+        comments = {}
+        top_level = []
+        # Replies that arrived before their parent, by parent ID
+        orphans = {}
+
+        def add_comment(data, parent_id):
+            comment = FetchedComment.from_json(data)
+            if comment.id in comments:
+                return None
+            comments[comment.id] = comment
+            comment.replies.extend(orphans.pop(comment.id, []))
+            if parent_id in comments:
+                comments[parent_id].replies.append(comment)
+            elif parent_id.startswith('t1_'):
+                orphans.setdefault(parent_id, []).append(comment)
+            else:
+                top_level.append(comment)
+            return comment
+
+        def add_listing(children, parent_id, stubs):
+            # Listings nest replies, every comment of a listing has the same parent
+            for child in children:
+                if child['kind'] == 'more':
+                    stubs.append(child['data'])
+                elif child['kind'] == 't1':
+                    comment = add_comment(child['data'], parent_id)
+                    replies = child['data'].get('replies')
+                    if comment is not None and replies:
+                        add_listing(replies['data']['children'], comment.id, stubs)
+
+        def add_things(things, stubs):
+            # morechildren returns a flat list, in which parents come before their replies
+            for thing in things:
+                if thing['kind'] == 'more':
+                    stubs.append(thing['data'])
+                elif thing['kind'] == 't1':
+                    add_comment(thing['data'], thing['data']['parent_id'])
+
+        def add_thread(children, stubs):
+            # The parent of a "continue this thread" stub comes back with the replies that did not fit
+            for child in children:
+                parent_id = child['data'].get('name') if child['kind'] == 't1' else None
+                replies = child['data'].get('replies') if parent_id else None
+                if parent_id in comments and replies:
+                    add_listing(replies['data']['children'], parent_id, stubs)
+
+        stubs = []
+        add_listing(self.fetch_post(post_id), f't3_{post_id}', stubs)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='fetch') as executor:
+            pending = {}
+
+            def submit(stub):
+                if stub['children']:
+                    for i in range(0, len(stub['children']), MORE_CHILDREN_BATCH):
+                        batch = stub['children'][i:i + MORE_CHILDREN_BATCH]
+                        pending[executor.submit(self.fetch_more_children, post_id, batch)] = add_things
+                elif stub.get('parent_id', '').startswith('t1_'):
+                    parent_id = stub['parent_id'][3:]
+                    pending[executor.submit(self.fetch_thread, post_id, parent_id)] = add_thread
+
+            for stub in stubs:
+                submit(stub)
+
+            # Responses are merged into the tree as they arrive, on this thread only
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    add = pending.pop(future)
+                    new_stubs = []
+                    add(future.result(), new_stubs)
+                    for stub in new_stubs:
+                        submit(stub)
+
+        # Replies whose parent was deleted are kept as top-level comments
+        for replies in orphans.values():
+            top_level.extend(replies)
+        return top_level
+
+
+def all_comments(top_level):
+    """Return every comment of a tree, breadth first like praw's submission.comments.list()."""
+    return Replies(top_level).list()
+
+
+def iter_comments(top_level):
+    """Yield every comment of a tree, breadth first, without building the list of all of them."""
+    queue = deque(top_level)
+    while queue:
+        comment = queue.popleft()
+        yield comment
+        queue.extend(comment.replies)
+
+
+def fetch_comment_tree(url, base_url=DEFAULT_BASE_URL, workers=8):
+    """
+    Fetch the whole tree of comments of a post concurrently.
+
+    :param url: The URL of the post.
+    :param base_url: The API server.
+    :param workers: The most requests in flight at the same time.
+    :return The top-level comments of the post, each with its replies.
+    :rtype list[FetchedComment]
+    """
+    fetcher = CommentFetcher(base_url, user_agent=os.getenv('USER_AGENT'), client_id=os.getenv('CLIENT_ID'),
+                             client_secret=os.getenv('CLIENT_SECRET'), workers=workers)
+    top_level = fetcher.fetch_comments(url)
+    print(f"Fetched the comments with {fetcher.request_count} requests")
+    return top_level
+
+
+def get_top_comments_concurrently(url, limit=30, base_url=DEFAULT_BASE_URL, workers=8):
+    """
+    Get the top comments from a post, fetching the whole tree of comments concurrently.
+
+    :param url: The URL of the post.
+    :param limit: The maximum number of comments to retrieve (default: 30).
+    :param base_url: The API server.
+    :param workers: The most requests in flight at the same time.
+    :return A list of top comments, sorted by score (number of votes).
+    :rtype list[FetchedComment]
+    """
+    return select_top_comments(iter_comments(fetch_comment_tree(url, base_url, workers)), limit)
@@ -0,0 +1,41 @@
+import heapq
+
+
+def comment_id(comment):
+    """Return the full name (t1_<id>) of a comment: praw keeps it apart from the ID, FetchedComment uses it as ID."""
+    return getattr(comment, 'fullname', None) or comment.id
+
+
+def select_top_comments(comments, limit):
+    """
+    Select the comments with the highest scores, in a single pass that keeps at most ``limit`` of them.
+
+    Ties keep their original order, like a stable sort by descending score would.
+
+    :param comments: An iterable of comments with a ``score``, e.g. a generator over a large tree.
+    :param limit: The number of comments to keep.
+    :return The top comments, sorted by score (number of votes).
+    :rtype list
+    """
+    return heapq.nlargest(limit, comments, key=lambda comment: comment.score)
+
+
+def walk_comment_tree(comment, min_score=30, indent=0):
+    """
+    Walk a comment and the replies above a score threshold, depth first, without recursion.
+
+    A reply at or below the threshold is skipped with its whole branch, its replies are never visited.
+
+    :param comment: The comment to start from, with ``replies`` iterable over its direct replies.
+    :param min_score: Replies must score more than this to be visited.
+    :param indent: The indentation level of the starting comment.
+    :return A generator of (comment, indent) pairs, every comment followed by its visited replies.
+    """
+    stack = [(comment, indent)]
+    while stack:
+        current, level = stack.pop()
+        yield current, level
+
+        # "Load more comments" stubs have no score and are skipped
+        replies = [reply for reply in current.replies if (getattr(reply, 'score', None) or 0) > min_score]
+        stack.extend((reply, level + 1) for reply in reversed(replies))
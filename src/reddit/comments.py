@@ -0,0 +1,192 @@
+import csv
+import io
+
+from src.reddit.columnar import COLUMNS_EXTENSION, read_columns, write_columns
+
+FIELDNAMES = ['author', 'votes', 'comment', 'indent']
+
+
+def to_int(value, default=0):
+    """Convert a CSV or DataFrame cell to an integer, falling back to the default for empty or invalid values."""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+class Comment:
+    """
+    A single Reddit comment as rendered by the pipeline.
+
+    The record supports the ``row['comment']`` and ``row.get('author')`` lookups the stages already use on
+    DataFrame rows, without building a pandas Series per comment.
+    """
+    __slots__ = FIELDNAMES
+
+    def __init__(self, author, votes, comment, indent=0):
+        self.author = author
+        self.votes = votes
+        self.comment = comment
+        self.indent = indent
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a comment from a dictionary such as a CSV row, ignoring unknown keys."""
+        author = data.get('author')
+        comment = data.get('comment')
+        return cls(author='' if author is None else str(author),
+                   votes=to_int(data.get('votes')),
+                   comment='' if comment is None else str(comment),
+                   indent=to_int(data.get('indent')))
+
+    def __getitem__(self, key):
+        if key not in FIELDNAMES:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in FIELDNAMES else default
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in FIELDNAMES}
+
+    def __eq__(self, other):
+        return isinstance(other, Comment) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Comment(author={self.author!r}, votes={self.votes}, indent={self.indent})"
+
+
+class CommentCollection:
+    """
+    An ordered collection of comments, loaded once and shared by every stage of a run.
+
+    Comments are indexed by their position, which is the index used in the artifact file names (comment_<index>.mp3).
+    """
+    __slots__ = ['comments']
+
+    def __init__(self, comments=None):
+        self.comments = list(comments or [])
+
+    @classmethod
+    def from_records(cls, records):
+        """Create a collection from an iterable of dictionaries."""
+        return cls(Comment.from_dict(record) for record in records)
+
+    @classmethod
+    def from_csv(cls, file_path, limit=None, end_offset=None):
+        """
+        Load comments from a CSV file with author, votes, comment and indent columns.
+
+        :param file_path: The path to the CSV file.
+        :type file_path: str
+        :param limit: The maximum number of comments to read. Rows after the limit are not parsed.
+        :type limit: int or None
+        :param end_offset: The byte offset after the last row to read, as written by to_csv. The rest of the file
+            is not read at all.
+        :type end_offset: int or None
+        :return The loaded comments.
+        :rtype CommentCollection
+        """
+        comments = []
+        if end_offset is not None:
+            with open(file_path, 'rb') as file:
+                csvfile = io.StringIO(file.read(end_offset).decode('utf-8'), newline='')
+        else:
+            csvfile = open(file_path, newline='')
+        with csvfile:
+            for record in csv.DictReader(csvfile):
+                if limit is not None and len(comments) >= limit:
+                    break
+                comments.append(Comment.from_dict(record))
+        return cls(comments)
+
+    @classmethod
+    def from_columns(cls, file_path, limit=None, columns=None):
+        """
+        Load comments from a columnar dataset written by to_columns.
+
+        :param file_path: The path to the dataset.
+        :type file_path: str
+        :param limit: The maximum number of comments to read. Rows after the limit are not read at all.
+        :type limit: int or None
+        :param columns: The fields to read, every field by default. The others are left empty, without being read.
+        :type columns: list[str] or None
+        :return The loaded comments.
+        :rtype CommentCollection
+        """
+        values, count = read_columns(file_path, limit, columns if columns is not None else FIELDNAMES)
+        defaults = {'author': '', 'votes': 0, 'comment': '', 'indent': 0}
+        fields = [values.get(key) or [defaults[key]] * count for key in FIELDNAMES]
+        return cls(Comment(*field_values) for field_values in zip(*fields))
+
+    @classmethod
+    def load(cls, file_path, limit=None, end_offset=None):
+        """Load comments from a columnar dataset or from a CSV file, by the extension of the file."""
+        if file_path.endswith(COLUMNS_EXTENSION):
+            return cls.from_columns(file_path, limit)
+        return cls.from_csv(file_path, limit, end_offset)
+
+    @classmethod
+    def from_dataframe(cls, dataframe):
+        """Create a collection from a pandas DataFrame."""
+        return cls.from_records(dataframe.to_dict('records'))
+
+    def to_csv(self, file_path):
+        """
+        Write the comments to a CSV file.
+
+        :return The byte offset of every row in the file, followed by the size of the file.
+        :rtype list[int]
+        """
+        # Rows are formatted in memory first, to know their size in bytes
+        buffer = io.StringIO(newline='')
+        writer = csv.DictWriter(buffer, fieldnames=FIELDNAMES)
+        with open(file_path, 'wb') as csvfile:
+            def flush():
+                data = buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+                csvfile.write(data)
+                return len(data)
+
+            writer.writeheader()
+            offsets = [flush()]
+            for comment in self.comments:
+                writer.writerow(comment.to_dict())
+                offsets.append(offsets[-1] + flush())
+        return offsets
+
+    def to_columns(self, file_path):
+        """Write the comments to a columnar dataset, which reads a prefix of them without parsing the rest."""
+        write_columns(file_path, {key: [getattr(comment, key) for comment in self.comments] for key in FIELDNAMES})
+
+    def save(self, file_path):
+        """
+        Write the comments to a columnar dataset or to a CSV file, by the extension of the file.
+
+        :return The byte offsets of the rows of a CSV file as returned by to_csv, None for a columnar dataset.
+        :rtype list[int] or None
+        """
+        if file_path.endswith(COLUMNS_EXTENSION):
+            self.to_columns(file_path)
+            return None
+        return self.to_csv(file_path)
+
+    def items(self):
+        """Iterate over (index, comment) pairs, like ``DataFrame.iterrows()``."""
+        return enumerate(self.comments)
+
+    def __iter__(self):
+        return iter(self.comments)
+
+    def __len__(self):
+        return len(self.comments)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return CommentCollection(self.comments[key])
+        return self.comments[key]
+
+    def __repr__(self):
+        return f"CommentCollection({len(self.comments)} comments)"
@@ -0,0 +1,142 @@
+"""
+A manifest of the datasets fetched into a directory, so a dataset is found without listing the directory.
+
+Every dataset is recorded with the post it was fetched from, the time of the fetch, its number of rows and the byte
+offsets of its CSV rows, so the first rows of a dataset are read without scanning the rest of the file.
+"""
+import os
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+
+from src.reddit.columnar import from_little_endian, to_little_endian
+
+SAMPLES_DIR = 'samples'
+MANIFEST_FILE = '.manifest.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    file_name TEXT PRIMARY KEY,
+    post_id TEXT,
+    url TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    rows INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    row_offsets BLOB
+);
+CREATE INDEX IF NOT EXISTS datasets_by_fetch ON datasets (fetched_at);
+CREATE INDEX IF NOT EXISTS datasets_by_post ON datasets (post_id, fetched_at);
+"""
+
+
+def entry_from_row(row):
+    """Return a manifest entry as a dictionary, with the row offsets as a list of integers."""
+    file_name, post_id, url, fetched_at, rows, size, row_offsets = row
+    offsets = from_little_endian(memoryview(row_offsets), 'Q', rows + 1).tolist() if row_offsets else None
+    return {'file_name': file_name, 'post_id': post_id, 'url': url, 'fetched_at': fetched_at, 'rows': rows,
+            'size': size, 'row_offsets': offsets}
+
+
+def in_directory(file_path, directory=SAMPLES_DIR):
+    """Return whether a file is directly in a directory."""
+    return os.path.dirname(os.path.abspath(file_path)) == os.path.abspath(directory)
+
+
+def end_offset(entry, limit=None):
+    """
+    Return the size of the start of a CSV dataset that holds its header and its first rows.
+
+    :param entry: The manifest entry of the dataset.
+    :param limit: The number of rows, every row by default.
+    :return The byte offset after the last of these rows, or None if the offsets of the rows are not known.
+    :rtype int or None
+    """
+    offsets = entry['row_offsets']
+    if offsets is None:
+        return None
+    return offsets[entry['rows'] if limit is None else min(limit, entry['rows'])]
+
+
+class DatasetManifest:
+    """The datasets fetched into a directory, in a SQLite database in that directory."""
+
+    def __init__(self, directory=SAMPLES_DIR):
+        """
+        :param directory: The directory of the datasets, created if it does not exist.
+        """
+        self.directory = directory
+        self.database_file = os.path.join(directory, MANIFEST_FILE)
+
+        os.makedirs(directory, exist_ok=True)
+        with self.connect() as connection:
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        """A connection to the database, committed and closed on exit, so each thread can open its own."""
+        with closing(sqlite3.connect(self.database_file, timeout=30)) as connection:
+            with connection:
+                yield connection
+
+    def path(self, entry):
+        """Return the path of the dataset of a manifest entry."""
+        return os.path.join(self.directory, entry['file_name'])
+
+    def record(self, file_path, url, rows, post_id=None, row_offsets=None, now=None):
+        """
+        Record a dataset written to the directory, replacing the entry of a previous dataset of the same name.
+
+        :param file_path: The path of the dataset.
+        :param url: The URL of the post the comments were fetched from.
+        :param rows: The number of comments in the dataset.
+        :param post_id: The ID of the post, None if the URL is not the URL of a post.
+        :param row_offsets: The byte offset of every row of a CSV dataset followed by the size of the file, None
+            for a columnar dataset, which indexes its rows itself.
+        :param now: The time of the fetch, the current time by default.
+        """
+        blob = to_little_endian(row_offsets, 'Q') if row_offsets is not None else None
+        with self.connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO datasets VALUES (?, ?, ?, ?, ?, ?, ?)',
+                               (os.path.basename(file_path), post_id, url, now if now is not None else time.time(),
+                                rows, os.path.getsize(file_path), blob))
+
+    def latest(self, post_id=None):
+        """
+        Return the most recently fetched dataset that still exists, of a post or of any post.
+
+        Entries of datasets deleted from the directory are removed from the manifest on the way.
+
+        :param post_id: The ID of the post, any post by default.
+        :return The manifest entry, or None if there is none.
+        :rtype dict or None
+        """
+        query = 'SELECT * FROM datasets ORDER BY fetched_at DESC LIMIT 1'
+        parameters = ()
+        if post_id is not None:
+            query = 'SELECT * FROM datasets WHERE post_id = ? ORDER BY fetched_at DESC LIMIT 1'
+            parameters = (post_id,)
+
+        while True:
+            with self.connect() as connection:
+                row = connection.execute(query, parameters).fetchone()
+            if row is None:
+                return None
+            entry = entry_from_row(row)
+            if os.path.exists(self.path(entry)):
+                return entry
+            self.remove(entry['file_name'])
+
+    def entries(self):
+        """
+        Return every recorded dataset, oldest fetch first.
+
+        :rtype list[dict]
+        """
+        with self.connect() as connection:
+            rows = connection.execute('SELECT * FROM datasets ORDER BY fetched_at').fetchall()
+        return [entry_from_row(row) for row in rows]
+
+    def remove(self, file_name):
+        """Remove the entry of a dataset from the manifest."""
+        with self.connect() as connection:
+            connection.execute('DELETE FROM datasets WHERE file_name = ?', (file_name,))
@@ -0,0 +1,301 @@
+"""
+A local stand-in for the Reddit JSON API, serving a synthetic thread to the comment fetcher in tests and benchmarks.
+
+It paginates like Reddit: a page shows a limited number of replies per comment and a limited depth, the rest is
+left behind "load more comments" and "continue this thread" stubs. It can add latency to every request and refuse
+requests beyond a rate limit, with Reddit's X-Ratelimit headers.
+
+Usage:
+    python -m src.reddit.fake_reddit [--comments 10000] [--port 8765] [--latency 0.05] [--rate-limit 100]
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+WORDS = ('the of and to a in that is was he for it with as his on be at by had are but from or have an they which '
+         'one you were all her she there would their we him been has when who will no more if out so up said what '
+         'about than into them can only other time new some could these two may first then do any like my now over '
+         'such our man me even most made after also did many off before must well back through years much where your '
+         'way down should because each just people those too how little good very make world still see own work day'
+         ).split()
+
+
+def to_base36(number):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    result = ''
+    while True:
+        number, remainder = divmod(number, 36)
+        result = digits[remainder] + result
+        if number == 0:
+            return result
+
+
+def synthetic_thread(count, seed=0):
+    """
+    Generate the comments of a thread, with long chains of replies like real threads.
+
+    :param count: The number of comments.
+    :param seed: The seed of the random generator.
+    :return The comments by ID, each with its author, score, body, parent ID (None at the top level) and the IDs
+        of its replies, sorted by score.
+    :rtype dict
+    """
+    generator = random.Random(seed)
+    comments = {}
+    ids = []
+    for i in range(count):
+        comment_id = to_base36(i + 1000)
+        if not ids or generator.random() < 0.3:
+            parent_id = None
+        else:
+            # Replies mostly answer recent comments, which builds deep threads
+            parent_id = ids[generator.randrange(max(0, len(ids) - 50), len(ids))]
+        length = min(200, max(3, int(generator.lognormvariate(3.0, 1.0))))
+        comments[comment_id] = {
+            'id': comment_id,
+            'parent_id': parent_id,
+            'author': f'user{generator.randrange(count)}',
+            'score': int(generator.paretovariate(1.2) * 5),
+            'body': ' '.join(generator.choice(WORDS) for _ in range(length)),
+            'replies': [],
+        }
+        ids.append(comment_id)
+        if parent_id is not None:
+            comments[parent_id]['replies'].append(comment_id)
+
+    for comment in comments.values():
+        comment['replies'].sort(key=lambda reply_id: comments[reply_id]['score'], reverse=True)
+    return comments
+
+
+class FakeReddit:
+    """A synthetic thread served over HTTP like the Reddit JSON API."""
+
+    def __init__(self, comments, post_id='fake01', page_size=20, max_depth=6, top_level_page=100, latency=0.0,
+                 rate_limit=None):
+        """
+        :param comments: The comments of the thread, as returned by synthetic_thread.
+        :param post_id: The ID of the post.
+        :param page_size: The replies of a comment shown on a page, the others are behind a stub.
+        :param max_depth: The depth of replies shown on a page, deeper ones are behind a stub.
+        :param top_level_page: The top-level comments shown on the first page of the post.
+        :param latency: The seconds every request takes.
+        :param rate_limit: The requests accepted per second, None for no limit.
+        """
+        self.comments = comments
+        self.post_id = post_id
+        self.page_size = page_size
+        self.max_depth = max_depth
+        self.top_level_page = top_level_page
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.top_level = sorted((comment['id'] for comment in comments.values() if comment['parent_id'] is None),
+                                key=lambda comment_id: comments[comment_id]['score'], reverse=True)
+
+        self.request_count = 0
+        self.refused_count = 0
+        self.window = (0, 0)
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def post_url(self):
+        return f'{self.base_url}/r/fake/comments/{self.post_id}/synthetic_thread/'
+
+    def start(self, host='127.0.0.1', port=0):
+        """Serve the thread on a background thread, on a free port by default."""
+        fake_reddit = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so clients can reuse their connections, and whole responses in one segment
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+            wbufsize = 1 << 16
+
+            def do_GET(self):
+                fake_reddit.handle(self, 'GET')
+
+            def do_POST(self):
+                fake_reddit.handle(self, 'POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), name='fake-reddit',
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def comment_thing(self, comment, depth, replies=''):
+        parent = comment['parent_id']
+        return {'kind': 't1', 'data': {
+            'id': comment['id'], 'name': f"t1_{comment['id']}",
+            'parent_id': f't1_{parent}' if parent else f't3_{self.post_id}',
+            'author': comment['author'], 'score': comment['score'], 'body': comment['body'], 'depth': depth,
+            'edited': comment.get('edited', False), 'replies': replies,
+        }}
+
+    def more_thing(self, children, parent_id, depth):
+        return {'kind': 'more', 'data': {
+            'count': len(children), 'name': f't1_{children[0]}', 'id': children[0], 'parent_id': parent_id,
+            'depth': depth, 'children': list(children),
+        }}
+
+    def continue_thing(self, parent_id, depth):
+        return {'kind': 'more', 'data': {
+            'count': 0, 'name': 't1__', 'id': '_', 'parent_id': parent_id, 'depth': depth, 'children': [],
+        }}
+
+    def listing(self, children):
+        return {'kind': 'Listing', 'data': {'children': children}}
+
+    def nested(self, comment_ids, parent_id, depth, page_size):
+        """A listing of comments with their nested replies, cut by page size and depth."""
+        children = [self.nested_comment(self.comments[comment_id], depth) for comment_id in comment_ids[:page_size]]
+        if comment_ids[page_size:]:
+            children.append(self.more_thing(comment_ids[page_size:], parent_id, depth))
+        return children
+
+    def nested_comment(self, comment, depth):
+        replies = ''
+        if comment['replies']:
+            fullname = f"t1_{comment['id']}"
+            if depth + 1 >= self.max_depth:
+                replies = self.listing([self.continue_thing(fullname, depth + 1)])
+            else:
+                replies = self.listing(self.nested(comment['replies'], fullname, depth + 1, self.page_size))
+        return self.comment_thing(comment, depth, replies)
+
+    def flat(self, comment_id, depth, levels, things):
+        """The flat list of morechildren: a comment and a few levels of its replies, parents first."""
+        comment = self.comments[comment_id]
+        things.append(self.comment_thing(comment, depth))
+        replies = comment['replies']
+        if not replies:
+            return
+        fullname = f't1_{comment_id}'
+        if levels == 0:
+            things.append(self.more_thing(replies, fullname, depth + 1))
+            return
+        for reply_id in replies[:self.page_size]:
+            self.flat(reply_id, depth + 1, levels - 1, things)
+        if replies[self.page_size:]:
+            things.append(self.more_thing(replies[self.page_size:], fullname, depth + 1))
+
+    def post_listing(self):
+        return self.listing([{'kind': 't3', 'data': {'id': self.post_id, 'name': f't3_{self.post_id}'}}])
+
+    def admit(self):
+        """Count a request against the rate limit, returning whether it is accepted and the rate limit headers."""
+        with self.lock:
+            self.request_count += 1
+            if self.rate_limit is None:
+                return True, {}
+            now = time.monotonic()
+            window_start, used = self.window
+            if now - window_start >= 1:
+                window_start, used = now, 0
+            used += 1
+            self.window = (window_start, used)
+            reset = max(1, math.ceil(window_start + 1 - now))
+            headers = {'X-Ratelimit-Used': str(used), 'X-Ratelimit-Remaining': str(max(0, self.rate_limit - used)),
+                       'X-Ratelimit-Reset': str(reset)}
+            if used > self.rate_limit:
+                self.refused_count += 1
+                headers['Retry-After'] = str(reset)
+                return False, headers
+            return True, headers
+
+    def route(self, method, path, query):
+        if method == 'POST' and path == '/api/v1/access_token':
+            return 200, {'access_token': 'fake-token', 'token_type': 'bearer', 'expires_in': 86400}
+
+        if method == 'GET' and path == '/api/morechildren.json':
+            things = []
+            for comment_id in query.get('children', [''])[0].split(','):
+                if comment_id in self.comments:
+                    self.flat(comment_id, 0, 2, things)
+            return 200, {'json': {'errors': [], 'data': {'things': things}}}
+
+        match = re.fullmatch(r'(?:/r/\w+)?/comments/(\w+)(?:/(\w+))?(?:/(\w+))?/?(?:\.json)?', path)
+        if method == 'GET' and match and match.group(1) == self.post_id:
+            comment_id = match.group(3)
+            if comment_id is None:
+                children = self.nested(self.top_level, f't3_{self.post_id}', 0, self.top_level_page)
+            elif comment_id in self.comments:
+                children = [self.nested_comment(self.comments[comment_id], 0)]
+            else:
+                return 404, {'error': 404}
+            return 200, [self.post_listing(), self.listing(children)]
+
+        return 404, {'error': 404}
+
+    def handle(self, request, method):
+        parsed_url = urlparse(request.path)
+        length = int(request.headers.get('Content-Length') or 0)
+        if length:
+            request.rfile.read(length)
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        accepted, headers = self.admit()
+        if accepted:
+            status, body = self.route(method, parsed_url.path, parse_qs(parsed_url.query))
+        else:
+            status, body = 429, {'message': 'Too Many Requests', 'error': 429}
+
+        content = json.dumps(body).encode()
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a synthetic thread like the Reddit JSON API.')
+    parser.add_argument('--comments', type=int, default=10000)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds every request takes.')
+    parser.add_argument('--rate-limit', type=float, help='Requests accepted per second.')
+    arguments = parser.parse_args()
+
+    fake_reddit = FakeReddit(synthetic_thread(arguments.comments), latency=arguments.latency,
+                             rate_limit=arguments.rate_limit).start(port=arguments.port)
+    print(f"Serving {arguments.comments} comments at {fake_reddit.post_url}")
+    try:
+        fake_reddit.thread.join()
+    except KeyboardInterrupt:
+        fake_reddit.stop()
+
+
+if __name__ == '__main__':
+    main()
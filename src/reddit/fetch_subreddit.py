@@ -1,10 +1,19 @@
-import csv
 import os
 from urllib.parse import urlparse
 
 import praw
 from dotenv import load_dotenv
 
+from src.reddit.columnar import COLUMNS_EXTENSION
+from src.reddit.comment_delta import compare_with_snapshot
+from src.reddit.comment_fetcher import fetch_comment_tree, get_top_comments_concurrently, iter_comments, \
+    parse_post_url
+from src.reddit.comment_tree import comment_id, select_top_comments, walk_comment_tree
+from src.reddit.comments import Comment, CommentCollection
+from src.reddit.dataset_manifest import SAMPLES_DIR, DatasetManifest, in_directory
+from src.reddit.submission_cache import SubmissionCache
+from src.tracing.trace import trace_span
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -33,76 +42,183 @@ def get_top_comments_from_post(url, limit=30):
     submission.comments.replace_more(limit=0)  # Remove "load more comments" instances
     comments = submission.comments.list()
 
-    # Sort comments by score (number of votes)
-    top_comments = sorted(comments, key=lambda comment: comment.score, reverse=True)
+    # Keep the top N comments by score (number of votes) without sorting all of them
+    top_comments = select_top_comments(comments, limit)
+
+    print(f"top_comments[:limit]: {top_comments}")
+
+    return top_comments
+
 
-    print(f"top_comments[:limit]: {top_comments[:limit]}")
+def load_comment_tree(url, base_url=None, workers=8):
+    """
+    Fetch the tree of comments of a post, concurrently from base_url if it is set or with praw otherwise.
+
+    :return The top-level comments of the post, each with its replies.
+    """
+    if base_url:
+        return fetch_comment_tree(url, base_url, workers)
 
-    # Get top N comments
-    return top_comments[:limit]
+    submission = reddit().submission(url=url)
+    submission.comments.replace_more(limit=0)  # Remove "load more comments" instances
+    return submission.comments
 
 
-def extract_comment_data(comment, indent=0):
+def extract_comment_data(comment, indent=0, min_score=30):
     """
-    Extracts data from a comment and its subcomments recursively.
+    Extracts data from a comment and its subcomments.
+
+    Subcomments scoring more than ``min_score`` are kept, each followed by its own subcomments. A branch is not
+    descended into once its subcomment falls at or below the threshold.
 
     :param comment: The comment to extract data from.
     :type comment: praw.models.Comment
     :param indent: The indentation level of the comment.
     :type indent: int
-    :return A list of dictionaries with the extracted comment data.
+    :param min_score: Subcomments must score more than this to be kept.
+    :type min_score: int
+    :return A list of dictionaries with the extracted comment data and the ID of each comment.
     :rtype list[dict]
     """
-    comments_data = [{
-        'author': str(comment.author),
-        'votes': comment.score,
-        'comment': comment.body,
-        'indent': indent
-    }]
-    subcomments = comment.replies.list()
-    for subcomment in subcomments:
-        if subcomment.score > 30:
-            comments_data.extend(extract_comment_data(subcomment, indent + 1))
-    return comments_data
-
-
-def fetch_subreddit(post_url, limit, default_name=False):
+    return [{
+        'id': comment_id(current),
+        'author': str(current.author),
+        'votes': current.score,
+        'comment': current.body,
+        'indent': level
+    } for current, level in walk_comment_tree(comment, min_score, indent)]
+
+
+def fetch_top_comments(post_url, limit, base_url=None, workers=8, cache=None):
+    """
+    Fetch the comments of a post and select the top ones, with the options of fetch_subreddit.
+
+    :return The top comments, praw comments or FetchedComment, sorted by score.
+    :rtype list
     """
-    Fetches the top comments from a given post URL and writes them to a user-specified CSV file.
+    with trace_span('fetch_post', 'reddit', limit=limit):
+        if cache is not None:
+            top_level = cache.comment_tree(post_url, lambda: load_comment_tree(post_url, base_url, workers))
+            return select_top_comments(iter_comments(top_level), limit)
+        if base_url:
+            return get_top_comments_concurrently(post_url, limit, base_url, workers)
+        return get_top_comments_from_post(post_url, limit)
+
+
+def default_file_name(post_url, dataset_format='csv'):
+    """Return the default name of the dataset of a post: the last path segment of its URL."""
+    path_segments = urlparse(post_url).path.split('/')
+    extension = COLUMNS_EXTENSION if dataset_format == 'columns' else '.csv'
+    return (path_segments[-2] if path_segments[-1] == '' else path_segments[-1]) + extension
+
+
+def save_dataset(comments, output_file, post_url):
+    """Write the comments to a CSV file or a columnar dataset, and record it in the manifest of samples/."""
+    row_offsets = comments.save(output_file)
+    if in_directory(output_file, SAMPLES_DIR):
+        # The next run finds the dataset in the manifest, without listing the directory
+        try:
+            post_id = parse_post_url(post_url)
+        except ValueError:
+            post_id = None
+        DatasetManifest(SAMPLES_DIR).record(output_file, post_url, len(comments), post_id, row_offsets)
+
+
+def stream_subreddit(post_url, limit, output_file=None, base_url=None, workers=8, cache_file=None, cache_ttl=3600):
+    """
+    Fetch the top comments of a post and yield them in rank order, each as soon as it is extracted.
+
+    The rank of a comment is only known once the whole tree of comments was fetched, or read from the cache, so the
+    first comment comes after the tree. From then on, the comments can be rendered while the replies of the next
+    ones are still being extracted, without waiting for a dataset to be written and read back.
+
+    :param post_url: The URL of the post to fetch comments from.
+    :param limit: The number of top comments to fetch, followed by their replies.
+    :param output_file: The dataset written once every comment was extracted, none by default.
+    :param base_url: The Reddit JSON API server, see fetch_subreddit.
+    :param workers: The most requests in flight at the same time, with base_url.
+    :param cache_file: The SQLite cache of fetched posts, see fetch_subreddit.
+    :param cache_ttl: The seconds a cached post is used without fetching it again.
+    :return A generator of comments, in the order of the dataset fetch_subreddit writes.
+    """
+    cache = SubmissionCache(cache_file, cache_ttl) if cache_file else None
+    comments = fetch_top_comments(post_url, limit, base_url, workers, cache)
+
+    records = []
+    for rank, comment in enumerate(comments):
+        # Replies are loaded lazily, so extracting them still talks to Reddit
+        with trace_span('fetch_replies', 'reddit', comment=rank):
+            extracted = extract_comment_data(comment)
+        records.extend(extracted)
+        for record in extracted:
+            yield Comment.from_dict(record)
+
+    if output_file:
+        save_dataset(CommentCollection.from_records(records), output_file, post_url)
+        print(f"Top {limit} comments from the post have been written to {output_file}.")
+
+
+def fetch_subreddit(post_url, limit, default_name=False, base_url=None, workers=8, cache_file=None, cache_ttl=3600,
+                    delta=False, dataset_format='csv'):
+    """
+    Fetches the top comments from a given post URL and writes them to a user-specified CSV file or columnar dataset.
     The default output file name is based on the last path segment of the post URL.
 
     :param default_name:
     :param post_url: The URL of the post to fetch comments from.
     :param limit: The number of top comments to fetch.
-    :return None
+    :param base_url: The Reddit JSON API server. When it is set, the whole tree of comments, including the threads
+        praw's replace_more(limit=0) drops, is fetched with concurrent requests instead of praw.
+    :param workers: The most requests in flight at the same time, with base_url.
+    :param cache_file: The SQLite cache of fetched posts. When it is set, a post fetched less than cache_ttl seconds
+        ago is read from it, and a post fetched earlier is fetched again to refresh the scores and add new comments.
+    :param cache_ttl: The seconds a cached post is used without fetching it again.
+    :param delta: Compare the comments with the snapshot of the previous fetch of the post, kept in cache_file, and
+        return the delta instead of the comments.
+    :param dataset_format: The format of the output file by default, 'csv' or 'columns'. A columnar dataset reads
+        its first comments without parsing the others. A file name entered by the user keeps its own extension.
+        Datasets written to the samples directory are recorded in its manifest.
+    :return The fetched comments, or their delta with the previous fetch.
+    :rtype CommentCollection or CommentDelta
     """
-    comments = get_top_comments_from_post(post_url, limit)
+    if delta and not cache_file:
+        raise ValueError('The delta mode compares with the previous snapshot of the post, kept in the cache_file')
+    cache = SubmissionCache(cache_file, cache_ttl) if cache_file else None
+    comments = fetch_top_comments(post_url, limit, base_url, workers, cache)
 
+    # Replies are loaded lazily, so extracting them still talks to Reddit
     comments_data = []
-    for comment in comments:
-        comments_data.extend(extract_comment_data(comment))
+    with trace_span('fetch_replies', 'reddit', comments=len(comments)):
+        for comment in comments:
+            comments_data.extend(extract_comment_data(comment))
 
     # Extract the last path segment from the URL and use it as the default file name
-    parsed_url = urlparse(post_url)
-    path_segments = parsed_url.path.split('/')
-    default_file_name = path_segments[-2] + '.csv' if path_segments[-1] == '' else path_segments[-1] + '.csv'
+    file_name = default_file_name(post_url, dataset_format)
 
     # Prompt user for the output file name with a default value
     if default_name:
-        output_file = default_file_name
+        output_file = file_name
     else:
-        output_file = input(f"Enter the name for the output CSV file (default: {default_file_name}): ")
+        output_file = input(f"Enter the name for the output CSV file (default: {file_name}): ")
 
     if not output_file:
-        output_file = f'samples/{default_file_name}'
-
-    # Write data to CSV
-    with open(output_file, 'w', newline='') as csvfile:
-        fieldnames = ['author', 'votes', 'comment', 'indent']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        output_file = f'{SAMPLES_DIR}/{file_name}'
+
+    if delta:
+        # Only new and changed comments have to be rendered again, the next delta compares with this fetch
+        post_id = parse_post_url(post_url)
+        comment_delta = compare_with_snapshot(cache.snapshot(post_id), comments_data)
+        cache.save_snapshot(post_id, comments_data)
+        comments = comment_delta.comments
+    else:
+        comments = CommentCollection.from_records(comments_data)
 
-        writer.writeheader()
-        for data in comments_data:
-            writer.writerow(data)
+    # Write data to CSV or to a columnar dataset
+    save_dataset(comments, output_file, post_url)
 
     print(f"Top {limit} comments from the post have been written to {output_file}.")
+
+    if delta:
+        print(f"Compared with the previous fetch: {comment_delta}")
+        return comment_delta
+    return comments
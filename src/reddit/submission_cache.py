@@ -0,0 +1,196 @@
+"""
+A SQLite cache of the comments of fetched posts, so repeated runs on the same post are served from disk.
+
+Every post has a time to live. Within it, the comments are read from the cache without talking to Reddit. Once it
+has expired, the post is fetched again and merged into the cache: scores and positions are refreshed, new comments
+are added, and only the bodies of comments edited since the last fetch are rewritten.
+"""
+import os
+import sqlite3
+import time
+from collections import deque
+from contextlib import closing, contextmanager
+
+from src.reddit.comment_fetcher import FetchedComment, parse_post_url
+from src.reddit.comment_tree import comment_id
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    post_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS comments (
+    post_id TEXT NOT NULL,
+    comment_id TEXT NOT NULL,
+    parent_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    author TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    edited REAL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (post_id, comment_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    post_id TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    comment_id TEXT NOT NULL,
+    author TEXT NOT NULL,
+    votes INTEGER NOT NULL,
+    comment TEXT NOT NULL,
+    indent INTEGER NOT NULL,
+    PRIMARY KEY (post_id, rank)
+) WITHOUT ROWID;
+"""
+
+
+def tree_rows(top_level):
+    """
+    Flatten a tree of comments into rows, breadth first.
+
+    :param top_level: The top-level comments, praw comments or FetchedComment, each with its replies.
+    :return A generator of (comment ID, parent ID, position among its siblings, author, score, edited, body).
+    """
+    queue = deque(enumerate(top_level))
+    while queue:
+        position, comment = queue.popleft()
+        # "Load more comments" stubs have no score and are skipped
+        if getattr(comment, 'score', None) is None:
+            continue
+        yield (comment_id(comment), comment.parent_id, position, str(comment.author), comment.score,
+               comment.edited or None, comment.body)
+        queue.extend(enumerate(comment.replies))
+
+
+class SubmissionCache:
+    """The comments of fetched posts, in a SQLite database."""
+
+    def __init__(self, database_file, ttl=3600):
+        """
+        :param database_file: The SQLite database, created if it does not exist.
+        :param ttl: The seconds the comments of a post are served from the cache before they are fetched again.
+        """
+        self.database_file = database_file
+        self.ttl = ttl
+
+        directory = os.path.dirname(database_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.connect() as connection:
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self):
+        """A connection to the database, committed and closed on exit, so each thread can open its own."""
+        with closing(sqlite3.connect(self.database_file, timeout=30)) as connection:
+            with connection:
+                yield connection
+
+    def fetched_at(self, post_id):
+        """Return the time the post was last fetched, or None if it is not cached."""
+        with self.connect() as connection:
+            row = connection.execute('SELECT fetched_at FROM posts WHERE post_id = ?', (post_id,)).fetchone()
+        return row[0] if row else None
+
+    def is_fresh(self, post_id, now=None):
+        """Return whether the comments of the post can be served from the cache."""
+        fetched_at = self.fetched_at(post_id)
+        return fetched_at is not None and (now if now is not None else time.time()) - fetched_at < self.ttl
+
+    def load(self, post_id):
+        """
+        Load the comments of a post.
+
+        :param post_id: The ID of the post.
+        :return The top-level comments of the post, each with its replies, in the order they were fetched.
+        :rtype list[FetchedComment]
+        """
+        with self.connect() as connection:
+            rows = connection.execute(
+                'SELECT comment_id, parent_id, author, score, body, edited FROM comments WHERE post_id = ? '
+                'ORDER BY position', (post_id,)).fetchall()
+
+        comments = {row[0]: FetchedComment(*row) for row in rows}
+        top_level = []
+        for comment in comments.values():
+            parent = comments.get(comment.parent_id)
+            if parent is not None:
+                parent.replies.append(comment)
+            else:
+                top_level.append(comment)
+        return top_level
+
+    def store(self, post_id, url, top_level, now=None):
+        """
+        Merge freshly fetched comments of a post into the cache.
+
+        Comments that are no longer fetched, because they were removed or fell behind a stub, stay in the cache.
+
+        :param post_id: The ID of the post.
+        :param url: The URL of the post.
+        :param top_level: The fetched top-level comments, each with its replies.
+        :param now: The time of the fetch, the current time by default.
+        :return The number of new comments, of edited comments and of comments whose score was refreshed.
+        :rtype dict
+        """
+        new, edited, refreshed = [], [], []
+        with self.connect() as connection:
+            cached = dict(connection.execute('SELECT comment_id, edited FROM comments WHERE post_id = ?', (post_id,)))
+            for fullname, parent_id, position, author, score, edited_at, body in tree_rows(top_level):
+                if fullname not in cached:
+                    new.append((post_id, fullname, parent_id, position, author, score, edited_at, body))
+                elif cached[fullname] != edited_at:
+                    edited.append((position, score, edited_at, body, post_id, fullname))
+                else:
+                    refreshed.append((position, score, post_id, fullname))
+
+            connection.executemany('INSERT INTO comments VALUES (?, ?, ?, ?, ?, ?, ?, ?)', new)
+            connection.executemany('UPDATE comments SET position = ?, score = ?, edited = ?, body = ? '
+                                   'WHERE post_id = ? AND comment_id = ?', edited)
+            connection.executemany('UPDATE comments SET position = ?, score = ? WHERE post_id = ? AND comment_id = ?',
+                                   refreshed)
+            connection.execute('INSERT OR REPLACE INTO posts VALUES (?, ?, ?)',
+                               (post_id, url, now if now is not None else time.time()))
+        return {'new': len(new), 'edited': len(edited), 'refreshed': len(refreshed)}
+
+    def snapshot(self, post_id):
+        """
+        Load the comments last extracted from a post.
+
+        :param post_id: The ID of the post.
+        :return (rank, record) pairs by record key, empty if the post has no snapshot.
+        :rtype dict
+        """
+        with self.connect() as connection:
+            rows = connection.execute('SELECT rank, comment_id, author, votes, comment, indent FROM snapshots '
+                                      'WHERE post_id = ? ORDER BY rank', (post_id,)).fetchall()
+        return {(row[1], row[5]): (row[0], {'id': row[1], 'author': row[2], 'votes': row[3], 'comment': row[4],
+                                             'indent': row[5]})
+                for row in rows}
+
+    def save_snapshot(self, post_id, records):
+        """Replace the snapshot of a post with the comments extracted from it, in rank order."""
+        with self.connect() as connection:
+            connection.execute('DELETE FROM snapshots WHERE post_id = ?', (post_id,))
+            connection.executemany('INSERT INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                   [(post_id, rank, record['id'], str(record['author']), record['votes'],
+                                     record['comment'], record['indent'])
+                                    for rank, record in enumerate(records)])
+
+    def comment_tree(self, post_url, fetch):
+        """
+        Return the comments of a post from the cache, fetching them first if they are missing or expired.
+
+        :param post_url: The URL of the post.
+        :param fetch: A function without arguments returning the fetched top-level comments of the post.
+        :return The top-level comments of the post, each with its replies.
+        :rtype list[FetchedComment]
+        """
+        post_id = parse_post_url(post_url)
+        if self.is_fresh(post_id):
+            print(f"Using the cached comments of post {post_id}")
+        else:
+            counts = self.store(post_id, post_url, fetch())
+            print(f"Cached the comments of post {post_id}: {counts['new']} new, {counts['edited']} edited, "
+                  f"{counts['refreshed']} refreshed scores")
+        return self.load(post_id)
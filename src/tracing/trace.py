@@ -0,0 +1,160 @@
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+# Worker processes inherit the environment, so their spans end up in the same trace as the main process
+TRACE_DIR_VARIABLE = 'SUBREDDIT_VIDEO_TRACE_DIR'
+TRACE_FILE = 'trace.json'
+
+# Spans of a process are appended to its own events file, so processes never write to the same file
+events_lock = threading.Lock()
+named_threads = set()
+
+
+def trace_directory():
+    """Return the directory the spans are written to, or None if tracing is disabled."""
+    return os.environ.get(TRACE_DIR_VARIABLE)
+
+
+def start_tracing(trace_dir):
+    """
+    Start writing spans to a directory, for this process and the worker processes it starts afterwards.
+
+    Spans left over from a previous attempt are removed.
+
+    :param trace_dir: The directory where the events of every process are written.
+    :type trace_dir: str
+    """
+    if os.path.isdir(trace_dir):
+        shutil.rmtree(trace_dir)
+    os.makedirs(trace_dir)
+    os.environ[TRACE_DIR_VARIABLE] = os.path.abspath(trace_dir)
+
+
+def stop_tracing(output_file=None):
+    """
+    Stop tracing and merge the spans of every process into a single trace, removing the events directory.
+
+    :param output_file: The path of the Chrome trace JSON. Defaults to trace.json next to the events directory.
+    :return The path of the trace, or None if tracing was not started.
+    :rtype str or None
+    """
+    trace_dir = os.environ.pop(TRACE_DIR_VARIABLE, None)
+    if trace_dir is None:
+        return None
+    with events_lock:
+        named_threads.clear()
+
+    if output_file is None:
+        output_file = os.path.join(os.path.dirname(trace_dir), TRACE_FILE)
+    write_trace(trace_dir, output_file)
+    shutil.rmtree(trace_dir, ignore_errors=True)
+    return output_file
+
+
+def now():
+    """Return the wall clock in microseconds, which is shared by every process of the run."""
+    return time.time_ns() // 1000
+
+
+def record_event(event):
+    """Append an event to the events file of this process, if tracing is enabled."""
+    trace_dir = trace_directory()
+    if trace_dir is None:
+        return
+
+    pid = os.getpid()
+    tid = threading.get_ident()
+    events = []
+    with events_lock:
+        # The first event of a process and of a thread names it in the timeline
+        if (pid, None) not in named_threads:
+            named_threads.add((pid, None))
+            events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                           'args': {'name': multiprocessing.current_process().name}})
+        if (pid, tid) not in named_threads:
+            named_threads.add((pid, tid))
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                           'args': {'name': threading.current_thread().name}})
+        events.append(dict(event, pid=pid, tid=tid))
+
+        with open(os.path.join(trace_dir, f'events_{pid}.jsonl'), 'a') as file:
+            for item in events:
+                file.write(json.dumps(item, default=str) + '\n')
+
+
+@contextmanager
+def trace_span(name, category='stage', **args):
+    """
+    Record the time spent in a block as a span of the trace.
+
+    Nothing is recorded while tracing is disabled.
+
+    :param name: The name of the span, e.g. 'tts_chunk'.
+    :param category: The category of the span, e.g. 'stage' or 'subprocess'.
+    :param args: Details shown with the span, e.g. the index of the comment.
+    """
+    if trace_directory() is None:
+        yield
+        return
+
+    start = now()
+    try:
+        yield
+    except BaseException as e:
+        args['error'] = repr(e)
+        raise
+    finally:
+        record_event({'name': name, 'cat': category, 'ph': 'X', 'ts': start, 'dur': now() - start, 'args': args})
+
+
+def traced_task(func, stage):
+    """
+    Wrap a pipeline stage function so that every call is recorded as a span.
+
+    :param func: The stage function, called as ``func(index, row)``.
+    :param stage: The name of the span.
+    :return The wrapped stage function.
+    """
+    def task(index, row):
+        with trace_span(stage, 'stage', comment=index):
+            return func(index, row)
+
+    return task
+
+
+def read_events(trace_dir):
+    """Read the events of every process, skipping a line cut short by a crash."""
+    events = []
+    for events_file in sorted(glob.glob(os.path.join(trace_dir, 'events_*.jsonl'))):
+        with open(events_file) as file:
+            for line in file:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return events
+
+
+def write_trace(trace_dir, output_file):
+    """
+    Merge the events of every process into a trace that chrome://tracing and Perfetto can open.
+
+    :param trace_dir: The directory with the events files.
+    :param output_file: The path of the trace JSON.
+    :return The number of events in the trace.
+    :rtype int
+    """
+    events = read_events(trace_dir)
+    # Metadata first, then the spans in the order they started
+    events.sort(key=lambda event: (event['ph'] != 'M', event.get('ts', 0)))
+
+    with open(output_file, 'w') as file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+    return len(events)
@@ -2,6 +2,8 @@ import os
 
 from moviepy.editor import VideoFileClip, AudioFileClip
 
+from src.tracing.trace import trace_span
+
 
 def combine_video_audio(input_video, input_audio, output_video):
     """
@@ -37,6 +39,7 @@ def combine_video_audio(input_video, input_audio, output_video):
     video_with_audio = video_clip.set_audio(delayed_audio_clip)
 
     # Write the result to a file
-    video_with_audio.write_videofile(output_video, codec="libx264", audio_codec="aac")
+    with trace_span('mux', 'subprocess', output=output_video):
+        video_with_audio.write_videofile(output_video, codec="libx264", audio_codec="aac")
 
     print(f"Video with audio saved to {output_video}")
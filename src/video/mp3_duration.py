@@ -0,0 +1,271 @@
+"""
+Read the duration of an MP3 file from its headers, without decoding it.
+
+Files written by LAME or ffmpeg start with a Xing/Info or VBRI frame that holds the number of frames, and a LAME tag
+with the encoder delay and padding, so their duration is read from the first kilobytes. Files without one, or whose
+tag does not cover the whole file, like the concatenated chunks of gTTS, are read frame header by frame header,
+skipping from each header to the next. Only a file whose frame headers are corrupt is decoded.
+
+Durations are kept by path, size and modification time, so a file probed by the artifact cache and again by the
+recorder is only read once.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+# Bitrates in kbit/s by MPEG version 1 or 2 (2.5 uses those of 2), layer and bitrate index
+BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Sample rates by the version bits of a frame header: MPEG 2.5, reserved, MPEG 2, MPEG 1
+SAMPLE_RATES = {0: (11025, 12000, 8000), 2: (22050, 24000, 16000), 3: (44100, 48000, 32000)}
+# Bytes of garbage between frames tolerated before the file is considered corrupt
+MAX_JUNK = 4096
+# Durations kept in the index
+MAX_ENTRIES = 4096
+
+
+class Mp3HeaderError(ValueError):
+    """Raised when the frame headers of an MP3 file are corrupt."""
+
+
+class FrameHeader:
+    """The fields of an MP3 frame header the duration depends on."""
+    __slots__ = ['version', 'layer', 'sample_rate', 'length', 'samples', 'mono']
+
+    def __init__(self, version, layer, sample_rate, length, samples, mono):
+        self.version = version
+        self.layer = layer
+        self.sample_rate = sample_rate
+        self.length = length
+        self.samples = samples
+        self.mono = mono
+
+    def same_stream(self, other):
+        return (self.version, self.layer, self.sample_rate) == (other.version, other.layer, other.sample_rate)
+
+
+def parse_frame_header(data, offset):
+    """
+    Parse the frame header at an offset.
+
+    :return The header, or None if there is no valid header at the offset.
+    :rtype FrameHeader or None
+    """
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    version_bits = (data[offset + 1] >> 3) & 3
+    layer = 4 - ((data[offset + 1] >> 1) & 3)
+    bitrate_index = data[offset + 2] >> 4
+    sample_rate_index = (data[offset + 2] >> 2) & 3
+    # Free bitrate frames have no length in their header
+    if version_bits == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    version = 1 if version_bits == 3 else 2
+    bitrate = BITRATES[(version, layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (data[offset + 2] >> 1) & 1
+    if layer == 1:
+        length, samples = (12 * bitrate // sample_rate + padding) * 4, 384
+    elif layer == 3 and version == 2:
+        length, samples = 72 * bitrate // sample_rate + padding, 576
+    else:
+        length, samples = 144 * bitrate // sample_rate + padding, 1152
+    return FrameHeader(version, layer, sample_rate, length, samples, data[offset + 3] >> 6 == 3)
+
+
+def id3v2_length(data, offset):
+    """Return the length of the ID3v2 tag at an offset, 0 if there is none."""
+    if data[offset:offset + 3] != b'ID3' or offset + 10 > len(data):
+        return 0
+    # The size is a syncsafe integer, 7 bits per byte, without the header and the footer
+    size = 0
+    for byte in data[offset + 6:offset + 10]:
+        size = (size << 7) | (byte & 0x7F)
+    return 10 + size + (10 if data[offset + 5] & 0x10 else 0)
+
+
+def read_uint(data, offset, size):
+    return int.from_bytes(data[offset:offset + size], 'big')
+
+
+def info_tag(data, offset, header):
+    """
+    Read the Xing/Info or VBRI tag of a frame, which starts every file written by LAME or ffmpeg.
+
+    :return The number of audio frames, the bytes of the stream if known, and the samples of encoder delay and
+        padding, or None if the frame has no tag.
+    :rtype tuple[int, int or None, int, int] or None
+    """
+    if header.layer == 3:
+        # The tag follows the side information, whose length depends on the version and the channels
+        side_info = (17 if header.mono else 32) if header.version == 1 else (9 if header.mono else 17)
+        position = offset + 4 + side_info
+        if data[position:position + 4] in (b'Xing', b'Info'):
+            flags = read_uint(data, position + 4, 4)
+            position += 8
+            frames = stream_bytes = None
+            if flags & 1:
+                frames = read_uint(data, position, 4)
+                position += 4
+            if flags & 2:
+                stream_bytes = read_uint(data, position, 4)
+                position += 4
+            position += (100 if flags & 4 else 0) + (4 if flags & 8 else 0)
+            if frames is None:
+                return None
+            delay = padding = 0
+            # The LAME tag, also written by ffmpeg, holds the encoder delay and padding in 12 bits each
+            if data[position:position + 4] in (b'LAME', b'Lavc', b'Lavf', b'L3.9'):
+                gapless = read_uint(data, position + 21, 3)
+                delay, padding = gapless >> 12, gapless & 0xFFF
+            return frames, stream_bytes, delay, padding
+    if data[offset + 36:offset + 40] == b'VBRI':
+        return read_uint(data, offset + 50, 4), read_uint(data, offset + 46, 4), 0, 0
+    return None
+
+
+def audio_end(data):
+    """Return the end of the frames, before an ID3v1 tag."""
+    if len(data) >= 128 and data[-128:-125] == b'TAG':
+        return len(data) - 128
+    return len(data)
+
+
+def scan_frames(data, offset, end):
+    """
+    Count the samples of the frames from an offset, reading only their headers.
+
+    ID3v2 tags between frames, e.g. of concatenated files, are skipped, and so are a few bytes of garbage.
+
+    :return The samples and their sample rate.
+    :rtype tuple[int, int]
+    :raises Mp3HeaderError: if there are no frames or too much garbage between them
+    """
+    first = None
+    samples = junk = 0
+    while offset < end:
+        tag_length = id3v2_length(data, offset)
+        if tag_length:
+            offset += tag_length
+            continue
+        if data[offset:offset + 8] == b'APETAGEX':
+            break
+        header = parse_frame_header(data, offset)
+        if header is not None and first is None:
+            # A frame is only trusted at the start of the stream if the next frame follows it
+            following = parse_frame_header(data, offset + header.length)
+            if offset + header.length < end and (following is None or not following.same_stream(header)):
+                header = None
+        elif header is not None and not header.same_stream(first):
+            header = None
+        if header is None or offset + header.length > end:
+            if header is not None:
+                # A truncated last frame still decodes to its samples
+                samples += header.samples
+                break
+            junk += 1
+            if junk > MAX_JUNK:
+                raise Mp3HeaderError(f"No MP3 frame header in {MAX_JUNK} bytes at offset {offset}")
+            offset += 1
+            continue
+        first = first or header
+        junk = 0
+        # The tag frames of concatenated files hold no audio
+        if info_tag(data, offset, header) is None:
+            samples += header.samples
+        offset += header.length
+    if first is None:
+        raise Mp3HeaderError('No MP3 frames')
+    return samples, first.sample_rate
+
+
+def read_duration(file_path):
+    """
+    Read the duration of an MP3 file from its headers.
+
+    :return The duration in seconds.
+    :rtype float
+    :raises Mp3HeaderError: if the frame headers are corrupt
+    """
+    with open(file_path, 'rb') as file:
+        data = file.read()
+
+    offset = id3v2_length(data, 0)
+    end = audio_end(data)
+    # The first frame may follow a few bytes of padding of the tag
+    while offset < min(end, MAX_JUNK) and parse_frame_header(data, offset) is None:
+        offset += 1
+    header = parse_frame_header(data, offset)
+    if header is None:
+        raise Mp3HeaderError('No MP3 frame header at the start of the file')
+
+    tag = info_tag(data, offset, header)
+    if tag is not None:
+        frames, stream_bytes, delay, padding = tag
+        # A tag that does not cover the whole file only describes its first part, e.g. the first of concatenated
+        # chunks
+        if stream_bytes is None or abs(stream_bytes - (end - offset)) <= header.length:
+            return max(0, frames * header.samples - delay - padding) / header.sample_rate
+        # The tag frame holds no audio, and decoders only drop the encoder delay of the first file
+        offset += header.length
+        skipped = delay
+    else:
+        skipped = 0
+
+    samples, sample_rate = scan_frames(data, offset, end)
+    return max(0, samples - skipped) / sample_rate
+
+
+class DurationIndex:
+    """The durations of MP3 files, by path, size and modification time, the least recently used evicted first."""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.durations = OrderedDict()
+        self.lock = threading.Lock()
+
+    def duration(self, file_path, decode=None):
+        """
+        Return the duration of an MP3 file, read from its headers the first time.
+
+        :param file_path: The path to the MP3 file.
+        :param decode: Returns the duration of a file by decoding it, for files whose headers are corrupt.
+        :return The duration in seconds.
+        :rtype float
+        :raises Mp3HeaderError: if the headers are corrupt and there is no decode function
+        """
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            if key in self.durations:
+                self.durations.move_to_end(key)
+                return self.durations[key]
+
+        try:
+            duration = read_duration(file_path)
+        except Mp3HeaderError:
+            if decode is None:
+                raise
+            duration = decode(file_path)
+
+        with self.lock:
+            self.durations[key] = duration
+            while len(self.durations) > self.max_entries:
+                self.durations.popitem(last=False)
+        return duration
+
+
+# Shared by every stage of this process
+duration_index = DurationIndex()
+
+
+def mp3_duration(file_path, decode=None):
+    """Return the duration of an MP3 file from its headers, see DurationIndex.duration."""
+    return duration_index.duration(file_path, decode)
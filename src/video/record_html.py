@@ -1,7 +1,11 @@
 import os
 import shutil
 import subprocess
+import threading
 import time
+import uuid
+from contextlib import contextmanager
+from multiprocessing.util import Finalize
 
 from pydub import AudioSegment
 from selenium import webdriver
@@ -13,6 +17,13 @@ from selenium.webdriver.support.ui import WebDriverWait
 from webdriver_manager.chrome import ChromeDriverManager
 
 from src.html.generate_html import generate_html
+from src.tracing.trace import trace_span
+from src.video.mp3_duration import mp3_duration
+
+# Browsers are kept open between recordings and reused by the next one, in this process
+idle_browsers = []
+idle_browsers_lock = threading.Lock()
+chrome_driver_path = None
 
 
 def get_mp3_length(mp3_file):
@@ -49,43 +60,25 @@ def reencode_mp3(input_file, output_file):
         print(f"An error occurred during re-encoding: {e}")
 
 
-def get_mp3_length_v2(mp3_file, retries=3):
+def get_mp3_length_v2(mp3_file):
     """
-    Get the length of an MP3 file in seconds, with re-encoding if necessary.
+    Get the length of an MP3 file in seconds, read from its frame headers.
+
+    The file is only decoded if its headers are corrupt, and its length is kept until it changes, so the artifact
+    cache and the recorder read it once.
 
     :param mp3_file: The path to the MP3 file.
     :type mp3_file: str
-    :param retries: Number of times to retry re-encoding if there are issues.
-    :type retries: int
-    :return: The length of the MP3 file in seconds.
+    :return: The length of the MP3 file in seconds, 10 if it is missing, None if it cannot be read.
     :rtype: float
     """
-    attempt = 0
-    if os.path.exists(mp3_file):
-        temp_file = mp3_file
-
-        while attempt <= retries:
-            try:
-                audio = AudioSegment.from_mp3(temp_file)
-                duration = len(audio) / 1000.0  # duration in seconds
-                return duration
-            except Exception as e:
-                print(f"Error: {e}")
-                if attempt < retries:
-                    print(f"Attempting re-encoding ({attempt + 1}/{retries})...")
-                    new_temp_file = f"{mp3_file.rsplit('.', 1)[0]}_reencoded_{attempt + 1}.mp3"
-                    try:
-                        reencode_mp3(temp_file, new_temp_file)
-                        temp_file = new_temp_file
-                    except Exception as e:
-                        print(f"An error occurred during re-encoding: {e}")
-                        return None
-                else:
-                    print("Maximum re-encoding attempts reached. Failed to get the duration of the MP3 file.")
-                    return None
-            attempt += 1
-    else:
+    if not os.path.exists(mp3_file):
         return 10
+    try:
+        return mp3_duration(mp3_file, decode=get_mp3_length)
+    except Exception as e:
+        print(f"Failed to get the duration of the MP3 file {mp3_file}: {e}")
+        return None
 
 
 def copy_files_by_list(file_list, target_dir, prefix=""):
@@ -142,8 +135,55 @@ def record_mp4_task(index, row, output_dir, version, extension):
 
     generate_html(row, html_file, version)
 
+    with trace_span('probe_mp3', 'audio', comment=index):
+        duration = get_mp3_length_v2(mp3_file)
+
     print(f"Processing {html_file} to {mp4_file}")
-    record_html(html_file, mp4_file, get_mp3_length_v2(mp3_file))
+    record_html(html_file, mp4_file, duration)
+
+
+def launch_browser():
+    """
+    Launch a Chrome browser, downloading the matching chromedriver on first use in this process.
+
+    The browser is closed when the process exits, recorder worker processes included.
+    """
+    global chrome_driver_path
+    if chrome_driver_path is None:
+        chrome_driver_path = ChromeDriverManager().install()
+
+    options = Options()
+    options.add_argument('--start-maximized')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--window-size=1920,1080')
+    with trace_span('browser_launch', 'subprocess'):
+        driver = webdriver.Chrome(service=ChromeService(chrome_driver_path), options=options)
+    # Worker processes exit without running atexit handlers, multiprocessing finalizers do run, before the
+    # virtual display of the worker is stopped
+    close = Finalize(None, driver.quit, exitpriority=20)
+    return driver, close
+
+
+@contextmanager
+def shared_browser():
+    """
+    Borrow an idle browser, or launch one if every browser is busy.
+
+    The browser is given back for the next recording on exit, or closed if the recording failed with it.
+    """
+    with idle_browsers_lock:
+        browser = idle_browsers.pop() if idle_browsers else None
+    if browser is None:
+        browser = launch_browser()
+
+    driver, close = browser
+    try:
+        yield driver
+    except BaseException:
+        close()
+        raise
+    with idle_browsers_lock:
+        idle_browsers.append(browser)
 
 
 def get_window_id(window_name):
@@ -182,76 +222,76 @@ def get_window_geometry(window_id):
     return int(x), int(y), int(width), int(height)
 
 
-def record_html(path, output, duration, framerate=120):
+def record_html(path, output, duration, framerate=120, window_title=None):
     """
     :param path: The path to the HTML file or URL that needs to be recorded.
     :param output: The output file path where the recorded video/audio should be saved.
     :param duration: The duration of the recording in seconds.
     :param framerate: The framerate of the recording.
+    :param window_title: The title given to the browser window to find it on the display. A unique title is
+        generated by default, so that recordings running side by side never pick each other's window.
     :return None
 
     This method records a video or audio of the specified HTML page or URL using the Chrome browser and FFmpeg.
+    The browser is borrowed from the browsers kept open by this process, and launched only if none is idle.
+    The screen is captured from the X display in the DISPLAY environment variable, or from :0.0 if it is not set.
     """
-    options = Options()
-    options.add_argument('--start-maximized')
-    options.add_argument('--disable-gpu')
-    options.add_argument('--window-size=1920,1080')
+    if window_title is None:
+        window_title = f'Sample HTML {uuid.uuid4().hex}'
+    display = os.environ.get('DISPLAY', ':0.0')
 
-    driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=options)
+    file_extension = os.path.splitext(output)[1].lower()
+    if file_extension not in ['.mp4', '.mkv']:
+        print(f"Unsupported file extension: {file_extension}")
+        return
 
     # Ensure path is a valid URL or file path
     if not path.startswith(('http://', 'https://')):
         path = f"file://{os.path.abspath(path)}?duration={duration * 1000}"
 
-    driver.get(path)
+    with shared_browser() as driver:
+        with trace_span('page_load', 'subprocess', output=output):
+            driver.get(path)
 
-    # Inject CSS to hide the cursor
-    driver.execute_script("""
-        const style = document.createElement('style');
-        style.innerHTML = '* { cursor: none !important; }';
-        document.head.appendChild(style);
-    """)
+        # Inject CSS to hide the cursor
+        driver.execute_script("""
+            const style = document.createElement('style');
+            style.innerHTML = '* { cursor: none !important; }';
+            document.head.appendChild(style);
+        """)
 
-    driver.execute_script("document.title = 'Sample HTML';")
-    time.sleep(1)  # Wait for the page to load
+        driver.execute_script("document.title = arguments[0];", window_title)
+        time.sleep(1)  # Wait for the page to load
 
-    window_id = get_window_id('Sample HTML')
-    if not window_id:
-        print("Could not find window ID.")
-        driver.quit()
-        return
+        window_id = get_window_id(window_title)
+        if not window_id:
+            print("Could not find window ID.")
+            return
 
-    x, y, width, height = get_window_geometry(window_id)
-    print(f"Window geometry - X: {x}, Y: {y}, Width: {width}, Height: {height}")
+        x, y, width, height = get_window_geometry(window_id)
+        print(f"Window geometry - X: {x}, Y: {y}, Width: {width}, Height: {height}")
 
-    # Adjust coordinates if necessary
-    x = max(0, x)
-    y = max(0, y)
+        # Adjust coordinates if necessary
+        x = max(0, x)
+        y = max(0, y)
 
-    # Determine file extension and set appropriate FFmpeg command
-    file_extension = os.path.splitext(output)[1].lower()
-    if file_extension in ['.mp4', '.mkv']:
         ffmpeg_cmd = [
-            'ffmpeg', '-y', '-f', 'x11grab', '-video_size', f'{width}x{height}', '-i', f':0.0+{x},{y}',
+            'ffmpeg', '-y', '-f', 'x11grab', '-video_size', f'{width}x{height}', '-i', f'{display}+{x},{y}',
             '-codec:v', 'libx264', '-r', str(framerate), '-t', str(duration + 1), output
         ]
-    else:
-        print(f"Unsupported file extension: {file_extension}")
-        driver.quit()
-        return
 
-    # Start FFmpeg to record
-    ffmpeg = subprocess.Popen(ffmpeg_cmd)
+        # Start FFmpeg to record
+        with trace_span('capture', 'subprocess', output=output, duration=duration):
+            ffmpeg = subprocess.Popen(ffmpeg_cmd)
 
-    try:
-        # Wait until the body element has the data-rendering-over attribute
-        WebDriverWait(driver, duration + 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "body[data-rendering-over]"))
-        )
-        print("Rendering is over, stopping the recording and closing the browser.")
-    except Exception as e:
-        print(f"Error or timeout waiting for attribute: {e}")
-    finally:
-        ffmpeg.terminate()
-        driver.quit()
-        ffmpeg.wait()
+            try:
+                # Wait until the body element has the data-rendering-over attribute
+                WebDriverWait(driver, duration + 10).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "body[data-rendering-over]"))
+                )
+                print("Rendering is over, stopping the recording.")
+            except Exception as e:
+                print(f"Error or timeout waiting for attribute: {e}")
+            finally:
+                ffmpeg.terminate()
+                ffmpeg.wait()
@@ -0,0 +1,82 @@
+import multiprocessing
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.util import Finalize
+
+
+def start_virtual_display(width=1920, height=1080, depth=24):
+    """
+    Start an Xvfb virtual display on the first free display number.
+
+    :param width: The width of the screen in pixels.
+    :param height: The height of the screen in pixels.
+    :param depth: The colour depth of the screen.
+    :return The Xvfb process and the name of its display, e.g. ':3'.
+    :rtype tuple[subprocess.Popen, str]
+    """
+    read_fd, write_fd = os.pipe()
+    try:
+        # Xvfb picks a free display number itself and writes it to the given file descriptor once it is ready
+        process = subprocess.Popen(
+            ['Xvfb', '-displayfd', str(write_fd), '-screen', '0', f'{width}x{height}x{depth}', '-nolisten', 'tcp'],
+            pass_fds=(write_fd,),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        os.close(write_fd)
+        write_fd = None
+        with os.fdopen(read_fd) as display_pipe:
+            read_fd = None
+            display_number = display_pipe.readline().strip()
+    finally:
+        for fd in (read_fd, write_fd):
+            if fd is not None:
+                os.close(fd)
+
+    if not display_number:
+        process.kill()
+        raise RuntimeError("Xvfb did not report a display number.")
+
+    return process, f':{display_number}'
+
+
+def stop_virtual_display(process):
+    """Stop an Xvfb process started by start_virtual_display."""
+    process.terminate()
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def init_recorder():
+    """
+    Initialize a recorder worker process with its own virtual display.
+
+    Browsers launched and screens captured by the worker use this display, so workers never overlap on screen.
+    """
+    process, display = start_virtual_display()
+    os.environ['DISPLAY'] = display
+    # Worker processes exit without running atexit handlers, multiprocessing finalizers do run
+    Finalize(None, stop_virtual_display, args=(process,), exitpriority=10)
+    print(f"Recorder {os.getpid()} uses virtual display {display}")
+
+
+def create_recorder_pool(workers):
+    """
+    Create a pool of recorder processes, each with its own virtual display and browser.
+
+    :param workers: The number of recordings that run at the same time.
+    :type workers: int
+    :return The process pool to submit recording tasks to.
+    :rtype ProcessPoolExecutor
+    """
+    # Tasks are submitted from pipeline threads, forking a multi-threaded process is not safe
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=init_recorder)
+
+
+def run_in_pool(pool, func, *args, **kwargs):
+    """Run a function in the given pool and wait for its result."""
+    return pool.submit(func, *args, **kwargs).result()
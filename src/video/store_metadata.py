@@ -109,6 +109,30 @@ def get_file_metadata(file_path):
         return None
 
 
+def probe_duration(file_path):
+    """
+    Get the duration of a media file with a quick ffprobe of its container.
+
+    :param file_path: The path of the media file.
+    :type file_path: str
+    :return The duration in seconds, or None if the file is missing or cannot be read.
+    :rtype float or None
+    """
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', file_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            timeout=30
+        )
+        if result.returncode != 0:
+            return None
+        return float(result.stdout.strip())
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None
+
+
 def store_metadata(folder_path):
     """
     Retrieve metadata from all the MP4 and MP3 files present in the given folder.
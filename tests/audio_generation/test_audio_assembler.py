@@ -0,0 +1,94 @@
+import os
+import subprocess
+import tempfile
+import types
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from src.audio_generation import generate_audio
+
+from src.audio_generation.audio_assembler import AudioAssembler
+
+
+class SilentTTS:
+    """Reads every text as a second of silence."""
+    synthesizer = types.SimpleNamespace(output_sample_rate=16000)
+
+    def __init__(self, model_name, progress_bar=True, gpu=False):
+        pass
+
+    def tts(self, text):
+        return [0.0] * 16000
+
+
+class TestAudioAssembler(unittest.TestCase):
+    def test_chunks_are_appended_in_order(self):
+        assembler = AudioAssembler(8000, capacity=4)
+        assembler.append([0.1, 0.2])
+        assembler.append(np.array([0.3, 0.4, 0.5], dtype=np.float64))
+        assembler.append([])
+
+        self.assertEqual(len(assembler), 5)
+        np.testing.assert_allclose(assembler.samples, [0.1, 0.2, 0.3, 0.4, 0.5], rtol=1e-6)
+        self.assertAlmostEqual(assembler.duration, 5 / 8000)
+
+    def test_buffer_doubles_when_it_runs_out(self):
+        assembler = AudioAssembler(8000, capacity=10)
+        assembler.append(np.zeros(8))
+        assembler.append(np.zeros(4))
+        self.assertEqual(len(assembler.buffer), 20)
+
+        # A chunk longer than the doubled buffer gets a buffer of its own size
+        assembler.append(np.zeros(50))
+        self.assertEqual(len(assembler.buffer), 62)
+
+    def test_pcm16_is_clipped(self):
+        assembler = AudioAssembler(8000)
+        assembler.append([-2.0, -1.0, 0.0, 0.5, 2.0])
+        self.assertEqual(assembler.to_pcm16().tolist(), [-32767, -32767, 0, 16383, 32767])
+
+    def test_write_mp3(self):
+        assembler = AudioAssembler(22050)
+        for frequency in (220, 440, 880):
+            time = np.arange(22050) / 22050
+            assembler.append(0.5 * np.sin(2 * np.pi * frequency * time))
+
+        with tempfile.TemporaryDirectory() as directory:
+            output_file = os.path.join(directory, 'comment.mp3')
+            assembler.write_mp3(output_file)
+            decoded = subprocess.run(['ffmpeg', '-loglevel', 'error', '-i', output_file, '-f', 's16le', '-ac', '1',
+                                      '-ar', '22050', '-'], capture_output=True, check=True).stdout
+
+        # Two bytes per sample, give or take the padding of the MP3 frames
+        self.assertAlmostEqual(len(decoded) / 2 / 22050, 3, delta=0.1)
+
+    def test_write_mp3_failure(self):
+        assembler = AudioAssembler(22050)
+        assembler.append(np.zeros(100))
+        with self.assertRaises(RuntimeError):
+            assembler.write_mp3(os.path.join(tempfile.gettempdir(), 'missing', 'directory', 'comment.mp3'))
+
+
+class TestGenerateAudio(unittest.TestCase):
+    def test_chunks_are_assembled_without_temporary_files(self):
+        text = ' '.join(['word'] * 100)
+        with tempfile.TemporaryDirectory() as directory, \
+                patch.object(generate_audio, 'TTS', SilentTTS), \
+                patch.dict(generate_audio.tts_models, {}, clear=True), \
+                patch('builtins.print'):
+            output_file = os.path.join(directory, 'comment_0.mp3')
+            generate_audio.generate_audio_mozilla_tts(text, output_file, 'model')
+
+            self.assertEqual(sorted(os.listdir(directory)),
+                             ['comment_0.mp3', 'comment_0_audio_generation_metadata.json'])
+            decoded = subprocess.run(['ffmpeg', '-loglevel', 'error', '-i', output_file, '-f', 's16le', '-'],
+                                     capture_output=True, check=True).stdout
+
+        # A second of silence for each of the 3 chunks of 200 characters
+        self.assertAlmostEqual(len(decoded) / 2 / 16000, 3, delta=0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+from unittest.mock import Mock, patch
+
+import numpy as np
+
+from src.audio_generation import generate_audio
+from src.audio_generation.audio_quality import QualityChecker, check_audio_quality
+
+SAMPLE_RATE = 22050
+
+
+def speech(seconds, seed=0):
+    """Return noise shaped like speech: syllables of random loudness and length with short pauses between them."""
+    random = np.random.default_rng(seed)
+    parts = []
+    while sum(len(part) for part in parts) < seconds * SAMPLE_RATE:
+        syllable = random.uniform(0.08, 0.3)
+        envelope = np.sin(np.linspace(0, np.pi, int(syllable * SAMPLE_RATE))) * random.uniform(0.05, 0.5)
+        parts.append(envelope * random.standard_normal(len(envelope)))
+        parts.append(np.zeros(int(random.uniform(0.02, 0.2) * SAMPLE_RATE)))
+    return np.concatenate(parts)[:int(seconds * SAMPLE_RATE)].astype(np.float32)
+
+
+class TestAudioQuality(unittest.TestCase):
+    def test_speech_passes(self):
+        for seed in range(5):
+            self.assertIsNone(check_audio_quality(speech(12, seed), SAMPLE_RATE, characters=200))
+
+    def test_long_silence(self):
+        samples = np.concatenate([speech(3), np.zeros(int(2.5 * SAMPLE_RATE)), speech(3, 1)])
+        self.assertRegex(check_audio_quality(samples, SAMPLE_RATE), '^silence')
+        # Pauses between sentences are not silences
+        samples = np.concatenate([speech(3), np.zeros(SAMPLE_RATE), speech(3, 1)])
+        self.assertIsNone(check_audio_quality(samples, SAMPLE_RATE))
+
+    def test_stuck_output(self):
+        tone = 0.3 * np.sin(2 * np.pi * 220 * np.arange(3 * SAMPLE_RATE) / SAMPLE_RATE)
+        samples = np.concatenate([speech(2), tone])
+        self.assertRegex(check_audio_quality(samples, SAMPLE_RATE), '^output stuck or looping')
+
+    def test_looping_output(self):
+        syllables = speech(0.6, 3)
+        samples = np.concatenate([speech(2)] + [syllables] * 5)
+        # The period is found within a frame
+        self.assertRegex(check_audio_quality(samples, SAMPLE_RATE),
+                         r'^output stuck or looping with a period of 0\.(59|60|61) seconds$')
+
+    def test_runaway_speech(self):
+        self.assertIsNone(check_audio_quality(speech(4), SAMPLE_RATE, characters=20))
+        self.assertRegex(check_audio_quality(speech(12), SAMPLE_RATE, characters=20), '^runaway speech')
+
+    def test_blocks_of_any_size(self):
+        samples = np.concatenate([speech(3), np.zeros(int(2.5 * SAMPLE_RATE)), speech(1)])
+        for block_size in [100, 511, 4096]:
+            checker = QualityChecker(SAMPLE_RATE)
+            problems = [checker.feed(samples[start:start + block_size])
+                        for start in range(0, len(samples), block_size)]
+            self.assertRegex(problems[-1], '^silence')
+            # The problem is found as soon as the silence is long enough, not at the end of the samples
+            first = next(i for i, problem in enumerate(problems) if problem is not None)
+            self.assertLess((first + 1) * block_size, len(samples) - 0.5 * SAMPLE_RATE)
+
+    def test_short_samples(self):
+        self.assertIsNone(check_audio_quality(np.zeros(0, dtype=np.float32), SAMPLE_RATE))
+        self.assertIsNone(check_audio_quality([0.5] * 100, 16000))
+
+
+class TestQualityRetries(unittest.TestCase):
+    def setUp(self):
+        self.poor = (np.zeros(3 * SAMPLE_RATE, dtype=np.float32), SAMPLE_RATE)
+        self.good = (speech(3), SAMPLE_RATE)
+        patch('builtins.print').start()
+        self.addCleanup(patch.stopall)
+
+    def test_poor_chunks_are_synthesized_again(self):
+        tts = Mock()
+        tts.tts_to_samples.side_effect = [self.poor, self.good]
+        phrase_cache = Mock()
+        phrase_cache.get_samples.return_value = None
+
+        audio, _ = generate_audio.generate_audio_chunk(tts, 'This.', phrase_cache=phrase_cache, cache_key='key')
+
+        self.assertIs(audio, self.good)
+        self.assertEqual(tts.tts_to_samples.call_count, 2)
+        phrase_cache.put_samples.assert_called_once_with('key', *self.good)
+
+    def test_poor_chunks_are_kept_but_not_cached(self):
+        tts = Mock()
+        tts.tts_to_samples.return_value = self.poor
+        phrase_cache = Mock()
+        phrase_cache.get_samples.return_value = None
+
+        audio, _ = generate_audio.generate_audio_chunk(tts, 'This.', phrase_cache=phrase_cache, cache_key='key',
+                                                       quality_retries=2)
+
+        self.assertIs(audio, self.poor)
+        self.assertEqual(tts.tts_to_samples.call_count, 3)
+        phrase_cache.put_samples.assert_not_called()
+
+    def test_poor_queued_chunks_are_synthesized_again(self):
+        future = Mock()
+        future.result.return_value = self.poor
+        tts = Mock()
+        tts.tts_to_samples.return_value = self.good
+
+        audio, _ = generate_audio.generate_queued_chunk(future, tts, 'This.')
+
+        self.assertIs(audio, self.good)
+        tts.tts_to_samples.assert_called_once_with('This.')
+
+
+if __name__ == '__main__':
+    unittest.main()
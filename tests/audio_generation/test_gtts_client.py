@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from src.audio_generation import generate_audio
+from src.audio_generation.fake_gtts import FakeGoogleTTS, fake_audio, response_body
+from src.audio_generation.gtts_client import GTTSClient, GTTSError, audio_from_response, backoff_seconds, \
+    create_gtts_client
+
+
+class TestGTTSClient(unittest.TestCase):
+    def setUp(self):
+        self.fake_gtts = FakeGoogleTTS(latency=0.05).start()
+        self.addCleanup(self.fake_gtts.stop)
+
+    def test_chunks_are_synthesized_at_the_same_time_in_order(self):
+        chunks = [f'chunk number {i}' for i in range(8)]
+        with GTTSClient(self.fake_gtts.base_url, workers=4) as client:
+            results = client.synthesize_chunks(chunks, 'en')
+
+        self.assertEqual([audio for audio, _ in results], [fake_audio(chunk, 'en') for chunk in chunks])
+        self.assertGreater(self.fake_gtts.max_in_flight, 1)
+        self.assertLessEqual(self.fake_gtts.max_in_flight, 4)
+
+    def test_long_chunks_are_sent_in_parts(self):
+        chunk = ' '.join(['word'] * 40)
+        with GTTSClient(self.fake_gtts.base_url) as client:
+            audio, _ = client.synthesize(chunk)
+
+        self.assertEqual(self.fake_gtts.request_count, 2)
+        self.assertTrue(audio.startswith(b'[en:word') and audio.endswith(b'word]'))
+
+    def test_refused_requests_are_retried_under_the_rate_limit(self):
+        self.fake_gtts.rate_limit = 2
+        with GTTSClient(self.fake_gtts.base_url, workers=4, rate=10, max_retries=5) as client:
+            results = client.synthesize_chunks(['one', 'two', 'three', 'four'], 'en')
+
+        self.assertEqual([audio for audio, _ in results], [fake_audio(text, 'en') for text in
+                                                          ['one', 'two', 'three', 'four']])
+        self.assertGreater(self.fake_gtts.refused_count, 0)
+
+    def test_refused_requests_back_off_without_a_rate_limit(self):
+        self.fake_gtts.rate_limit = 1
+        with GTTSClient(self.fake_gtts.base_url, workers=4, max_retries=5) as client, \
+                patch('src.audio_generation.gtts_client.time.sleep', wraps=time.sleep) as sleep:
+            results = client.synthesize_chunks(['one', 'two', 'three'], 'en')
+
+        self.assertEqual([audio for audio, _ in results], [fake_audio(text, 'en') for text in ['one', 'two', 'three']])
+        self.assertGreater(self.fake_gtts.refused_count, 0)
+        # Every refused request waited for the Retry-After of the endpoint
+        self.assertEqual(sum(call.args == (1.0,) for call in sleep.call_args_list), self.fake_gtts.refused_count)
+
+    def test_server_errors_back_off_exponentially(self):
+        with GTTSClient(self.fake_gtts.base_url, max_retries=3) as client, \
+                patch('src.audio_generation.gtts_client.time.sleep') as sleep:
+            client.session.post = Mock(return_value=Mock(status_code=503, headers={}))
+            with self.assertRaises(GTTSError):
+                client.post('body')
+
+        self.assertEqual(client.session.post.call_count, 4)
+        waits = [call.args[0] for call in sleep.call_args_list]
+        self.assertEqual(len(waits), 3)
+        for attempt, wait in enumerate(waits):
+            self.assertTrue(0.25 * 2 ** attempt <= wait <= 0.5 * 2 ** attempt)
+        self.assertEqual(backoff_seconds(3, {'Retry-After': '7'}), 7)
+
+    def test_failures_raise(self):
+        with GTTSClient(self.fake_gtts.base_url + '/missing', max_retries=0) as client:
+            with self.assertRaises(GTTSError):
+                client.synthesize_chunks(['hello'], 'en')
+
+    def test_audio_from_response(self):
+        self.assertEqual(audio_from_response(response_body(b'audio')), b'audio')
+        with self.assertRaises(GTTSError):
+            audio_from_response(b")]}'\n\n[]\n")
+
+    def test_generate_audio_gtts_writes_the_chunks_in_order(self):
+        text = ' '.join(f'sentence {i}.' for i in range(30))
+        with tempfile.TemporaryDirectory() as directory, \
+                GTTSClient(self.fake_gtts.base_url, workers=4) as client:
+            output_file = os.path.join(directory, 'comment_0.mp3')
+            with patch('builtins.print'):
+                generate_audio.generate_audio_gtts(text, output_file, 'en', gtts_client=client)
+
+            chunks = generate_audio.split_text_into_phrases(text, 50, 200)
+            with open(output_file, 'rb') as file:
+                self.assertEqual(file.read(), b''.join(fake_audio(chunk, 'en') for chunk in chunks))
+            with open(os.path.join(directory, 'comment_0_audio_generation_metadata.json')) as file:
+                self.assertEqual(len(json.load(file)['chunk_times']), len(chunks))
+            # Nothing is written outside the output directory
+            self.assertFalse(os.path.exists('temp.mp3'))
+
+    def test_create_gtts_client(self):
+        configuration = {'audio_generation': {'enabled': True, 'tts_library': 'tts'}}
+        self.assertIsNone(create_gtts_client(configuration))
+        self.assertIsNone(create_gtts_client({}))
+
+        configuration['audio_generation'].update(tts_library='gtts', gtts_workers=2, gtts_rate=5)
+        with create_gtts_client(configuration) as client:
+            self.assertEqual(client.workers, 2)
+            self.assertEqual(client.rate_limiter.max_rate, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
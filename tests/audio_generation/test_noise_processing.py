@@ -0,0 +1,146 @@
+import multiprocessing
+import unittest
+from unittest.mock import Mock, patch
+
+import numpy as np
+from pydub import AudioSegment
+
+from src.audio_generation import generate_audio, noise_processing
+from src.audio_generation.noise_processing import NoiseReducer, block_ranges, create_noise_reducer, \
+    noise_profile, reduce_block, reduce_noise, segment_samples
+
+SAMPLE_RATE = 16000
+
+
+def noisy_speech(seconds, seed=0):
+    """Return a tone switched on and off over a noise floor, and the noise floor alone."""
+    random = np.random.default_rng(seed)
+    time = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    noise = 0.01 * random.standard_normal(len(time))
+    speech = 0.3 * np.sin(2 * np.pi * 220 * time) * (np.sin(2 * np.pi * 1.3 * time) > 0)
+    return (speech + noise).astype(np.float32), noise.astype(np.float32)
+
+
+class TestNoiseProcessing(unittest.TestCase):
+    def test_segment_samples_are_a_view_of_the_raw_buffer(self):
+        left, right = [1, 2, 3], [-1, -2, -3]
+        interleaved = np.array([left, right], dtype='<i2').T.tobytes()
+        segment = AudioSegment(interleaved, sample_width=2, frame_rate=SAMPLE_RATE, channels=2)
+
+        samples, full_scale = segment_samples(segment)
+
+        self.assertEqual(samples.tolist(), [left, right])
+        self.assertEqual(full_scale, 32768)
+        self.assertFalse(samples.flags.owndata)
+        self.assertFalse(samples.flags.writeable)
+
+    def test_noise_profile_is_the_quietest_noise(self):
+        samples, noise = noisy_speech(10)
+        samples[:4096] = 0
+
+        profile = noise_profile(samples, SAMPLE_RATE, seconds=0.5)
+
+        self.assertEqual(len(profile), 3 * 2048)
+        # Neither the speech nor the digital silence is in the profile
+        self.assertAlmostEqual(np.sqrt(np.mean(np.square(profile))), 0.01, delta=0.003)
+        self.assertIsNone(noise_profile(np.zeros(SAMPLE_RATE), SAMPLE_RATE))
+        self.assertIsNone(noise_profile(np.ones(100), SAMPLE_RATE))
+
+    def test_block_ranges(self):
+        self.assertEqual(block_ranges(25, 10, 2), [(0, 10, 0, 12), (10, 20, 8, 22), (20, 25, 18, 25)])
+        self.assertEqual(block_ranges(0, 10, 2), [])
+
+    def test_blocks_join_like_the_whole_recording(self):
+        samples, _ = noisy_speech(20)
+        profile = noise_profile(samples, SAMPLE_RATE)
+        whole = reduce_block(samples[None], SAMPLE_RATE, profile)[0]
+
+        for workers, mp_context in ((0, None), (2, multiprocessing.get_context('fork'))):
+            with NoiseReducer(workers, block_seconds=3, mp_context=mp_context) as noise_reducer:
+                denoised = noise_reducer.reduce(samples, SAMPLE_RATE, 'model', lambda: (samples, SAMPLE_RATE))
+            self.assertEqual(denoised.shape, samples.shape)
+            np.testing.assert_allclose(denoised, whole, atol=1e-6)
+
+    def test_noise_is_reduced(self):
+        samples, noise = noisy_speech(10)
+        noise_reducer = NoiseReducer(0, block_seconds=3)
+        denoised = noise_reducer.reduce(samples, SAMPLE_RATE, 'model', lambda: (samples, SAMPLE_RATE))
+
+        # Between the tones, only the noise floor is left
+        pauses = np.sin(2 * np.pi * 1.3 * np.arange(len(samples)) / SAMPLE_RATE) < -0.5
+        self.assertLess(np.sqrt(np.mean(np.square(denoised[pauses]))), np.sqrt(np.mean(np.square(noise))) / 2)
+
+    def test_noise_profile_is_taken_once_per_model_from_its_reference(self):
+        noise_reducer = NoiseReducer(0)
+        reference = Mock(return_value=(noisy_speech(2, seed=10)[0], SAMPLE_RATE))
+        other_reference = Mock(return_value=(noisy_speech(2, seed=11)[0], SAMPLE_RATE))
+        for seed in range(3):
+            noise_reducer.reduce(noisy_speech(2, seed)[0], SAMPLE_RATE, 'model', reference)
+        noise_reducer.reduce(noisy_speech(2)[0], SAMPLE_RATE, 'other model', other_reference)
+        noise_reducer.reduce(noisy_speech(2)[0], SAMPLE_RATE)
+
+        reference.assert_called_once_with()
+        other_reference.assert_called_once_with()
+        self.assertEqual(sorted(noise_reducer.profiles), ['model', 'other model'])
+        # The profile does not depend on the clip read first
+        np.testing.assert_array_equal(noise_reducer.profiles['model'], noise_profile(*reference.return_value))
+
+    def test_clips_of_a_single_block_are_denoised_in_this_thread(self):
+        samples, _ = noisy_speech(2)
+        with NoiseReducer(2, block_seconds=3, mp_context=multiprocessing.get_context('fork')) as noise_reducer:
+            with patch.object(noise_reducer, 'executor') as executor:
+                noise_reducer.reduce(samples, SAMPLE_RATE, 'model', lambda: (samples, SAMPLE_RATE))
+            executor.assert_not_called()
+            self.assertIsNone(noise_reducer.pool)
+
+    def test_channels_are_denoised_apart(self):
+        samples, _ = noisy_speech(3)
+        left = np.rint(samples * 32767).astype('<i2')
+        right = np.zeros_like(left)
+        segment = AudioSegment(np.array([left, right]).T.tobytes(), sample_width=2, frame_rate=SAMPLE_RATE,
+                               channels=2)
+
+        denoised = reduce_noise(segment, NoiseReducer(0), 'model', lambda: (samples, SAMPLE_RATE))
+
+        self.assertEqual((denoised.channels, denoised.sample_width, len(denoised.raw_data)),
+                         (2, 2, len(segment.raw_data)))
+        channels, _ = segment_samples(denoised)
+        self.assertGreater(np.abs(channels[0]).max(), 5000)
+        self.assertEqual(np.abs(channels[1]).max(), 0)
+
+    def test_create_noise_reducer(self):
+        configuration = {'audio_generation': {'enabled': True, 'tts_library': 'tts', 'noise_reduction': False}}
+        self.assertIsNone(create_noise_reducer(configuration))
+        self.assertIsNone(create_noise_reducer({}))
+        configuration['audio_generation'].update(noise_reduction=True, tts_library='gtts')
+        self.assertIsNone(create_noise_reducer(configuration))
+
+        configuration['audio_generation'].update(tts_library='tts', noise_workers=3)
+        self.assertEqual(create_noise_reducer(configuration).workers, 3)
+
+
+class TestDenoisedSynthesis(unittest.TestCase):
+    def test_speech_is_denoised_before_it_is_encoded(self):
+        tts = Mock()
+        tts.tts_to_samples.return_value = (noisy_speech(1)[0], SAMPLE_RATE)
+        noise_reducer = Mock()
+        noise_reducer.reduce.side_effect = lambda samples, sample_rate, profile_key, reference: \
+            np.full(len(samples), 0.25)
+
+        with patch.object(generate_audio, 'load_tts_model', return_value=tts), \
+                patch.object(generate_audio.AudioAssembler, 'write_mp3', autospec=True) as write_mp3, \
+                patch('builtins.open'), patch('builtins.print'):
+            generate_audio.generate_audio_mozilla_tts('First chunk.', 'comment_0.mp3', 'model',
+                                                      noise_reducer=noise_reducer)
+
+        self.assertEqual(noise_reducer.reduce.call_args.args[1:3], (SAMPLE_RATE, 'model'))
+        # The noise profile of the model is taken from its reading of the reference text
+        reference = noise_reducer.reduce.call_args.args[3]
+        self.assertEqual(reference()[1], SAMPLE_RATE)
+        tts.tts_to_samples.assert_called_with(generate_audio.NOISE_REFERENCE_TEXT)
+        assembler, _ = write_mp3.call_args.args
+        np.testing.assert_array_equal(assembler.samples, np.full(SAMPLE_RATE, 0.25, dtype=np.float32))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+import tempfile
+import types
+import unittest
+from unittest.mock import patch
+
+from src.audio_generation import generate_audio
+from src.audio_generation.tts_server import TTSServer, create_tts_server, length_buckets, tts_model_name
+from src.cache.phrase_cache import PhraseCache
+
+
+class FakeTTS:
+    """Reads the model, the text and the process that synthesized it as samples, one per character."""
+    synthesizer = types.SimpleNamespace(output_sample_rate=16000)
+
+    def __init__(self, model_name, progress_bar=True, gpu=False):
+        self.model_name = model_name
+
+    def tts(self, text):
+        if text == 'fail':
+            raise RuntimeError('synthesis failed')
+        return [float(ord(character)) for character in f'{self.model_name}:{text}:{os.getpid()}']
+
+
+def read_samples(audio):
+    """Return the model, the text and the process of samples of FakeTTS."""
+    samples, sample_rate = audio
+    assert sample_rate == 16000
+    return ''.join(chr(int(sample)) for sample in samples).split(':')
+
+
+class TestTTSServer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        # The workers are forked, so they inherit the fake model
+        patch.object(generate_audio, 'TTS', FakeTTS).start()
+        patch.dict(generate_audio.tts_models, {}, clear=True).start()
+        self.addCleanup(patch.stopall)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def synthesize(self, server, model_name, text):
+        return read_samples(server.model(model_name).tts_to_samples(text))
+
+    def test_synthesis_runs_in_the_workers(self):
+        with TTSServer(2, model_names=['model'], mp_context=multiprocessing.get_context('fork')) as server:
+            results = [self.synthesize(server, 'model', f'text{i}') for i in range(4)]
+
+        self.assertEqual([text for _, text, _ in results], [f'text{i}' for i in range(4)])
+        pids = {int(pid) for _, _, pid in results}
+        self.assertNotIn(os.getpid(), pids)
+        self.assertLessEqual(len(pids), 2)
+        # The models of the workers are never loaded by the pipeline process
+        self.assertEqual(generate_audio.tts_models, {})
+
+    def test_models_are_loaded_on_first_use(self):
+        with TTSServer(1, model_names=[], mp_context=multiprocessing.get_context('fork')) as server:
+            self.assertEqual(self.synthesize(server, 'other', 'hello')[:2], ['other', 'hello'])
+
+    def test_generate_audio_chunk_with_a_worker_model(self):
+        with TTSServer(1, model_names=['model'], mp_context=multiprocessing.get_context('fork')) as server:
+            audio, _ = generate_audio.generate_audio_chunk(server.model('model'), 'hello')
+        self.assertEqual(read_samples(audio)[:2], ['model', 'hello'])
+
+    def test_create_tts_server(self):
+        configuration = {'audio_generation': {'enabled': True, 'tts_library': 'tts', 'tts_workers': 0}}
+        self.assertIsNone(create_tts_server(configuration))
+        configuration['audio_generation'].update(tts_workers=2, tts_library='gtts')
+        self.assertIsNone(create_tts_server(configuration))
+        self.assertIsNone(create_tts_server({}))
+
+        configuration['audio_generation']['tts_library'] = 'tts'
+        with patch('src.audio_generation.tts_server.TTSServer') as mock_server:
+            create_tts_server(configuration)
+        mock_server.assert_called_once_with(2, 0, ['tts_models/en/ljspeech/tacotron2-DDC'], batch_size=1,
+                                            batch_wait=0)
+
+    def test_tts_model_name(self):
+        self.assertEqual(tts_model_name({}), 'tts_models/en/ljspeech/tacotron2-DDC')
+        configuration = {'audio_generation': {'tts_models': ['tts_models/en/vctk/vits', 'tts_models/de/thorsten/vits']}}
+        self.assertEqual(tts_model_name(configuration), 'tts_models/en/vctk/vits')
+
+    def test_batched_synthesis(self):
+        with TTSServer(2, model_names=['model'], mp_context=multiprocessing.get_context('fork'), batch_size=8,
+                       batch_wait=0.05) as server:
+            futures = [server.submit('model', 'word ' * i) for i in range(6)]
+            failed = server.submit('model', 'fail')
+            results = [read_samples(future.result(timeout=30)) for future in futures]
+            with self.assertRaises(RuntimeError):
+                failed.result(timeout=30)
+
+        self.assertEqual([text for _, text, _ in results], ['word ' * i for i in range(6)])
+
+    @staticmethod
+    def retry_chunk(tts, text_chunk, **kwargs):
+        return ([0.5] * 100, 16000), 0
+
+    def test_generate_audio_with_queued_chunks(self):
+        output_file = os.path.join(self.directory.name, 'comment.mp3')
+        chunks = ['first chunk', 'fail', 'last chunk']
+        with TTSServer(1, model_names=['model'], mp_context=multiprocessing.get_context('fork'),
+                       batch_size=4) as server, \
+                patch.object(generate_audio, 'split_text_into_chunks', return_value=chunks), \
+                patch.object(generate_audio, 'generate_audio_chunk', side_effect=self.retry_chunk) as retry, \
+                patch.object(generate_audio.AudioAssembler, 'write_mp3', autospec=True) as write_mp3:
+            generate_audio.generate_audio_mozilla_tts('text', output_file, 'model', tts_server=server)
+
+        # Only the chunk that failed in the worker is synthesized again, then every chunk is assembled in order
+        retry.assert_called_once()
+        self.assertEqual(retry.call_args.args[1], 'fail')
+        assembler, file_path = write_mp3.call_args.args
+        self.assertEqual(file_path, output_file)
+        # The samples of the retried chunk read as '|'
+        assembled = ''.join('|' if sample == 0.5 else chr(int(sample)) for sample in assembler.samples)
+        self.assertRegex(assembled, r'^model:first chunk:\d+\|{100}model:last chunk:\d+$')
+
+    def test_cached_chunks_are_not_queued(self):
+        phrase_cache = PhraseCache(os.path.join(self.directory.name, 'phrases'), 1024 * 1024)
+        with TTSServer(1, model_names=['model'], mp_context=multiprocessing.get_context('fork')) as server, \
+                patch.object(generate_audio.AudioAssembler, 'write_mp3', autospec=True), \
+                patch.object(server, 'submit', wraps=server.submit) as submit:
+            for i in range(2):
+                generate_audio.generate_audio_mozilla_tts('This.', os.path.join(self.directory.name, f'{i}.mp3'),
+                                                          'model', tts_server=server, phrase_cache=phrase_cache)
+
+        submit.assert_called_once_with('model', 'This.')
+        self.assertEqual(phrase_cache.statistics()['hits'], 1)
+
+
+class TestLengthBuckets(unittest.TestCase):
+    def test_buckets_of_similar_lengths(self):
+        requests = [('model', 'x' * length, None) for length in [50, 10, 40, 20, 30, 60]]
+        buckets = length_buckets(requests, 2)
+
+        self.assertEqual([[len(request[1]) for request in bucket] for bucket in buckets],
+                         [[10, 20, 30, 40], [50, 60]])
+
+    def test_buckets_per_model(self):
+        requests = [('a', 'one', None), ('b', 'two', None), ('a', 'three', None)]
+        buckets = length_buckets(requests, 1)
+
+        self.assertEqual([[request[1] for request in bucket] for bucket in buckets], [['one', 'three'], ['two']])
+
+
+if __name__ == '__main__':
+    unittest.main()
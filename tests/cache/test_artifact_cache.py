@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from src.cache import artifact_cache
+
+
+class TestArtifactCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.test_dir, 'cache')
+        self.output_dir = os.path.join(self.test_dir, 'output')
+        os.makedirs(self.output_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write_file(self, file_path, content):
+        with open(file_path, 'w') as f:
+            f.write(content)
+
+    def test_audio_artifact_key_depends_on_text_and_library(self):
+        key = artifact_cache.audio_artifact_key({'comment': 'hello'}, 'gtts')
+        self.assertEqual(key, artifact_cache.audio_artifact_key({'comment': 'hello'}, 'gtts'))
+        self.assertNotEqual(key, artifact_cache.audio_artifact_key({'comment': 'hello'}, 'tts'))
+        self.assertNotEqual(key, artifact_cache.audio_artifact_key({'comment': 'hello!'}, 'gtts'))
+        self.assertNotEqual(key, artifact_cache.audio_artifact_key({'comment': 'hello'}, 'gtts', True))
+
+    def test_audio_artifact_key_depends_on_the_model(self):
+        key = artifact_cache.audio_artifact_key({'comment': 'hello'}, 'tts', model_name='tts_models/en/vctk/vits')
+        self.assertNotEqual(key, artifact_cache.audio_artifact_key({'comment': 'hello'}, 'tts',
+                                                                   model_name='tts_models/en/ljspeech/glow-tts'))
+
+    def test_combined_artifact_key_missing_input(self):
+        mp4_file = os.path.join(self.output_dir, 'comment_0.mp4')
+        self.write_file(mp4_file, 'video')
+        self.assertIsNone(artifact_cache.combined_artifact_key(mp4_file, os.path.join(self.output_dir, 'none.mp3')))
+
+    def test_store_and_fetch_artifact(self):
+        source = os.path.join(self.output_dir, 'comment_0.mp3')
+        self.write_file(source, 'audio')
+        artifact_cache.store_artifact(self.cache_dir, 'abcdef', source)
+
+        destination = os.path.join(self.output_dir, 'comment_1.mp3')
+        self.assertTrue(artifact_cache.fetch_artifact(self.cache_dir, 'abcdef', destination))
+        with open(destination) as f:
+            self.assertEqual(f.read(), 'audio')
+        self.assertTrue(os.path.samefile(source, destination))
+
+    def test_fetch_artifact_miss(self):
+        destination = os.path.join(self.output_dir, 'comment_0.mp3')
+        self.assertFalse(artifact_cache.fetch_artifact(self.cache_dir, 'abcdef', destination))
+        self.assertFalse(os.path.exists(destination))
+
+    def test_evict_artifacts_removes_least_recently_used(self):
+        for i, key in enumerate(['aa11', 'bb22', 'cc33']):
+            source = os.path.join(self.output_dir, f'comment_{i}.mp3')
+            self.write_file(source, 'x' * 10)
+            artifact_cache.store_artifact(self.cache_dir, key, source)
+            cached_file = artifact_cache.artifact_path(self.cache_dir, key, '.mp3')
+            os.utime(cached_file, (time.time() - 100 + i, time.time() - 100 + i))
+
+        # Using the oldest artifact makes it the most recently used one
+        artifact_cache.fetch_artifact(self.cache_dir, 'aa11', os.path.join(self.output_dir, 'reused.mp3'))
+
+        removed = artifact_cache.evict_artifacts(self.cache_dir, 20)
+
+        self.assertEqual(removed, 1)
+        self.assertTrue(os.path.exists(artifact_cache.artifact_path(self.cache_dir, 'aa11', '.mp3')))
+        self.assertFalse(os.path.exists(artifact_cache.artifact_path(self.cache_dir, 'bb22', '.mp3')))
+        self.assertTrue(os.path.exists(artifact_cache.artifact_path(self.cache_dir, 'cc33', '.mp3')))
+
+    def test_fetch_artifact_evicted_after_it_was_found(self):
+        destination = os.path.join(self.output_dir, 'comment_0.mp3')
+        with patch('os.path.exists', side_effect=[True, False]):
+            self.assertFalse(artifact_cache.fetch_artifact(self.cache_dir, 'abcdef', destination))
+        self.assertFalse(os.path.exists(destination))
+
+    def test_evict_artifacts_skips_artifacts_evicted_concurrently(self):
+        for i, key in enumerate(['aa11', 'bb22']):
+            source = os.path.join(self.output_dir, f'comment_{i}.mp3')
+            self.write_file(source, 'x' * 10)
+            artifact_cache.store_artifact(self.cache_dir, key, source)
+        # An artifact being stored by another run is not evicted
+        temp_file = artifact_cache.artifact_path(self.cache_dir, 'cc33', '.mp3.1234.tmp')
+        os.makedirs(os.path.dirname(temp_file))
+        self.write_file(temp_file, 'x' * 10)
+
+        remove = os.remove
+
+        def remove_twice(file_path):
+            # Another run evicted the artifact just before this one
+            remove(file_path)
+            remove(file_path)
+
+        with patch('os.remove', side_effect=remove_twice):
+            removed = artifact_cache.evict_artifacts(self.cache_dir, 0)
+
+        self.assertEqual(removed, 0)
+        self.assertFalse(os.path.exists(artifact_cache.artifact_path(self.cache_dir, 'aa11', '.mp3')))
+        self.assertTrue(os.path.exists(temp_file))
+
+    def test_cached_task_only_builds_changed_artifacts(self):
+        def build(index, row):
+            self.write_file(os.path.join(self.output_dir, f'comment_{index}.mp3'), row['comment'])
+
+        func = Mock(side_effect=build)
+        task = artifact_cache.cached_task(func, self.cache_dir,
+                                          lambda index, row: artifact_cache.audio_artifact_key(row, 'gtts'),
+                                          lambda index: os.path.join(self.output_dir, f'comment_{index}.mp3'))
+
+        task(0, {'comment': 'first'})
+        task(1, {'comment': 'second'})
+        self.assertEqual(func.call_count, 2)
+
+        # A re-run into a fresh output directory only rebuilds the changed comment
+        shutil.rmtree(self.output_dir)
+        os.makedirs(self.output_dir)
+        task(0, {'comment': 'first'})
+        task(1, {'comment': 'changed'})
+        self.assertEqual(func.call_count, 3)
+        with open(os.path.join(self.output_dir, 'comment_0.mp3')) as f:
+            self.assertEqual(f.read(), 'first')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+import numpy as np
+
+from src.audio_generation import generate_audio
+from src.cache import phrase_cache
+from src.cache.phrase_cache import PhraseCache, create_phrase_cache, save_phrase_cache_report
+
+
+class TestPhraseCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.test_dir, 'phrases')
+        self.cache = PhraseCache(self.cache_dir, 1024 * 1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_key_normalizes_the_text(self):
+        key = self.cache.key('Came here  to say\nthis.', 'tts', 'model')
+        self.assertEqual(key, self.cache.key(' came here to say this. ', 'tts', 'model'))
+        self.assertNotEqual(key, self.cache.key('came here to say this', 'tts', 'model'))
+        self.assertNotEqual(key, self.cache.key('came here to say this.', 'tts', 'other model'))
+        self.assertNotEqual(key, self.cache.key('came here to say this.', 'gtts', language='en'))
+        self.assertNotEqual(self.cache.key('this.', 'gtts', language='en'),
+                            self.cache.key('this.', 'gtts', language='fr'))
+
+    def test_gtts_keys_keep_the_case(self):
+        # gTTS reads "US" as the country and "us" as the pronoun
+        self.assertNotEqual(self.cache.key('Made in the US.', 'gtts', language='en'),
+                            self.cache.key('Made in the us.', 'gtts', language='en'))
+        self.assertEqual(self.cache.key('Made in  the US.', 'gtts', language='en'),
+                         self.cache.key('Made in the US.', 'gtts', language='en'))
+
+    def test_bytes_round_trip(self):
+        key = self.cache.key('This.', 'gtts', language='en')
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, b'mp3 audio')
+
+        self.assertEqual(self.cache.get(key), b'mp3 audio')
+        self.assertEqual(self.cache.statistics()['hits'], 1)
+        self.assertEqual(self.cache.statistics()['misses'], 1)
+        self.assertEqual(self.cache.statistics()['hit_rate'], 0.5)
+
+    def test_samples_round_trip(self):
+        key = self.cache.key('This.', 'tts', 'model')
+        samples = np.array([0.0, 0.5, -0.5, 1.0], dtype=np.float32)
+        self.cache.put_samples(key, samples, 22050)
+
+        cached_samples, sample_rate = self.cache.get_samples(key)
+        self.assertEqual(sample_rate, 22050)
+        np.testing.assert_allclose(cached_samples, samples, atol=1e-4)
+        # Samples are cached apart from bytes of the same key
+        self.assertIsNone(self.cache.get(key))
+
+    def test_least_recently_used_chunks_are_evicted(self):
+        cache = PhraseCache(self.cache_dir, 2500)
+        keys = [cache.key(f'phrase {i}', 'gtts') for i in range(3)]
+        for i, key in enumerate(keys[:2]):
+            cache.put(key, b'x' * 1000)
+            os.utime(phrase_cache.artifact_path(self.cache_dir, key, '.mp3'), (time.time() - 100 + i,) * 2)
+        # Reading the oldest chunk makes it the most recently used
+        self.assertIsNotNone(cache.get(keys[0]))
+
+        cache.put(keys[2], b'x' * 1000)
+
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[2]))
+        self.assertLessEqual(cache.statistics()['size_bytes'], 2500)
+
+    def test_a_full_cache_is_evicted_below_its_cap(self):
+        cache = PhraseCache(self.cache_dir, 10000)
+        for i in range(11):
+            cache.put(cache.key(f'phrase {i}', 'gtts'), b'x' * 1000)
+            os.utime(phrase_cache.artifact_path(self.cache_dir, cache.key(f'phrase {i}', 'gtts'), '.mp3'),
+                     (time.time() - 100 + i,) * 2)
+
+        # Two chunks were evicted, down to 90% of the cap
+        self.assertEqual(cache.statistics()['size_bytes'], 9000)
+        self.assertIsNone(cache.get(cache.key('phrase 0', 'gtts')))
+        self.assertIsNone(cache.get(cache.key('phrase 1', 'gtts')))
+        # The next chunk fits without walking the cache again
+        with patch('src.cache.phrase_cache.evict_least_recently_used') as evict:
+            cache.put(cache.key('phrase 11', 'gtts'), b'x' * 1000)
+        evict.assert_not_called()
+        self.assertEqual(cache.statistics()['size_bytes'], 10000)
+
+    def test_size_of_an_existing_cache(self):
+        self.cache.put(self.cache.key('This.', 'gtts'), b'x' * 100)
+        self.assertEqual(PhraseCache(self.cache_dir, 1024).statistics()['size_bytes'], 100)
+
+    def test_save_report(self):
+        self.cache.get(self.cache.key('This.', 'gtts'))
+        report_file = os.path.join(self.test_dir, 'phrase_cache.json')
+        with patch('builtins.print'):
+            save_phrase_cache_report(self.cache, report_file)
+
+        with open(report_file) as file:
+            self.assertEqual(json.load(file), {'hits': 0, 'misses': 1, 'hit_rate': 0.0, 'size_bytes': 0})
+
+    def test_create_phrase_cache(self):
+        self.assertIsNone(create_phrase_cache({}))
+        self.assertIsNone(create_phrase_cache({'cache': {'enabled': True}}))
+        self.assertIsNone(create_phrase_cache({'cache': {'enabled': False, 'phrases': True}}))
+
+        cache = create_phrase_cache({'cache': {'enabled': True, 'phrases': True, 'phrase_directory': self.cache_dir,
+                                               'phrase_max_size_mb': 2}})
+        self.assertEqual(cache.directory, self.cache_dir)
+        self.assertEqual(cache.max_size_bytes, 2 * 1024 * 1024)
+
+
+class TestCachedSynthesis(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache = PhraseCache(os.path.join(self.test_dir, 'phrases'), 1024 * 1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_generate_audio_chunk_reads_a_phrase_once(self):
+        tts = Mock()
+        tts.tts_to_samples.return_value = (np.full(100, 0.25, dtype=np.float32), 16000)
+        key = self.cache.key('This.', 'tts', 'model')
+
+        first, _ = generate_audio.generate_audio_chunk(tts, 'This.', phrase_cache=self.cache, cache_key=key)
+        second, chunk_time = generate_audio.generate_audio_chunk(tts, 'This.', phrase_cache=self.cache, cache_key=key)
+
+        tts.tts_to_samples.assert_called_once_with('This.')
+        self.assertEqual(chunk_time, 0)
+        np.testing.assert_allclose(second[0], first[0], atol=1e-4)
+        self.assertEqual(self.cache.statistics()['hits'], 1)
+
+    def test_generate_audio_gtts_reads_repeated_chunks_once(self):
+        client = Mock()
+        client.synthesize_chunks.side_effect = lambda chunks, language: [(f'<{chunk}>'.encode(), 0.1)
+                                                                        for chunk in chunks]
+        with patch('builtins.print'):
+            for i, text in enumerate(['This.', 'Came here to say this.', 'This.']):
+                generate_audio.generate_audio_gtts(text, os.path.join(self.test_dir, f'comment_{i}.mp3'), 'en',
+                                                   gtts_client=client, phrase_cache=self.cache)
+
+        self.assertEqual([call.args[0] for call in client.synthesize_chunks.call_args_list],
+                         [['This.'], ['Came here to say this.']])
+        with open(os.path.join(self.test_dir, 'comment_2.mp3'), 'rb') as file:
+            self.assertEqual(file.read(), b'<This.>')
+        self.assertEqual(self.cache.statistics()['hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import toml
+
+from src.cli import batch
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        self.configuration = {
+            'data_source': {'url': 'https://reddit.com/base', 'comments_qty': 10, 'samples': True},
+            'html_generation': {'enabled': True, 'version': 'v4'}
+        }
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    def write_queue(self, jobs):
+        queue_file = os.path.join(self.test_dir, 'queue.jsonl')
+        with open(queue_file, 'w') as f:
+            for job in jobs:
+                f.write((json.dumps(job) if isinstance(job, dict) else job) + '\n')
+        return queue_file
+
+    def test_new_run_id_is_unique(self):
+        run_ids = {batch.new_run_id('job') for _ in range(100)}
+        self.assertEqual(len(run_ids), 100)
+        self.assertTrue(all('-job-' in run_id for run_id in run_ids))
+
+    def test_read_jobs(self):
+        queue_file = self.write_queue([{'url': 'https://reddit.com/a'}, '',
+                                       {'url': 'https://reddit.com/b', 'id': 'b', 'overrides': {'x': {'y': 1}}}])
+        jobs = batch.read_jobs(queue_file)
+        self.assertEqual(jobs, [{'url': 'https://reddit.com/a', 'id': 'job1', 'overrides': {}},
+                                {'url': 'https://reddit.com/b', 'id': 'b', 'overrides': {'x': {'y': 1}}}])
+
+    def test_read_jobs_without_url(self):
+        queue_file = self.write_queue([{'id': 'a'}])
+        with self.assertRaises(ValueError):
+            batch.read_jobs(queue_file)
+
+    def test_merge_configuration(self):
+        job = {'url': 'https://reddit.com/a', 'id': 'a',
+               'overrides': {'html_generation': {'version': 'v3'}, 'data_source': {'comments_qty': 5}}}
+        merged = batch.merge_configuration(self.configuration, job)
+
+        self.assertEqual(merged['html_generation'], {'enabled': True, 'version': 'v3'})
+        self.assertEqual(merged['data_source']['url'], 'https://reddit.com/a')
+        self.assertEqual(merged['data_source']['comments_qty'], 5)
+        self.assertFalse(merged['data_source']['samples'])
+        self.assertTrue(merged['data_source']['default_name'])
+        # The base configuration is left untouched for the other jobs
+        self.assertEqual(self.configuration['html_generation']['version'], 'v4')
+
+    def test_run_batch(self):
+        jobs = [{'url': f'https://reddit.com/{i}', 'id': f'job{i}', 'overrides': {}} for i in range(4)]
+        seen = []
+        lock = threading.Lock()
+
+        def run_job(configuration, output_dir):
+            with lock:
+                seen.append((configuration['data_source']['url'], output_dir))
+            if configuration['data_source']['url'].endswith('/2'):
+                raise ValueError('boom')
+
+        results = batch.run_batch(jobs, self.configuration, run_job, workers=2)
+
+        self.assertEqual([result['id'] for result in results], ['job0', 'job1', 'job2', 'job3'])
+        self.assertEqual([result['status'] for result in results], ['done', 'done', 'failed', 'done'])
+        self.assertEqual(results[2]['error'], 'boom')
+
+        # Jobs started in the same second still get their own output directory and configuration
+        output_dirs = [result['output_dir'] for result in results]
+        self.assertEqual(len(set(output_dirs)), 4)
+        for result in results:
+            with open(os.path.join(result['output_dir'], 'updated_config.toml')) as f:
+                self.assertEqual(toml.load(f)['data_source']['url'], result['url'])
+
+    def test_shared_resources_without_recorder_pool(self):
+        resources = batch.SharedResources(audio_slots=2, video_slots=1, ffmpeg_slots=3)
+        self.assertIsNone(resources.recorder_pool)
+        resources.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from src.cli.governor import MEGABYTE, MemoryGovernor, create_governor, governed_task, process_tree_rss
+
+
+class TestGovernor(unittest.TestCase):
+    def setUp(self):
+        self.governor = MemoryGovernor(100, {'audio': 60, 'html': 10}, sample_interval=60)
+
+    def tearDown(self):
+        self.governor.close()
+
+    def test_process_tree_rss_includes_children(self):
+        alone = process_tree_rss()
+        child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(5)'])
+        try:
+            time.sleep(0.2)
+            self.assertGreater(process_tree_rss(), alone)
+        finally:
+            child.kill()
+            child.wait()
+
+    @patch('src.cli.governor.process_tree_rss', return_value=0)
+    def test_admit_waits_for_memory(self, _):
+        events = []
+        first_admitted = threading.Event()
+        release_first = threading.Event()
+
+        def first():
+            with self.governor.admit('audio'):
+                events.append('first admitted')
+                first_admitted.set()
+                release_first.wait(5)
+                events.append('first done')
+
+        def second():
+            first_admitted.wait(5)
+            with self.governor.admit('audio'):
+                events.append('second admitted')
+
+        threads = [threading.Thread(target=first), threading.Thread(target=second)]
+        for thread in threads:
+            thread.start()
+        first_admitted.wait(5)
+        time.sleep(0.1)
+        self.assertEqual(events, ['first admitted'])
+
+        release_first.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(events, ['first admitted', 'first done', 'second admitted'])
+        self.assertEqual(self.governor.reserved, 0)
+
+    @patch('src.cli.governor.process_tree_rss', return_value=0)
+    def test_admit_lets_small_work_in_next_to_heavy_work(self, _):
+        with self.governor.admit('audio'):
+            admitted = threading.Event()
+
+            def small():
+                with self.governor.admit('html'):
+                    admitted.set()
+
+            thread = threading.Thread(target=small)
+            thread.start()
+            self.assertTrue(admitted.wait(5))
+            thread.join(5)
+
+    @patch('src.cli.governor.process_tree_rss', return_value=0)
+    def test_admit_runs_work_larger_than_the_budget_alone(self, _):
+        with self.governor.admit('video'):
+            pass
+        self.governor.estimates['video'] = 1000
+        with self.governor.admit('video'):
+            self.assertEqual(self.governor.reserved, 1000)
+
+    def test_measured_peaks_replace_the_estimates(self):
+        with patch('src.cli.governor.process_tree_rss', side_effect=[100, 130]):
+            with self.governor.admit('audio'):
+                pass
+        self.assertEqual(self.governor.estimate('audio'), 30)
+
+        with patch('src.cli.governor.process_tree_rss', side_effect=[100, 150]):
+            with self.governor.admit('audio'):
+                pass
+        self.assertEqual(self.governor.estimate('audio'), 50)
+
+        with patch('src.cli.governor.process_tree_rss', side_effect=[100, 110]):
+            with self.governor.admit('audio'):
+                pass
+        self.assertEqual(self.governor.estimate('audio'), 50)
+
+    def test_implausible_peaks_keep_the_guess(self):
+        with patch('src.cli.governor.process_tree_rss', side_effect=[100, 100]):
+            with self.governor.admit('audio'):
+                pass
+        self.assertEqual(self.governor.estimate('audio'), 60)
+
+        with patch('src.cli.governor.process_tree_rss', side_effect=[100, 180]):
+            with self.governor.admit('audio'):
+                pass
+        self.assertEqual(self.governor.estimate('audio'), 80)
+
+    def test_failed_work_is_not_measured(self):
+        with patch('src.cli.governor.process_tree_rss', side_effect=[100, 500]):
+            with self.assertRaises(RuntimeError):
+                with self.governor.admit('audio'):
+                    raise RuntimeError('failed')
+        self.assertEqual(self.governor.estimate('audio'), 60)
+        self.assertEqual(self.governor.peaks, {})
+        self.assertEqual(self.governor.reserved, 0)
+
+    def test_concurrent_reservations_are_subtracted(self):
+        with patch('src.cli.governor.process_tree_rss', side_effect=[100, 100, 175, 180]):
+            with self.governor.admit('audio'):
+                with self.governor.admit('html'):
+                    pass
+        # html grew the tree by 75 next to the 60 reserved by audio, audio by 80 next to the 10 reserved by html
+        self.assertEqual(self.governor.peaks, {'html': 15, 'audio': 70})
+        self.assertEqual(self.governor.overlapped, {'html': 1, 'audio': 1})
+        self.assertEqual(self.governor.estimate('audio'), 70)
+
+    def test_sample_updates_the_peak_of_running_work(self):
+        with patch('src.cli.governor.process_tree_rss', side_effect=[100, 180, 120]):
+            with self.governor.admit('audio'):
+                self.governor.sample()
+        self.assertEqual(self.governor.estimate('audio'), 80)
+
+    @patch('src.cli.governor.process_tree_rss', return_value=0)
+    def test_report(self, _):
+        task = governed_task(lambda index, row: row, self.governor, 'html')
+        self.assertEqual(task(0, 'row'), 'row')
+        self.assertEqual(task(1, 'row'), 'row')
+
+        report = self.governor.report()
+        self.assertEqual(report['budget_mb'], 100 / MEGABYTE)
+        self.assertEqual(list(report['stages']), ['html'])
+        self.assertEqual(report['stages']['html']['admitted'], 2)
+        self.assertEqual(report['stages']['html']['overlapped'], 0)
+        self.assertGreaterEqual(report['stages']['html']['max_wait'], 0)
+
+    def test_create_governor(self):
+        self.assertIsNone(create_governor({}))
+        self.assertIsNone(create_governor({'memory': {'enabled': False}}))
+
+        governor = create_governor({'memory': {'enabled': True, 'budget_mb': 1024, 'audio_mb': 300}})
+        try:
+            self.assertEqual(governor.budget, 1024 * MEGABYTE)
+            self.assertEqual(governor.estimate('audio'), 300 * MEGABYTE)
+            self.assertEqual(governor.estimate('video'), 800 * MEGABYTE)
+        finally:
+            governor.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
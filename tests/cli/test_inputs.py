@@ -8,6 +8,9 @@ from unittest.mock import patch
 import pandas as pd
 
 from src.cli import inputs  # Make sure to import your module correctly
+from src.reddit.comment_delta import compare_with_snapshot
+from src.reddit.comments import Comment, CommentCollection
+from src.reddit.dataset_manifest import DatasetManifest
 
 
 class TestInputs(unittest.TestCase):
@@ -53,31 +56,146 @@ class TestInputs(unittest.TestCase):
 
     @patch('builtins.input', side_effect=['https://reddit.com/post', '5', '1'])
     @patch('src.cli.inputs.fetch_subreddit')
-    @patch('pandas.read_csv')
-    def test_fetch_comments(self, mock_read_csv, mock_fetch_subreddit, mock_input):
+    @patch('src.cli.inputs.CommentCollection.from_csv')
+    def test_fetch_comments(self, mock_from_csv, mock_fetch_subreddit, mock_input):
         # Create test CSV files
         filenames = ['sample1.csv', 'sample2.csv']
         self.create_test_files(filenames)
 
-        with patch('src.cli.inputs.list_csv_files', return_value=filenames):
-            inputs.fetch_comments()
+        with patch('src.cli.inputs.SAMPLES_DIR', self.test_dir), \
+                patch('src.cli.inputs.list_dataset_files', return_value=filenames):
+            inputs.fetch_comments({'url': '', 'comments_qty': 0, 'default_name': False})
             mock_input.assert_any_call('Enter the Reddit post URL (required): ')
             mock_input.assert_any_call('Enter the number of top comments to fetch (required): ')
             mock_input.assert_any_call('Enter the number corresponding to the CSV file (1-2): ')
-            mock_fetch_subreddit.assert_called_once_with('https://reddit.com/post', 5)
-            mock_read_csv.assert_called_once_with(os.path.join('samples', 'sample1.csv'))  # Use os.path.join directly
+            mock_fetch_subreddit.assert_called_once_with('https://reddit.com/post', 5, False)
+            mock_from_csv.assert_called_once_with(os.path.join(self.test_dir, 'sample1.csv'), 5, None)
 
     @patch('builtins.input', side_effect=['https://reddit.com/post', '5'])
     @patch('src.cli.inputs.fetch_subreddit')
-    @patch('pandas.read_csv')
-    def test_fetch_comments_no_csv(self, mock_read_csv, mock_fetch_subreddit, mock_input):
-        with patch('src.cli.inputs.list_csv_files', return_value=[]):
-            result = inputs.fetch_comments()
+    @patch('src.cli.inputs.CommentCollection.from_csv')
+    def test_fetch_comments_no_csv(self, mock_from_csv, mock_fetch_subreddit, mock_input):
+        with patch('src.cli.inputs.SAMPLES_DIR', self.test_dir), \
+                patch('src.cli.inputs.list_dataset_files', return_value=[]):
+            result = inputs.fetch_comments({'url': '', 'comments_qty': 0, 'default_name': False})
             mock_input.assert_any_call('Enter the Reddit post URL (required): ')
             mock_input.assert_any_call('Enter the number of top comments to fetch (required): ')
-            mock_fetch_subreddit.assert_called_once_with('https://reddit.com/post', 5)
+            mock_fetch_subreddit.assert_called_once_with('https://reddit.com/post', 5, False)
             self.assertIsNone(result)
-            mock_read_csv.assert_not_called()
+            mock_from_csv.assert_not_called()
+
+    @patch('src.cli.inputs.fetch_subreddit')
+    @patch('src.cli.inputs.CommentCollection.from_csv')
+    def test_fetch_comments_default_name_uses_fetched_comments(self, mock_from_csv, mock_fetch_subreddit):
+        comments = CommentCollection([Comment('user', 1, 'text')])
+        mock_fetch_subreddit.return_value = comments
+
+        result = inputs.fetch_comments({'url': 'https://reddit.com/post', 'comments_qty': 5, 'default_name': True})
+
+        self.assertIs(result, comments)
+        mock_from_csv.assert_not_called()
+
+    @patch('src.cli.inputs.fetch_subreddit')
+    def test_fetch_comments_with_the_concurrent_fetcher(self, mock_fetch_subreddit):
+        inputs.fetch_comments({'url': 'https://reddit.com/post', 'comments_qty': 5, 'default_name': True,
+                               'fetcher': 'concurrent', 'base_url': 'http://127.0.0.1:8765', 'fetch_workers': 4})
+
+        mock_fetch_subreddit.assert_called_once_with('https://reddit.com/post', 5, True,
+                                                     base_url='http://127.0.0.1:8765', workers=4)
+
+    @patch('src.cli.inputs.fetch_subreddit')
+    def test_fetch_comments_with_the_submission_cache(self, mock_fetch_subreddit):
+        inputs.fetch_comments({'url': 'https://reddit.com/post', 'comments_qty': 5, 'default_name': True,
+                               'cache_file': 'reddit.sqlite', 'cache_ttl': 60})
+
+        mock_fetch_subreddit.assert_called_once_with('https://reddit.com/post', 5, True, cache_file='reddit.sqlite',
+                                                     cache_ttl=60)
+
+    @patch('src.cli.inputs.fetch_subreddit')
+    def test_fetch_comments_in_delta_mode(self, mock_fetch_subreddit):
+        comments = CommentCollection.from_records([{'author': 'a', 'votes': 1, 'comment': 'c', 'indent': 0}])
+        mock_fetch_subreddit.return_value = compare_with_snapshot({}, [{'id': 't1_a', **comments[0].to_dict()}])
+
+        result = inputs.fetch_comments({'url': 'https://reddit.com/post', 'comments_qty': 5, 'default_name': True,
+                                        'delta': True})
+
+        mock_fetch_subreddit.assert_called_once_with('https://reddit.com/post', 5, True,
+                                                     cache_file='.cache/reddit.sqlite', cache_ttl=0, delta=True)
+        self.assertEqual(list(result), list(comments))
+
+    @patch('src.cli.inputs.fetch_subreddit')
+    def test_fetch_comments_writes_a_columnar_dataset(self, mock_fetch_subreddit):
+        inputs.fetch_comments({'url': 'https://reddit.com/post', 'comments_qty': 5, 'default_name': True,
+                               'dataset_format': 'columns'})
+
+        mock_fetch_subreddit.assert_called_once_with('https://reddit.com/post', 5, True, dataset_format='columns')
+
+    @patch('builtins.input', side_effect=['2'])
+    @patch('src.cli.inputs.fetch_subreddit')
+    def test_fetch_comments_lists_recorded_datasets_by_fetch_time(self, mock_fetch_subreddit, mock_input):
+        manifest = DatasetManifest(self.test_dir)
+        for file_name, fetched_at in [('b.csv', 200), ('a.csv', 300)]:
+            file_path = os.path.join(self.test_dir, file_name)
+            offsets = CommentCollection([Comment(file_name, 1, 'text')]).to_csv(file_path)
+            manifest.record(file_path, 'https://reddit.com/post', 1, row_offsets=offsets, now=fetched_at)
+        self.create_test_files(['legacy.csv'])
+
+        with patch('src.cli.inputs.SAMPLES_DIR', self.test_dir):
+            comments = inputs.fetch_comments({'url': 'https://reddit.com/post', 'comments_qty': 5,
+                                              'default_name': False})
+
+        mock_input.assert_called_once_with('Enter the number corresponding to the CSV file (1-3): ')
+        self.assertEqual(comments[0].author, 'b.csv')
+
+    @patch('src.cli.inputs.stream_subreddit')
+    def test_stream_comments(self, mock_stream_subreddit):
+        fetched = [Comment(f'user{i}', 100 - i, 'text') for i in range(4)]
+        mock_stream_subreddit.return_value = iter(fetched)
+        comments_file = os.path.join(self.test_dir, 'comments.csv')
+        configuration = {'url': 'https://www.reddit.com/r/x/comments/abc/title/', 'comments_qty': 2,
+                         'fetcher': 'concurrent', 'dataset_format': 'columns'}
+
+        with patch('src.cli.inputs.SAMPLES_DIR', self.test_dir):
+            stream = inputs.stream_comments(configuration, comments_file)
+            self.assertEqual(next(stream), fetched[0])
+            self.assertEqual(list(stream), fetched[1:2])
+
+        mock_stream_subreddit.assert_called_once_with(
+            configuration['url'], 2, os.path.join(self.test_dir, 'title.cols'), base_url='https://oauth.reddit.com',
+            workers=8)
+        self.assertEqual(list(CommentCollection.from_csv(comments_file)), fetched[:2])
+        self.assertTrue(inputs.comments_complete({'streaming': True}, comments_file))
+
+    @patch('src.cli.inputs.stream_subreddit')
+    def test_stream_comments_writes_every_comment_before_yielding_it(self, mock_stream_subreddit):
+        fetched = [Comment(f'user{i}', 100 - i, 'text') for i in range(4)]
+        mock_stream_subreddit.return_value = iter(fetched)
+        comments_file = os.path.join(self.test_dir, 'comments.csv')
+        configuration = {'url': 'https://www.reddit.com/r/x/comments/abc/title/', 'comments_qty': 4,
+                         'streaming': True}
+
+        with patch('src.cli.inputs.SAMPLES_DIR', self.test_dir):
+            stream = inputs.stream_comments(configuration, comments_file)
+            next(stream)
+            next(stream)
+            self.assertEqual(list(CommentCollection.from_csv(comments_file)), fetched[:2])
+            # The run is interrupted
+            stream.close()
+
+        self.assertEqual(list(CommentCollection.from_csv(comments_file)), fetched[:2])
+        self.assertFalse(inputs.comments_complete(configuration, comments_file))
+        # The comments of a run that does not stream are written at once
+        self.assertTrue(inputs.comments_complete({'streaming': False}, comments_file))
+        self.assertFalse(inputs.comments_complete(configuration, os.path.join(self.test_dir, 'missing.csv')))
+
+    def test_stream_comments_in_delta_mode(self):
+        with self.assertRaises(ValueError):
+            next(inputs.stream_comments({'url': 'https://reddit.com/post', 'comments_qty': 2, 'delta': True},
+                                        os.path.join(self.test_dir, 'comments.csv')))
+
+    def test_list_dataset_files(self):
+        self.create_test_files(['b.csv', 'a.cols', 'notes.txt'])
+        self.assertEqual(inputs.list_dataset_files(self.test_dir), ['a.cols', 'b.csv'])
 
     @patch('os.path.exists')
     @patch('src.cli.inputs.combine_video_audio')
@@ -135,7 +253,8 @@ class TestInputs(unittest.TestCase):
 
         inputs.generate_audio_files(data, tts_library, output_dir)
 
-        mock_generate_audio_gtts.assert_called_once_with('test comment', 'en', 'test_dir/comment_0.mp3')
+        mock_generate_audio_gtts.assert_called_once_with('test comment', 'test_dir/comment_0.mp3', 'en',
+                                                         gtts_client=None, phrase_cache=None)
 
     @patch('src.cli.inputs.generate_audio_mozilla_tts')
     def test_generate_audio_files_mozilla_tts(self, mock_generate_audio_mozilla_tts):
@@ -145,7 +264,28 @@ class TestInputs(unittest.TestCase):
 
         inputs.generate_audio_files(data, tts_library, output_dir)
 
-        mock_generate_audio_mozilla_tts.assert_called_once_with('test comment', 'test_dir/comment_0.mp3')
+        mock_generate_audio_mozilla_tts.assert_called_once_with('test comment', 'test_dir/comment_0.mp3',
+                                                                'tts_models/en/ljspeech/tacotron2-DDC',
+                                                                tts_server=None, phrase_cache=None, noise_reducer=None)
+
+    @patch('src.cli.inputs.generate_audio_mozilla_tts')
+    def test_generate_audio_task_with_the_configured_model(self, mock_generate_audio_mozilla_tts):
+        inputs.generate_audio_task(0, {'comment': 'test comment'}, 'tts', 'test_dir',
+                                   model_name='tts_models/en/vctk/vits')
+
+        mock_generate_audio_mozilla_tts.assert_called_once_with('test comment', 'test_dir/comment_0.mp3',
+                                                                'tts_models/en/vctk/vits', tts_server=None,
+                                                                phrase_cache=None, noise_reducer=None)
+
+    @patch('src.cli.inputs.generate_audio_mozilla_tts')
+    def test_generate_audio_files_with_a_tts_server(self, mock_generate_audio_mozilla_tts):
+        server = object()
+        inputs.generate_audio_files(pd.DataFrame({'comment': ['test comment']}), 'tts', 'test_dir', server)
+
+        mock_generate_audio_mozilla_tts.assert_called_once_with('test comment', 'test_dir/comment_0.mp3',
+                                                                'tts_models/en/ljspeech/tacotron2-DDC',
+                                                                tts_server=server, phrase_cache=None,
+                                                                noise_reducer=None)
 
     @patch('src.cli.inputs.record_mp4_task')
     def test_record_videos_with_valid_data(self, mock):
@@ -176,48 +316,37 @@ class TestInputs(unittest.TestCase):
             os.chdir(output_dir)
             inputs.record_videos(data, version, output_dir)
 
-    @patch('builtins.input', return_value='yes')
-    @patch('pandas.read_csv')
-    def test_get_comments_default(self, mock_read_csv, mock_input):
-        mock_read_csv.return_value = pd.DataFrame({"A": [1, 2, 3, 4]}, columns=["A"])
-        result = inputs.get_comments()
-
-        if isinstance(result, tuple):  # check if result is a tuple
-            result = result[0]  # unpack DataFrame from tuple
+    @patch('src.cli.inputs.CommentCollection.from_csv')
+    def test_get_comments_default(self, mock_from_csv):
+        comments = CommentCollection([Comment('user', 1, 'text')])
+        mock_from_csv.return_value = comments
+        result, use_default = inputs.get_comments({'data_source': {'samples': True, 'comments_qty': 4}})
 
         # Verify correct function calls were made
-        mock_input.assert_called_once_with('Use default comment? (yes/no): ')
-        mock_read_csv.assert_called_once_with('samples/comments.csv')
+        mock_from_csv.assert_called_once_with('samples/comments.csv', 4)
 
         # Verify the results
-        pd.testing.assert_frame_equal(result, pd.DataFrame({"A": [1, 2, 3, 4]}, columns=["A"]))
+        self.assertTrue(use_default)
+        self.assertIs(result, comments)
 
-    @patch('builtins.input', return_value='no')
     @patch('src.cli.inputs.fetch_comments')
-    def test_get_comments_non_default(self, mock_fetch_comments, mock_input):
-        mock_fetch_comments.return_value = pd.DataFrame({"B": [5, 6, 7, 8]}, columns=["B"])
-        result = inputs.get_comments()
-
-        if isinstance(result, tuple):  # check if result is a tuple
-            result = result[0]  # unpack DataFrame from tuple
+    def test_get_comments_non_default(self, mock_fetch_comments):
+        comments = CommentCollection([Comment('user', 1, 'text')])
+        mock_fetch_comments.return_value = comments
+        result, use_default = inputs.get_comments({'data_source': {'samples': False}})
 
         # Verify correct function calls were made
-        mock_input.assert_called_once_with('Use default comment? (yes/no): ')
-        mock_fetch_comments.assert_called_once()
+        mock_fetch_comments.assert_called_once_with({'samples': False})
 
         # Verify the results
-        pd.testing.assert_frame_equal(result, pd.DataFrame({"B": [5, 6, 7, 8]}, columns=["B"]))
+        self.assertFalse(use_default)
+        self.assertIs(result, comments)
 
-    @patch('builtins.input', return_value='no')
     @patch('src.cli.inputs.fetch_comments', return_value=None)
-    def test_get_comments_none(self, mock_fetch_comments, mock_input):
-        result = inputs.get_comments()
-
-        if isinstance(result, tuple):  # check if result is a tuple
-            result = result[0]  # unpack DataFrame from tuple
+    def test_get_comments_none(self, mock_fetch_comments):
+        result, use_default = inputs.get_comments({'data_source': {'samples': False}})
 
         # Verify correct function calls were made
-        mock_input.assert_called_once_with('Use default comment? (yes/no): ')
         mock_fetch_comments.assert_called_once()
 
         # Verify results
@@ -272,6 +401,12 @@ class TestInputs(unittest.TestCase):
         result = inputs.create_output_directory()
         self.assertTrue(result.startswith(self.default_output_directory))
 
+    def test_create_output_directory_is_unique(self):
+        first = inputs.create_output_directory()
+        second = inputs.create_output_directory()
+        self.assertNotEqual(first, second)
+        self.assertTrue(os.path.isdir(second))
+
     def test_create_output_directory_has_correct_timestamp_format(self):
         result = inputs.create_output_directory()
         timestamp_str = result.replace(self.default_output_directory, "")
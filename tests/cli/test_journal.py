@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from src.cli import journal
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def artifact(self, index, suffix='.html'):
+        return os.path.join(self.output_dir, f'comment_{index}{suffix}')
+
+    def write_artifact(self, index, suffix='.html', content='content'):
+        with open(self.artifact(index, suffix), 'w') as f:
+            f.write(content)
+
+    def test_record_and_read_journal(self):
+        journal.record_stage(self.output_dir, 0, 'audio', self.artifact(0, '.mp3'))
+        journal.record_stage(self.output_dir, 0, 'mp4', self.artifact(0, '.mp4'))
+
+        completed = journal.read_journal(self.output_dir)
+
+        self.assertEqual(completed, {(0, 'audio'): self.artifact(0, '.mp3'), (0, 'mp4'): self.artifact(0, '.mp4')})
+
+    def test_read_journal_ignores_truncated_line(self):
+        journal.record_stage(self.output_dir, 0, 'audio', self.artifact(0, '.mp3'))
+        with open(os.path.join(self.output_dir, journal.JOURNAL_FILE), 'a') as f:
+            f.write('{"index": 1, "sta')
+
+        self.assertEqual(list(journal.read_journal(self.output_dir)), [(0, 'audio')])
+
+    def test_read_journal_without_journal(self):
+        self.assertEqual(journal.read_journal(self.output_dir), {})
+
+    def test_is_artifact_valid_missing_or_empty(self):
+        self.assertFalse(journal.is_artifact_valid(self.artifact(0)))
+        self.write_artifact(0, content='')
+        self.assertFalse(journal.is_artifact_valid(self.artifact(0)))
+
+    @patch('src.cli.journal.probe_duration')
+    def test_is_artifact_valid_probes_media(self, mock_probe_duration):
+        self.write_artifact(0, '.mp3')
+
+        mock_probe_duration.return_value = None
+        self.assertFalse(journal.is_artifact_valid(self.artifact(0, '.mp3')))
+
+        mock_probe_duration.return_value = 3.5
+        self.assertTrue(journal.is_artifact_valid(self.artifact(0, '.mp3')))
+
+    def test_journaled_task_records_completed_stage(self):
+        func = Mock(side_effect=lambda index, row: self.write_artifact(index))
+        task = journal.journaled_task(func, self.output_dir, 'html', self.artifact)
+
+        task(0, None)
+
+        func.assert_called_once_with(0, None)
+        self.assertEqual(journal.read_journal(self.output_dir), {(0, 'html'): self.artifact(0)})
+
+    def test_journaled_task_does_not_record_missing_artifact(self):
+        task = journal.journaled_task(Mock(), self.output_dir, 'html', self.artifact)
+
+        task(0, None)
+
+        self.assertEqual(journal.read_journal(self.output_dir), {})
+
+    def test_journaled_task_resumes(self):
+        self.write_artifact(0)
+        self.write_artifact(1, content='partial')
+        completed = {(0, 'html'): self.artifact(0), (1, 'mp4'): self.artifact(1, '.mp4')}
+        func = Mock(side_effect=lambda index, row: self.write_artifact(index, content='rebuilt'))
+        task = journal.journaled_task(func, self.output_dir, 'html', self.artifact, completed, downstream=('mp4',))
+
+        task(0, None)
+        task(1, None)
+
+        # Only the comment without a journaled stage is rebuilt, from scratch, and its downstream stages follow
+        func.assert_called_once_with(1, None)
+        with open(self.artifact(1)) as f:
+            self.assertEqual(f.read(), 'rebuilt')
+        self.assertNotIn((1, 'mp4'), completed)
+
+    def test_journaled_task_redoes_stages_of_another_comment(self):
+        func = Mock(side_effect=lambda index, row: self.write_artifact(index))
+        task = journal.journaled_task(func, self.output_dir, 'html', self.artifact)
+        task(0, {'author': 'a', 'comment': 'first'})
+        task(1, {'author': 'b', 'comment': 'second'})
+        completed = journal.read_journal(self.output_dir)
+        self.assertEqual(len(completed.rows), 2)
+
+        # The post was ranked differently when it was fetched again, the second comment moved to the first index
+        func.reset_mock()
+        task = journal.journaled_task(func, self.output_dir, 'html', self.artifact, completed)
+        task(0, {'author': 'b', 'comment': 'second'})
+        task(1, {'author': 'b', 'comment': 'second'})
+
+        func.assert_called_once_with(0, {'author': 'b', 'comment': 'second'})
+
+
+if __name__ == '__main__':
+    unittest.main()
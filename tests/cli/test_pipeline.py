@@ -0,0 +1,145 @@
+import threading
+import time
+import unittest
+
+from src.cli.pipeline import PipelineError, Stage, run_pipeline, limited_task, raise_for_errors
+
+
+class TestPipeline(unittest.TestCase):
+    def test_run_pipeline_runs_every_stage_in_order(self):
+        calls = []
+        lock = threading.Lock()
+
+        def make_stage(name):
+            def func(index, row):
+                with lock:
+                    calls.append((name, index, row))
+            return func
+
+        stages = [Stage('audio', make_stage('audio'), 2), Stage('video', make_stage('video'), 1)]
+        errors = run_pipeline([(0, 'a'), (1, 'b'), (2, 'c')], stages)
+
+        self.assertEqual(errors, {})
+        self.assertEqual(len(calls), 6)
+        for index, row in [(0, 'a'), (1, 'b'), (2, 'c')]:
+            self.assertLess(calls.index(('audio', index, row)), calls.index(('video', index, row)))
+
+    def test_run_pipeline_overlaps_stages(self):
+        second_stage_started = threading.Event()
+
+        def first(index, row):
+            # The last comment only finishes its first stage after an earlier one reached the second stage
+            if index == 2:
+                self.assertTrue(second_stage_started.wait(5))
+
+        def second(index, row):
+            second_stage_started.set()
+
+        errors = run_pipeline([(0, None), (1, None), (2, None)], [Stage('first', first, 2), Stage('second', second, 1)])
+        self.assertEqual(errors, {})
+
+    def test_run_pipeline_respects_stage_concurrency(self):
+        active = [0]
+        peak = [0]
+        lock = threading.Lock()
+
+        def func(index, row):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+
+        run_pipeline([(i, None) for i in range(8)], [Stage('limited', func, 2)])
+        self.assertLessEqual(peak[0], 2)
+
+    def test_run_pipeline_skips_remaining_stages_on_failure(self):
+        later_calls = []
+
+        def failing(index, row):
+            if index == 1:
+                raise ValueError('boom')
+
+        stages = [Stage('audio', failing, 1), Stage('video', lambda index, row: later_calls.append(index), 1)]
+        errors = run_pipeline([(0, None), (1, None), (2, None)], stages)
+
+        self.assertEqual(list(errors), [1])
+        self.assertEqual(errors[1][0], 'audio')
+        self.assertIsInstance(errors[1][1], ValueError)
+        self.assertEqual(sorted(later_calls), [0, 2])
+
+    def test_raise_for_errors(self):
+        raise_for_errors({})
+        with self.assertRaises(PipelineError) as context:
+            raise_for_errors({2: ('audio', ValueError('boom'))})
+        self.assertEqual(list(context.exception.errors), [2])
+        self.assertIn("comment 2 in stage 'audio': boom", str(context.exception))
+
+    def test_run_pipeline_with_no_items(self):
+        self.assertEqual(run_pipeline([], [Stage('audio', lambda index, row: None, 1)]), {})
+
+    def test_run_pipeline_with_no_stages(self):
+        self.assertEqual(run_pipeline([(0, None)], []), {})
+
+    def test_run_pipeline_starts_before_the_items_are_all_produced(self):
+        first_done = threading.Event()
+        processed = []
+
+        def items():
+            yield 0, 'a'
+            # The first item goes through every stage while the generator waits for more comments
+            self.assertTrue(first_done.wait(5))
+            yield 1, 'b'
+
+        def last(index, row):
+            processed.append(row)
+            first_done.set()
+
+        errors = run_pipeline(items(), [Stage('audio', lambda index, row: None, 1), Stage('video', last, 1)])
+        self.assertEqual(errors, {})
+        self.assertEqual(processed, ['a', 'b'])
+
+    def test_run_pipeline_raises_errors_of_the_items(self):
+        processed = []
+
+        def items():
+            yield 0, 'a'
+            raise ConnectionError('fetch failed')
+
+        with self.assertRaises(ConnectionError):
+            run_pipeline(items(), [Stage('audio', lambda index, row: processed.append(row), 1)])
+        self.assertEqual(processed, ['a'])
+
+    def test_run_pipeline_with_no_stages_consumes_the_items(self):
+        consumed = []
+        run_pipeline((consumed.append(index) or (index, None) for index in range(3)), [])
+        self.assertEqual(consumed, [0, 1, 2])
+
+    def test_limited_task_shares_slots_between_stages(self):
+        slots = threading.BoundedSemaphore(1)
+        active = [0]
+        peak = [0]
+        lock = threading.Lock()
+
+        def func(index, row):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+
+        # Two runs with their own worker pools still only use the single shared slot
+        runs = [threading.Thread(target=run_pipeline,
+                                 args=([(i, None) for i in range(4)], [Stage('limited', limited_task(func, slots), 4)]))
+                for _ in range(2)]
+        for run in runs:
+            run.start()
+        for run in runs:
+            run.join()
+        self.assertEqual(peak[0], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import pickle
+import sys
+import unittest
+from unittest.mock import patch
+
+from src.cli.stages import (ENGINES, STAGES, LazyFunction, lazy_function, enabled_stages, load_engines, load_stage,
+                            resolve_function)
+
+
+def make_configuration(html=True, audio=True, video=True, combining=True):
+    return {
+        'html_generation': {'enabled': html},
+        'audio_generation': {'enabled': audio},
+        'video_generation': {'enabled': video},
+        'combining': {'enabled': combining},
+    }
+
+
+class TestLazyFunction(unittest.TestCase):
+    def test_lazy_function_imports_on_first_call(self):
+        sys.modules.pop('colorsys', None)
+        function = lazy_function('colorsys', 'rgb_to_hsv')
+
+        self.assertNotIn('colorsys', sys.modules)
+        self.assertEqual(function(0, 0, 0), (0.0, 0.0, 0.0))
+        self.assertIn('colorsys', sys.modules)
+
+    def test_lazy_function_can_be_patched(self):
+        with patch('src.cli.inputs.generate_audio_gtts') as mock_generate:
+            from src.cli.inputs import generate_audio_task
+            generate_audio_task(0, {'comment': 'Hello'}, 'gtts', 'output')
+
+        mock_generate.assert_called_once_with('Hello', 'output/comment_0.mp3', 'en', gtts_client=None,
+                                              phrase_cache=None)
+
+    def test_lazy_function_pickles_to_the_real_function(self):
+        function = pickle.loads(pickle.dumps(lazy_function('os.path', 'join')))
+        self.assertIs(function, resolve_function('os.path', 'join'))
+
+    def test_lazy_function_repr(self):
+        self.assertEqual(repr(LazyFunction('os.path', 'join')), 'LazyFunction(os.path.join)')
+
+
+class TestStages(unittest.TestCase):
+    def test_enabled_stages_all(self):
+        self.assertEqual(enabled_stages(make_configuration()), ['audio', 'video', 'combining'])
+
+    def test_enabled_stages_html_only(self):
+        configuration = make_configuration(audio=False, video=False, combining=False)
+        self.assertEqual(enabled_stages(configuration), ['html'])
+
+    def test_enabled_stages_video_needs_html(self):
+        configuration = make_configuration(html=False, combining=False)
+        self.assertEqual(enabled_stages(configuration), ['audio'])
+
+    def test_enabled_stages_combining_needs_audio_and_video(self):
+        configuration = make_configuration(audio=False)
+        self.assertEqual(enabled_stages(configuration), ['video'])
+
+    def test_load_stage(self):
+        from src.cli.inputs import generate_html_task
+        self.assertIs(load_stage('html'), generate_html_task)
+
+    def test_load_stage_unknown(self):
+        with self.assertRaises(KeyError):
+            load_stage('upload')
+
+    def test_every_stage_has_engines(self):
+        self.assertEqual(set(ENGINES), set(STAGES))
+
+    def test_load_engines(self):
+        modules = load_engines('video')
+        self.assertEqual([module.__name__ for module in modules], ['src.video.record_html'])
+        self.assertIn('src.video.record_html', sys.modules)
+        self.assertEqual(load_engines('html'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,7 @@
 import json
+import multiprocessing
 import os
+import tempfile
 import time
 import unittest
 from unittest.mock import mock_open, patch
@@ -7,7 +9,7 @@ from unittest.mock import mock_open, patch
 import pandas as pd
 
 from src.html import generate_html
-from src.html.generate_html import render_html, generate_html as generate_html_function
+from src.html.generate_html import append_metadata, render_html, generate_html as generate_html_function
 
 
 class TestGenerateHtml(unittest.TestCase):
@@ -50,8 +52,9 @@ class TestGenerateHtml(unittest.TestCase):
 
         if os.path.exists(self.test_output_file):
             os.remove(self.test_output_file)
-        if os.path.exists('html_metadata.json'):
-            os.remove('html_metadata.json')
+        for metadata_file in ('html_metadata.json', 'html_metadata.json.lock'):
+            if os.path.exists(metadata_file):
+                os.remove(metadata_file)
 
     def test_render_html(self):
         html, gen_time = render_html(self.row, self.template_content, self.css_content, self.js_content)
@@ -178,6 +181,17 @@ class TestGenerateHtml(unittest.TestCase):
         self.assertEqual(len(metadata), 1)
         self.assertEqual(metadata[0]["version"], 'v1')
 
+    def test_append_metadata_from_concurrent_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            metadata_file = os.path.join(directory, 'html_metadata.json')
+            context = multiprocessing.get_context('fork')
+            with context.Pool(4) as pool:
+                pool.starmap(append_metadata, [(metadata_file, {'index': index}) for index in range(40)])
+
+            with open(metadata_file) as f:
+                metadata = json.load(f)
+        self.assertEqual(sorted(item['index'] for item in metadata), list(range(40)))
+
     def test_generate_html_with_invalid_data_type_for_row(self):
         with self.assertRaises(TypeError):
             generate_html_function("invalid_data_type_for_row", self.test_output_file, 'v1')
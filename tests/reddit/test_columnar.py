@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.reddit.columnar import read_columns, write_columns
+
+
+class TestColumnar(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.test_dir, 'dataset.cols')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_round_trip(self):
+        columns = {'votes': [100, -3, 0], 'comment': ['first\nline, "quoted"', 'ünïcödé 🎉', '']}
+        write_columns(self.file_path, columns)
+        self.assertEqual(read_columns(self.file_path), (columns, 3))
+
+    def test_limit_and_projection(self):
+        write_columns(self.file_path, {'votes': [1, 2, 3], 'comment': ['a', 'bb', 'ccc'], 'author': ['x', 'y', 'z']})
+
+        self.assertEqual(read_columns(self.file_path, limit=2, columns=['comment', 'missing']),
+                         ({'comment': ['a', 'bb']}, 2))
+        self.assertEqual(read_columns(self.file_path, limit=10, columns=['votes']), ({'votes': [1, 2, 3]}, 3))
+        self.assertEqual(read_columns(self.file_path, limit=0), ({'votes': [], 'comment': [], 'author': []}, 0))
+
+    def test_empty_dataset(self):
+        write_columns(self.file_path, {'comment': []})
+        self.assertEqual(read_columns(self.file_path), ({'comment': []}, 0))
+
+    def test_columns_of_different_lengths(self):
+        with self.assertRaises(ValueError):
+            write_columns(self.file_path, {'votes': [1, 2], 'comment': ['a']})
+
+    def test_not_a_dataset(self):
+        with open(self.file_path, 'wb') as file:
+            file.write(b'author,votes,comment,indent\n')
+        with self.assertRaises(ValueError):
+            read_columns(self.file_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+from src.reddit.comment_delta import compare_with_snapshot
+from src.reddit.comments import Comment
+
+
+def record(comment_id, votes, indent=0, comment=None):
+    return {'id': comment_id, 'author': f'author_{comment_id}', 'votes': votes,
+            'comment': comment or f'comment {comment_id}', 'indent': indent}
+
+
+def snapshot(records):
+    return {(item['id'], item['indent']): (rank, item) for rank, item in enumerate(records)}
+
+
+class TestCommentDelta(unittest.TestCase):
+    def test_first_fetch_is_all_new(self):
+        records = [record('a', 50), record('b', 40, 1)]
+        delta = compare_with_snapshot({}, records)
+
+        self.assertEqual([rank for rank, _ in delta.new], [0, 1])
+        self.assertEqual(delta.changed, [])
+        self.assertEqual(len(delta.comments), 2)
+
+    def test_new_changed_moved_and_removed_comments(self):
+        previous = snapshot([record('a', 50), record('b', 40, 1), record('c', 35), record('d', 31)])
+        records = [record('e', 90), record('a', 55), record('b', 40, 1), record('c', 35, comment='edited')]
+        delta = compare_with_snapshot(previous, records)
+
+        self.assertEqual(delta.new, [(0, Comment.from_dict(records[0]))])
+        self.assertEqual(delta.changed, [(1, Comment.from_dict(records[1])), (3, Comment.from_dict(records[3]))])
+        self.assertEqual(delta.moved, [(1, 2)])
+        self.assertEqual(delta.removed, [('d', 0)])
+        self.assertEqual([rank for rank, _ in delta.updated], [0, 1, 3])
+
+    def test_a_reply_rendered_twice_is_compared_at_each_indent(self):
+        records = [record('a', 50), record('b', 45, 1), record('b', 45)]
+        delta = compare_with_snapshot(snapshot(records[:2]), records)
+
+        self.assertEqual([rank for rank, _ in delta.new], [2])
+        self.assertEqual(delta.changed, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
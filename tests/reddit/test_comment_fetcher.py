@@ -0,0 +1,143 @@
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from src.reddit.comment_fetcher import AdaptiveRateLimiter, CommentFetcher, FetchedComment, Replies, all_comments, \
+    ServerError, get_top_comments_concurrently, parse_post_url
+from src.reddit.fake_reddit import FakeReddit, synthetic_thread
+
+
+def fast_limiter():
+    return AdaptiveRateLimiter(rate=1000, max_rate=1000)
+
+
+class TestCommentFetcher(unittest.TestCase):
+    def assert_same_tree(self, fake_reddit, top_level):
+        comments = all_comments(top_level)
+        self.assertEqual(sorted(comment.id for comment in comments),
+                         sorted(f't1_{comment_id}' for comment_id in fake_reddit.comments))
+        for comment in comments:
+            expected = fake_reddit.comments[comment.id[3:]]
+            self.assertEqual([reply.id[3:] for reply in comment.replies], expected['replies'])
+            self.assertEqual(comment.score, expected['score'])
+            self.assertEqual(comment.body, expected['body'])
+
+    def test_fetch_comments_expands_every_stub(self):
+        # Small pages put most of the thread behind "load more comments" and "continue this thread" stubs
+        with FakeReddit(synthetic_thread(500), page_size=3, max_depth=2, top_level_page=10) as fake_reddit:
+            fetcher = CommentFetcher(fake_reddit.base_url, workers=4, rate_limiter=fast_limiter())
+            top_level = fetcher.fetch_comments(fake_reddit.post_url)
+
+        self.assert_same_tree(fake_reddit, top_level)
+        self.assertGreater(fetcher.request_count, 1)
+
+    def test_fetch_comments_with_one_worker(self):
+        with FakeReddit(synthetic_thread(100), page_size=2, max_depth=2, top_level_page=5) as fake_reddit:
+            fetcher = CommentFetcher(fake_reddit.base_url, workers=1, rate_limiter=fast_limiter())
+            self.assert_same_tree(fake_reddit, fetcher.fetch_comments(fake_reddit.post_url))
+
+    def test_fetch_comments_follows_the_rate_limit(self):
+        with FakeReddit(synthetic_thread(100), page_size=2, max_depth=2, top_level_page=5,
+                        rate_limit=20) as fake_reddit:
+            fetcher = CommentFetcher(fake_reddit.base_url, workers=4,
+                                     rate_limiter=AdaptiveRateLimiter(rate=100, max_rate=100), max_retries=20)
+            self.assert_same_tree(fake_reddit, fetcher.fetch_comments(fake_reddit.post_url))
+
+        # The rate limit headers slow the fetcher down before requests are refused
+        self.assertLessEqual(fetcher.rate_limiter.rate, 20)
+
+    def test_fetch_comments_retries_refused_requests(self):
+        with FakeReddit(synthetic_thread(30), page_size=2, max_depth=2, top_level_page=5,
+                        rate_limit=3) as fake_reddit:
+            fetcher = CommentFetcher(fake_reddit.base_url, workers=4,
+                                     rate_limiter=AdaptiveRateLimiter(rate=100, min_rate=5, max_rate=100),
+                                     max_retries=50)
+            # Without the rate limit headers, only refused requests slow the fetcher down
+            with patch('src.reddit.comment_fetcher.to_float', return_value=None):
+                self.assert_same_tree(fake_reddit, fetcher.fetch_comments(fake_reddit.post_url))
+
+        self.assertGreater(fake_reddit.refused_count, 0)
+
+    def test_server_errors_raise_after_every_retry(self):
+        fetcher = CommentFetcher('http://localhost', rate_limiter=fast_limiter(), max_retries=2)
+        fetcher.session.get = Mock(return_value=Mock(status_code=503, headers={}))
+        with self.assertRaises(ServerError):
+            fetcher.get('/comments/fake01.json')
+        self.assertEqual(fetcher.session.get.call_count, 3)
+        # Every server error slowed the fetcher down
+        self.assertEqual(fetcher.rate_limiter.rate, 125)
+
+    def test_fetch_comments_requests_a_token(self):
+        with FakeReddit(synthetic_thread(10)) as fake_reddit:
+            fetcher = CommentFetcher(fake_reddit.base_url, client_id='id', client_secret='secret',
+                                     rate_limiter=fast_limiter())
+            self.assertEqual(fetcher.session.headers['Authorization'], 'bearer fake-token')
+            self.assertEqual(len(all_comments(fetcher.fetch_comments(fake_reddit.post_url))), 10)
+
+    @patch.dict('os.environ', {}, clear=True)
+    def test_get_top_comments_concurrently(self):
+        with FakeReddit(synthetic_thread(300)) as fake_reddit:
+            top_comments = get_top_comments_concurrently(fake_reddit.post_url, 5, fake_reddit.base_url, workers=4)
+
+        expected = sorted((comment['score'] for comment in fake_reddit.comments.values()), reverse=True)[:5]
+        self.assertEqual([comment.score for comment in top_comments], expected)
+
+    def test_replies_list_is_breadth_first(self):
+        root = FetchedComment('t1_a', 't3_p', 'a', 1, 'a')
+        child = FetchedComment('t1_b', 't1_a', 'b', 1, 'b')
+        grandchild = FetchedComment('t1_c', 't1_b', 'c', 1, 'c')
+        sibling = FetchedComment('t1_d', 't1_a', 'd', 1, 'd')
+        child.replies.append(grandchild)
+        root.replies.extend([child, sibling])
+
+        self.assertEqual(root.replies.list(), [child, sibling, grandchild])
+        self.assertEqual(Replies([root]).list(), [root, child, sibling, grandchild])
+
+    def test_parse_post_url(self):
+        self.assertEqual(parse_post_url('https://www.reddit.com/r/AskReddit/comments/1ejq3hs/snap_your_fingers/'),
+                         '1ejq3hs')
+        self.assertEqual(parse_post_url('https://redd.it/1ejq3hs'), '1ejq3hs')
+        with self.assertRaises(ValueError):
+            parse_post_url('https://www.reddit.com/r/AskReddit/')
+
+
+class TestAdaptiveRateLimiter(unittest.TestCase):
+    def test_refused_requests_halve_the_rate(self):
+        limiter = AdaptiveRateLimiter(rate=10)
+        limiter.update(429, {'Retry-After': '2'})
+        self.assertEqual(limiter.rate, 5)
+        self.assertGreater(limiter.next_time, time.monotonic() + 1)
+
+    def test_server_errors_halve_the_rate(self):
+        limiter = AdaptiveRateLimiter(rate=10)
+        limiter.update(503, {'Retry-After': '2'})
+        self.assertEqual(limiter.rate, 5)
+        self.assertGreater(limiter.next_time, time.monotonic() + 1)
+
+    def test_accepted_requests_grow_the_rate(self):
+        limiter = AdaptiveRateLimiter(rate=10, increase=1, max_rate=11.5)
+        limiter.update(200, {})
+        self.assertEqual(limiter.rate, 11)
+        limiter.update(200, {})
+        self.assertEqual(limiter.rate, 11.5)
+
+    def test_rate_limit_headers_cap_the_rate(self):
+        limiter = AdaptiveRateLimiter(rate=50)
+        limiter.update(200, {'X-Ratelimit-Remaining': '60', 'X-Ratelimit-Reset': '30'})
+        self.assertEqual(limiter.rate, 2)
+
+    def test_exhausted_rate_limit_waits_for_the_reset(self):
+        limiter = AdaptiveRateLimiter(rate=50)
+        limiter.update(200, {'X-Ratelimit-Remaining': '0', 'X-Ratelimit-Reset': '5'})
+        self.assertGreater(limiter.next_time, time.monotonic() + 4)
+
+    def test_acquire_spaces_requests(self):
+        limiter = AdaptiveRateLimiter(rate=20)
+        start = time.monotonic()
+        for _ in range(4):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.14)
+
+
+if __name__ == '__main__':
+    unittest.main()
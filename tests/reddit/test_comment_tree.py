@@ -0,0 +1,43 @@
+import unittest
+
+from src.reddit.comment_fetcher import FetchedComment, all_comments, iter_comments
+from src.reddit.comment_tree import select_top_comments, walk_comment_tree
+
+
+def comment(name, score, replies=()):
+    fetched = FetchedComment(f't1_{name}', None, name, score, name)
+    fetched.replies.extend(replies)
+    return fetched
+
+
+class MoreCommentsStub:
+    """A "load more comments" stub, without a score like praw's MoreComments."""
+    replies = []
+
+
+class TestCommentTree(unittest.TestCase):
+    def test_select_top_comments_matches_a_sort(self):
+        comments = [comment(str(i), score) for i, score in enumerate([5, 40, 5, 12, 40, 1, 12, 99])]
+        expected = sorted(comments, key=lambda item: item.score, reverse=True)[:4]
+        self.assertEqual(select_top_comments(iter(comments), 4), expected)
+
+    def test_select_top_comments_with_fewer_comments_than_the_limit(self):
+        comments = [comment('a', 1), comment('b', 2)]
+        self.assertEqual(select_top_comments(comments, 30), [comments[1], comments[0]])
+
+    def test_walk_comment_tree_is_depth_first(self):
+        tree = comment('a', 50, [comment('b', 40, [comment('c', 35)]), comment('d', 45)])
+        self.assertEqual([(item.author, level) for item, level in walk_comment_tree(tree, indent=2)],
+                         [('a', 2), ('b', 3), ('c', 4), ('d', 3)])
+
+    def test_walk_comment_tree_skips_stubs(self):
+        tree = comment('a', 50, [MoreCommentsStub(), comment('b', 40)])
+        self.assertEqual([item.author for item, _ in walk_comment_tree(tree)], ['a', 'b'])
+
+    def test_iter_comments_is_breadth_first(self):
+        top_level = [comment('a', 1, [comment('b', 1, [comment('c', 1)])]), comment('d', 1)]
+        self.assertEqual(list(iter_comments(top_level)), all_comments(top_level))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from src.reddit.comments import Comment, CommentCollection
+
+
+class TestComments(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.csv_file = os.path.join(self.test_dir, 'comments.csv')
+        with open(self.csv_file, 'w', newline='') as f:
+            f.write('author,votes,comment,indent\n')
+            f.write('user1,100,"first\nline",0\n')
+            f.write('user2,35,second,1\n')
+            f.write('user3,,third,\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_comment_row_access(self):
+        comment = Comment('user1', 10, 'hello', 2)
+        self.assertEqual(comment['comment'], 'hello')
+        self.assertEqual(comment.get('author'), 'user1')
+        self.assertEqual(comment.get('missing', 'default'), 'default')
+        self.assertEqual(comment.to_dict(), {'author': 'user1', 'votes': 10, 'comment': 'hello', 'indent': 2})
+        with self.assertRaises(KeyError):
+            comment['missing']
+
+    def test_comment_has_no_instance_dict(self):
+        self.assertFalse(hasattr(Comment('user1', 10, 'hello'), '__dict__'))
+
+    def test_comment_is_picklable(self):
+        comment = Comment('user1', 10, 'hello', 2)
+        self.assertEqual(pickle.loads(pickle.dumps(comment)), comment)
+
+    def test_from_csv(self):
+        comments = CommentCollection.from_csv(self.csv_file)
+        self.assertEqual(len(comments), 3)
+        self.assertEqual(comments[0], Comment('user1', 100, 'first\nline', 0))
+        self.assertEqual(comments[2], Comment('user3', 0, 'third', 0))
+
+    def test_from_csv_with_limit(self):
+        comments = CommentCollection.from_csv(self.csv_file, limit=2)
+        self.assertEqual([comment.author for comment in comments], ['user1', 'user2'])
+
+    def test_to_csv_round_trip(self):
+        comments = CommentCollection.from_csv(self.csv_file)
+        output_file = os.path.join(self.test_dir, 'output.csv')
+        comments.to_csv(output_file)
+        self.assertEqual(list(CommentCollection.from_csv(output_file)), list(comments))
+
+    def test_to_columns_round_trip(self):
+        comments = CommentCollection.from_csv(self.csv_file)
+        columns_file = os.path.join(self.test_dir, 'comments.cols')
+        comments.to_columns(columns_file)
+        self.assertEqual(list(CommentCollection.from_columns(columns_file)), list(comments))
+
+    def test_from_columns_with_limit_and_projection(self):
+        columns_file = os.path.join(self.test_dir, 'comments.cols')
+        CommentCollection.from_csv(self.csv_file).to_columns(columns_file)
+
+        comments = CommentCollection.from_columns(columns_file, limit=2, columns=['author', 'votes'])
+        self.assertEqual(list(comments), [Comment('user1', 100, ''), Comment('user2', 35, '')])
+
+    def test_save_and_load_by_extension(self):
+        comments = CommentCollection.from_csv(self.csv_file)
+        for file_name in ('saved.csv', 'saved.cols'):
+            file_path = os.path.join(self.test_dir, file_name)
+            comments.save(file_path)
+            self.assertEqual(list(CommentCollection.load(file_path, 2)), list(comments)[:2])
+
+        with open(os.path.join(self.test_dir, 'saved.cols'), 'rb') as file:
+            self.assertEqual(file.read(4), b'RCOL')
+
+    def test_from_dataframe(self):
+        dataframe = pd.DataFrame({'author': ['user1'], 'votes': [5], 'comment': ['hello'], 'indent': [0]})
+        comments = CommentCollection.from_dataframe(dataframe)
+        self.assertEqual(list(comments), [Comment('user1', 5, 'hello', 0)])
+
+    def test_items_and_slicing(self):
+        comments = CommentCollection.from_csv(self.csv_file)
+        self.assertEqual([index for index, _ in comments.items()], [0, 1, 2])
+        sliced = comments[:2]
+        self.assertIsInstance(sliced, CommentCollection)
+        self.assertEqual(len(sliced), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.reddit.comments import Comment, CommentCollection
+from src.reddit.dataset_manifest import DatasetManifest, end_offset, in_directory
+from src.reddit.fake_reddit import FakeReddit, synthetic_thread
+from src.reddit.fetch_subreddit import fetch_subreddit
+
+
+class TestDatasetManifest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.manifest = DatasetManifest(self.directory.name)
+        self.comments = CommentCollection([Comment(f'user{i}', 100 - i, f'comment, "number" {i}\nédité', i % 2)
+                                           for i in range(5)])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, file_name, fetched_at, post_id='post1'):
+        file_path = os.path.join(self.directory.name, file_name)
+        offsets = self.comments.save(file_path)
+        self.manifest.record(file_path, f'https://www.reddit.com/r/x/comments/{post_id}/', len(self.comments),
+                             post_id, offsets, now=fetched_at)
+        return file_path
+
+    def test_record_and_latest(self):
+        self.assertIsNone(self.manifest.latest())
+        self.write('b.csv', 100)
+        self.write('a.csv', 200)
+        self.write('c.cols', 150, post_id='post2')
+
+        latest = self.manifest.latest()
+        self.assertEqual(latest['file_name'], 'a.csv')
+        self.assertEqual(latest['rows'], 5)
+        self.assertEqual(latest['size'], os.path.getsize(os.path.join(self.directory.name, 'a.csv')))
+        self.assertEqual(self.manifest.latest('post2')['file_name'], 'c.cols')
+        self.assertIsNone(self.manifest.latest('post3'))
+        self.assertEqual([entry['file_name'] for entry in self.manifest.entries()], ['b.csv', 'c.cols', 'a.csv'])
+
+    def test_row_offsets_read_a_prefix_of_the_csv(self):
+        file_path = self.write('comments.csv', 100)
+        entry = self.manifest.latest()
+        self.assertEqual(len(entry['row_offsets']), 6)
+        self.assertEqual(entry['row_offsets'][-1], os.path.getsize(file_path))
+
+        comments = CommentCollection.from_csv(file_path, 2, end_offset(entry, 2))
+        self.assertEqual(list(comments), list(self.comments[:2]))
+        self.assertEqual(end_offset(entry, 50), os.path.getsize(file_path))
+
+    def test_columnar_datasets_have_no_row_offsets(self):
+        self.write('comments.cols', 100)
+        entry = self.manifest.latest()
+        self.assertIsNone(entry['row_offsets'])
+        self.assertIsNone(end_offset(entry, 2))
+
+    def test_deleted_datasets_are_removed(self):
+        self.write('old.csv', 100)
+        os.remove(self.write('new.csv', 200))
+        self.assertEqual(self.manifest.latest()['file_name'], 'old.csv')
+        self.assertEqual([entry['file_name'] for entry in self.manifest.entries()], ['old.csv'])
+
+    def test_refetch_replaces_the_entry(self):
+        self.write('comments.csv', 100)
+        self.write('comments.csv', 200)
+        self.assertEqual([entry['fetched_at'] for entry in self.manifest.entries()], [200])
+
+    def test_in_directory(self):
+        self.assertTrue(in_directory(os.path.join(self.directory.name, 'a.csv'), self.directory.name))
+        self.assertFalse(in_directory(os.path.join(self.directory.name, 'sub', 'a.csv'), self.directory.name))
+        self.assertFalse(in_directory('a.csv', self.directory.name))
+
+    @patch.dict('os.environ', {}, clear=True)
+    def test_fetch_subreddit_records_datasets_of_the_samples_directory(self):
+        output_file = os.path.join(self.directory.name, 'comments.csv')
+        with patch('src.reddit.fetch_subreddit.SAMPLES_DIR', self.directory.name), \
+                patch('builtins.input', return_value=output_file), FakeReddit(synthetic_thread(50)) as fake_reddit:
+            comments = fetch_subreddit(fake_reddit.post_url, 5, base_url=fake_reddit.base_url)
+
+        entry = self.manifest.latest()
+        self.assertEqual(entry['file_name'], 'comments.csv')
+        self.assertEqual(entry['url'], fake_reddit.post_url)
+        self.assertEqual(entry['rows'], len(comments))
+        self.assertEqual(list(CommentCollection.from_csv(output_file, 3, end_offset(entry, 3))), list(comments[:3]))
+
+
+if __name__ == '__main__':
+    unittest.main()
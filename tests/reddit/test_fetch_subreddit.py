@@ -1,7 +1,12 @@
 import os
+import tempfile
 from unittest.mock import Mock, patch
 
-from src.reddit.fetch_subreddit import get_top_comments_from_post, reddit, extract_comment_data, fetch_subreddit
+from src.reddit.comment_fetcher import Replies
+from src.reddit.comments import CommentCollection
+from src.reddit.fake_reddit import FakeReddit, synthetic_thread
+from src.reddit.fetch_subreddit import get_top_comments_from_post, reddit, extract_comment_data, fetch_subreddit, \
+    stream_subreddit
 import unittest
 import sys
 
@@ -10,11 +15,11 @@ sys.path.insert(0, '/path_to_directory/src/reddit')
 
 class CommentMock:
     def __init__(self, author, score, body, replies=None):
+        self.id = f't1_{author}'
         self.author = author
         self.score = score
         self.body = body
-        self.replies = Mock()
-        self.replies.list = Mock(return_value=replies if replies else [])
+        self.replies = Replies(replies if replies else [])
 
 
 class TestFetchSubreddit(unittest.TestCase):
@@ -115,6 +120,28 @@ class TestFetchSubreddit(unittest.TestCase):
         self.assertEqual(comment_data[1]['comment'], 'test comment 1')
         self.assertEqual(comment_data[1]['indent'], 1)
 
+    def test_extract_comment_prunes_low_score_branches(self):
+        hidden = CommentMock('user4', 500, 'hidden comment')
+        low = CommentMock('user5', 10, 'low comment', [hidden])
+        comment = CommentMock('user6', 50, 'root comment', [low, self.comment2])
+
+        comment_data = extract_comment_data(comment)
+        self.assertEqual([(data['author'], data['indent']) for data in comment_data],
+                         [('user6', 0), ('user2', 1), ('user1', 2)])
+
+    def test_extract_comment_without_duplicates(self):
+        # Every comment appears once, under its own parent, however deep the chain
+        comment = CommentMock('user0', 40, 'comment 0')
+        deepest = comment
+        for i in range(1, 3000):
+            reply = CommentMock(f'user{i}', 40, f'comment {i}')
+            deepest.replies.append(reply)
+            deepest = reply
+
+        comment_data = extract_comment_data(comment)
+        self.assertEqual(len(comment_data), 3000)
+        self.assertEqual([data['indent'] for data in comment_data], list(range(3000)))
+
     @patch('src.reddit.fetch_subreddit.reddit')
     @patch('builtins.input', return_value='output.csv')
     def test_fetch_subreddit_default(self, mock_input, mock_reddit_func):
@@ -137,6 +164,37 @@ class TestFetchSubreddit(unittest.TestCase):
         mock_reddit_instance.submission.assert_called_once_with(url='https://www.reddit.com/r/Python/comments/test_post')
         mock_submission.comments.list.assert_called_once()
 
+    @patch('src.reddit.fetch_subreddit.reddit')
+    @patch('src.reddit.fetch_subreddit.get_top_comments_concurrently')
+    def test_fetch_subreddit_with_base_url(self, mock_get_top_comments, mock_reddit_func):
+        mock_get_top_comments.return_value = [CommentMock('user1', 20, 'Comment 1')]
+
+        comments = fetch_subreddit('https://www.reddit.com/r/Python/comments/test_post', 10, True,
+                                   base_url='http://127.0.0.1:8765', workers=4)
+
+        mock_get_top_comments.assert_called_once_with('https://www.reddit.com/r/Python/comments/test_post', 10,
+                                                      'http://127.0.0.1:8765', 4)
+        mock_reddit_func.assert_not_called()
+        self.assertEqual(len(comments), 1)
+        os.remove('test_post.csv')
+
+
+    @patch.dict('os.environ', {}, clear=True)
+    def test_stream_subreddit_yields_the_comments_of_fetch_subreddit(self):
+        with tempfile.TemporaryDirectory() as directory, FakeReddit(synthetic_thread(100)) as fake_reddit:
+            fetched_file = os.path.join(directory, 'fetched.csv')
+            streamed_file = os.path.join(directory, 'streamed.csv')
+            with patch('builtins.input', return_value=fetched_file):
+                fetched = fetch_subreddit(fake_reddit.post_url, 5, base_url=fake_reddit.base_url)
+
+            stream = stream_subreddit(fake_reddit.post_url, 5, streamed_file, base_url=fake_reddit.base_url)
+            first = next(stream)
+            # The dataset is only written once every comment was extracted
+            self.assertFalse(os.path.exists(streamed_file))
+            streamed = [first] + list(stream)
+
+            self.assertEqual(streamed, list(fetched))
+            self.assertEqual(list(CommentCollection.from_csv(streamed_file)), streamed)
 
 if __name__ == '__main__':
     unittest.main()
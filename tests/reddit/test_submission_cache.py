@@ -0,0 +1,138 @@
+import copy
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.reddit.comment_fetcher import all_comments, fetch_comment_tree
+from src.reddit.fake_reddit import FakeReddit, synthetic_thread
+from src.reddit.fetch_subreddit import fetch_subreddit
+from src.reddit.submission_cache import SubmissionCache
+
+
+def snapshot(top_level):
+    return {comment.id: (comment.parent_id, comment.score, comment.body, [reply.id for reply in comment.replies])
+            for comment in all_comments(top_level)}
+
+
+@patch.dict('os.environ', {}, clear=True)
+class TestSubmissionCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database_file = os.path.join(self.directory.name, 'cache', 'reddit.sqlite')
+        self.thread = synthetic_thread(200)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def comment_tree(self, cache, thread):
+        with FakeReddit(thread) as fake_reddit:
+            top_level = cache.comment_tree(fake_reddit.post_url,
+                                           lambda: fetch_comment_tree(fake_reddit.post_url, fake_reddit.base_url, 4))
+        return top_level, fake_reddit
+
+    def test_cached_tree_matches_the_fetched_tree(self):
+        cache = SubmissionCache(self.database_file, ttl=60)
+        with FakeReddit(self.thread) as fake_reddit:
+            fetched = fetch_comment_tree(fake_reddit.post_url, fake_reddit.base_url, 4)
+        cache.store('fake01', fake_reddit.post_url, fetched)
+
+        self.assertEqual(snapshot(cache.load('fake01')), snapshot(fetched))
+
+    def test_fresh_posts_are_served_from_the_cache(self):
+        cache = SubmissionCache(self.database_file, ttl=60)
+        first, fake_reddit = self.comment_tree(cache, self.thread)
+        self.assertGreater(fake_reddit.request_count, 0)
+
+        second, fake_reddit = self.comment_tree(cache, self.thread)
+        self.assertEqual(fake_reddit.request_count, 0)
+        self.assertEqual(snapshot(second), snapshot(first))
+
+    def test_expired_posts_refresh_scores_and_new_comments(self):
+        cache = SubmissionCache(self.database_file, ttl=0)
+        self.comment_tree(cache, self.thread)
+
+        thread = copy.deepcopy(self.thread)
+        scored, edited, unchanged = list(thread)[:3]
+        thread[scored]['score'] += 1000
+        thread[edited].update(body='edited body', edited=1700000000.0)
+        # A body that changed without an edit time is not rewritten
+        thread[unchanged]['body'] = 'ignored body'
+        thread['new'] = {'id': 'new', 'parent_id': scored, 'author': 'newcomer', 'score': 7, 'body': 'new comment',
+                         'replies': []}
+        thread[scored]['replies'].append('new')
+
+        top_level, _ = self.comment_tree(cache, thread)
+        comments = {comment.id: comment for comment in all_comments(top_level)}
+        self.assertEqual(comments[f't1_{scored}'].score, self.thread[scored]['score'] + 1000)
+        self.assertEqual(comments[f't1_{edited}'].body, 'edited body')
+        self.assertEqual(comments[f't1_{edited}'].edited, 1700000000.0)
+        self.assertEqual(comments[f't1_{unchanged}'].body, self.thread[unchanged]['body'])
+        self.assertIn(comments['t1_new'], comments[f't1_{scored}'].replies)
+        self.assertEqual(len(comments), len(thread))
+
+    def test_store_counts_the_changes(self):
+        cache = SubmissionCache(self.database_file)
+        with FakeReddit(self.thread) as fake_reddit:
+            fetched = fetch_comment_tree(fake_reddit.post_url, fake_reddit.base_url, 4)
+
+        self.assertEqual(cache.store('fake01', 'url', fetched), {'new': 200, 'edited': 0, 'refreshed': 0})
+        self.assertEqual(cache.store('fake01', 'url', fetched), {'new': 0, 'edited': 0, 'refreshed': 200})
+
+    def test_is_fresh(self):
+        cache = SubmissionCache(self.database_file, ttl=60)
+        self.assertFalse(cache.is_fresh('fake01'))
+        cache.store('fake01', 'url', [], now=1000)
+        self.assertTrue(cache.is_fresh('fake01', now=1059))
+        self.assertFalse(cache.is_fresh('fake01', now=1060))
+
+    def test_fetch_subreddit_with_the_cache(self):
+        with FakeReddit(self.thread) as fake_reddit:
+            output_file = os.path.join(self.directory.name, 'comments.csv')
+            with patch('builtins.input', return_value=output_file):
+                first = fetch_subreddit(fake_reddit.post_url, 5, base_url=fake_reddit.base_url,
+                                        cache_file=self.database_file, cache_ttl=60)
+                requests = fake_reddit.request_count
+                second = fetch_subreddit(fake_reddit.post_url, 5, base_url=fake_reddit.base_url,
+                                         cache_file=self.database_file, cache_ttl=60)
+
+        self.assertEqual(fake_reddit.request_count, requests)
+        self.assertEqual(list(first), list(second))
+
+    def test_snapshot_round_trip(self):
+        cache = SubmissionCache(self.database_file)
+        records = [{'id': 't1_a', 'author': 'a', 'votes': 50, 'comment': 'first', 'indent': 0},
+                   {'id': 't1_b', 'author': 'b', 'votes': 40, 'comment': 'second', 'indent': 1}]
+        self.assertEqual(cache.snapshot('fake01'), {})
+
+        cache.save_snapshot('fake01', records)
+        self.assertEqual(cache.snapshot('fake01'), {('t1_a', 0): (0, records[0]), ('t1_b', 1): (1, records[1])})
+        cache.save_snapshot('fake01', records[1:])
+        self.assertEqual(cache.snapshot('fake01'), {('t1_b', 1): (0, records[1])})
+
+    def test_fetch_subreddit_delta(self):
+        output_file = os.path.join(self.directory.name, 'comments.csv')
+        options = {'cache_file': self.database_file, 'cache_ttl': 0, 'delta': True}
+        with patch('builtins.input', return_value=output_file):
+            with FakeReddit(self.thread) as fake_reddit:
+                first = fetch_subreddit(fake_reddit.post_url, 5, base_url=fake_reddit.base_url, **options)
+
+            thread = copy.deepcopy(self.thread)
+            thread['new'] = {'id': 'new', 'parent_id': None, 'author': 'newcomer', 'score': 100000,
+                             'body': 'new top comment', 'replies': []}
+            with FakeReddit(thread) as fake_reddit:
+                second = fetch_subreddit(fake_reddit.post_url, 5, base_url=fake_reddit.base_url, **options)
+
+        self.assertEqual(len(first.new), len(first.comments))
+        self.assertEqual([(rank, comment.comment) for rank, comment in second.new], [(0, 'new top comment')])
+        # The other top comments only moved down, unless the new one pushed the last of them out
+        self.assertEqual(second.changed, [])
+        self.assertEqual(len(second.moved), len(second.comments) - 1)
+
+    def test_fetch_subreddit_delta_needs_the_cache(self):
+        with self.assertRaises(ValueError):
+            fetch_subreddit('https://www.reddit.com/r/Python/comments/test_post', 5, delta=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
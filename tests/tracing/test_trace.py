@@ -0,0 +1,119 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from src.tracing.trace import TRACE_DIR_VARIABLE, start_tracing, stop_tracing, trace_span, traced_task, \
+    trace_directory, write_trace
+
+
+class TestTrace(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.trace_dir = os.path.join(self.temp_dir.name, 'trace')
+        self.trace_file = os.path.join(self.temp_dir.name, 'trace.json')
+
+    def tearDown(self):
+        os.environ.pop(TRACE_DIR_VARIABLE, None)
+        self.temp_dir.cleanup()
+
+    def read_trace(self):
+        with open(self.trace_file) as file:
+            return json.load(file)['traceEvents']
+
+    def spans(self):
+        return [event for event in self.read_trace() if event['ph'] == 'X']
+
+    def test_trace_span_is_a_no_op_when_disabled(self):
+        with trace_span('render_html'):
+            pass
+
+        self.assertIsNone(trace_directory())
+        self.assertIsNone(stop_tracing())
+
+    def test_trace_span_records_a_complete_event(self):
+        start_tracing(self.trace_dir)
+        with trace_span('tts_chunk', 'tts', chunk=3):
+            pass
+        self.assertEqual(stop_tracing(), self.trace_file)
+
+        spans = self.spans()
+        self.assertEqual(len(spans), 1)
+        self.assertEqual(spans[0]['name'], 'tts_chunk')
+        self.assertEqual(spans[0]['cat'], 'tts')
+        self.assertEqual(spans[0]['args'], {'chunk': 3})
+        self.assertGreaterEqual(spans[0]['dur'], 0)
+        self.assertEqual(spans[0]['pid'], os.getpid())
+        self.assertFalse(os.path.exists(self.trace_dir))
+        self.assertIsNone(trace_directory())
+
+    def test_trace_span_names_processes_and_threads(self):
+        start_tracing(self.trace_dir)
+        with trace_span('first'):
+            pass
+        with trace_span('second'):
+            pass
+        stop_tracing()
+
+        names = [event['name'] for event in self.read_trace() if event['ph'] == 'M']
+        self.assertEqual(sorted(names), ['process_name', 'thread_name'])
+
+    def test_trace_span_records_errors(self):
+        start_tracing(self.trace_dir)
+        with self.assertRaises(ValueError):
+            with trace_span('mux', 'subprocess'):
+                raise ValueError('boom')
+        stop_tracing(self.trace_file)
+
+        self.assertEqual(self.spans()[0]['args'], {'error': "ValueError('boom')"})
+
+    def test_traced_task(self):
+        start_tracing(self.trace_dir)
+        task = traced_task(lambda index, row: row * 2, 'html')
+        self.assertEqual(task(4, 21), 42)
+        stop_tracing()
+
+        spans = [(span['name'], span['cat'], span['args']) for span in self.spans()]
+        self.assertEqual(spans, [('html', 'stage', {'comment': 4})])
+
+    def test_start_tracing_removes_previous_events(self):
+        os.makedirs(self.trace_dir)
+        with open(os.path.join(self.trace_dir, 'events_1.jsonl'), 'w') as file:
+            file.write(json.dumps({'name': 'stale', 'ph': 'X', 'ts': 0, 'dur': 1, 'pid': 1, 'tid': 1}) + '\n')
+
+        start_tracing(self.trace_dir)
+        stop_tracing()
+
+        self.assertEqual(self.spans(), [])
+
+    def test_spans_of_worker_processes_are_merged(self):
+        start_tracing(self.trace_dir)
+        with trace_span('run'):
+            subprocess.run([sys.executable, '-c',
+                            'from src.tracing.trace import trace_span\n'
+                            'with trace_span("capture", "subprocess"):\n'
+                            '    pass\n'],
+                           check=True, cwd=os.getcwd(), env=dict(os.environ, PYTHONPATH=os.getcwd()))
+        stop_tracing()
+
+        spans = self.spans()
+        self.assertEqual(sorted(span['name'] for span in spans), ['capture', 'run'])
+        self.assertEqual(len({span['pid'] for span in spans}), 2)
+        # Spans are sorted by their start
+        self.assertEqual([span['name'] for span in spans], ['run', 'capture'])
+
+    def test_write_trace_skips_truncated_lines(self):
+        os.makedirs(self.trace_dir)
+        with open(os.path.join(self.trace_dir, 'events_1.jsonl'), 'w') as file:
+            file.write(json.dumps({'name': 'late', 'ph': 'X', 'ts': 20, 'dur': 1, 'pid': 1, 'tid': 1}) + '\n')
+            file.write(json.dumps({'name': 'early', 'ph': 'X', 'ts': 10, 'dur': 1, 'pid': 1, 'tid': 1}) + '\n')
+            file.write('{"name": "cut')
+
+        self.assertEqual(write_trace(self.trace_dir, self.trace_file), 2)
+        self.assertEqual([span['name'] for span in self.spans()], ['early', 'late'])
+
+
+if __name__ == '__main__':
+    unittest.main()
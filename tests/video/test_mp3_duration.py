@@ -0,0 +1,107 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from src.video.mp3_duration import DurationIndex, Mp3HeaderError, read_duration
+
+
+def encode_mp3(file_path, seconds, sample_rate=22050, channels=1, *options):
+    subprocess.run(['ffmpeg', '-loglevel', 'error', '-y', '-f', 'lavfi', '-i', f"sine=frequency=220:duration={seconds}",
+                    '-ar', str(sample_rate), '-ac', str(channels), *options, file_path], check=True)
+
+
+def decoded_duration(file_path, sample_rate):
+    samples = subprocess.run(['ffmpeg', '-loglevel', 'error', '-i', file_path, '-f', 's16le', '-ac', '1', '-'],
+                             capture_output=True, check=True).stdout
+    return len(samples) / 2 / sample_rate
+
+
+class TestReadDuration(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_info_tag(self):
+        # The LAME tag holds the frames, the encoder delay and the padding, so the duration is exact
+        for sample_rate, channels in [(22050, 1), (44100, 2), (16000, 1)]:
+            file_path = self.path(f"speech_{sample_rate}.mp3")
+            encode_mp3(file_path, 5.3, sample_rate, channels)
+            self.assertAlmostEqual(read_duration(file_path), 5.3, places=3)
+
+    def test_frame_scan(self):
+        file_path = self.path('speech.mp3')
+        encode_mp3(file_path, 3.1, 24000, 1, '-b:a', '32k', '-write_xing', '0')
+        self.assertAlmostEqual(read_duration(file_path), decoded_duration(file_path, 24000), places=3)
+
+    def test_id3_tags(self):
+        file_path = self.path('speech.mp3')
+        encode_mp3(file_path, 2, 44100, 1, '-metadata', 'title=speech', '-write_id3v1', '1')
+        self.assertAlmostEqual(read_duration(file_path), 2, places=3)
+
+    def test_concatenated_files(self):
+        # gTTS speech is the MP3 files of its chunks one after the other, the tag of the first covers only the first
+        chunk_path = self.path('chunk.mp3')
+        encode_mp3(chunk_path, 2, 24000)
+        file_path = self.path('speech.mp3')
+        with open(chunk_path, 'rb') as chunk, open(file_path, 'wb') as file:
+            file.write(chunk.read() * 3)
+        self.assertAlmostEqual(read_duration(file_path), decoded_duration(file_path, 24000), delta=0.1)
+
+    def test_corrupt_file(self):
+        file_path = self.path('speech.mp3')
+        with open(file_path, 'wb') as file:
+            file.write(b'\0' * 10000)
+        with self.assertRaises(Mp3HeaderError):
+            read_duration(file_path)
+
+
+class TestDurationIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'speech.mp3')
+        encode_mp3(self.file_path, 1)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_reads_a_file_once(self):
+        index = DurationIndex()
+        with patch('src.video.mp3_duration.read_duration', return_value=1.0) as read:
+            self.assertEqual(index.duration(self.file_path), 1.0)
+            self.assertEqual(index.duration(self.file_path), 1.0)
+        read.assert_called_once()
+
+    def test_reads_a_changed_file_again(self):
+        index = DurationIndex()
+        first = index.duration(self.file_path)
+        encode_mp3(self.file_path, 2)
+        self.assertGreater(index.duration(self.file_path), first)
+
+    def test_decodes_corrupt_files(self):
+        with open(self.file_path, 'wb') as file:
+            file.write(b'\0' * 10000)
+        decode = Mock(return_value=4.0)
+        index = DurationIndex()
+        self.assertEqual(index.duration(self.file_path, decode), 4.0)
+        decode.assert_called_once_with(self.file_path)
+        with self.assertRaises(Mp3HeaderError):
+            DurationIndex().duration(self.file_path)
+
+    def test_evicts_the_least_recently_used(self):
+        index = DurationIndex(max_entries=1)
+        other_path = os.path.join(self.directory.name, 'other.mp3')
+        encode_mp3(other_path, 1)
+        index.duration(self.file_path)
+        index.duration(other_path)
+        self.assertEqual([key[0] for key in index.durations], [os.path.abspath(other_path)])
+
+
+if __name__ == "__main__":
+    unittest.main()
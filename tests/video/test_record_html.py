@@ -2,10 +2,12 @@ import os
 import shutil
 import tempfile
 import unittest
+from unittest.mock import MagicMock, patch
 
 from pydub import AudioSegment
 
-from src.video.record_html import get_mp3_length, copy_files_by_list
+from src.video import record_html
+from src.video.record_html import get_mp3_length, copy_files_by_list, shared_browser
 
 
 class TestRecordHtml(unittest.TestCase):
@@ -62,3 +64,36 @@ class TestRecordHtml(unittest.TestCase):
 
 if __name__ == "__main__":
     unittest.main()
+
+
+class TestSharedBrowser(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(record_html, 'idle_browsers', [])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.launch = patch.object(record_html, 'launch_browser',
+                                   side_effect=lambda: (MagicMock(), MagicMock())).start()
+        self.addCleanup(patch.stopall)
+
+    def test_browser_is_reused_by_the_next_recording(self):
+        with shared_browser() as first:
+            pass
+        with shared_browser() as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(self.launch.call_count, 1)
+
+    def test_busy_browser_is_not_shared(self):
+        with shared_browser() as first, shared_browser() as second:
+            self.assertIsNot(first, second)
+        self.assertEqual(self.launch.call_count, 2)
+        self.assertEqual(len(record_html.idle_browsers), 2)
+
+    def test_browser_is_closed_after_a_failure(self):
+        with self.assertRaises(RuntimeError):
+            with shared_browser():
+                raise RuntimeError('crashed')
+        self.assertEqual(record_html.idle_browsers, [])
+        with shared_browser():
+            pass
+        self.assertEqual(self.launch.call_count, 2)
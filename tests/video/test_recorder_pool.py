@@ -0,0 +1,56 @@
+import os
+import unittest
+from unittest.mock import Mock, patch
+
+from src.video import recorder_pool
+
+
+class TestRecorderPool(unittest.TestCase):
+    @patch('subprocess.Popen')
+    def test_start_virtual_display(self, mock_popen):
+        def popen(command, pass_fds, **kwargs):
+            os.write(pass_fds[0], b'7\n')
+            return Mock()
+
+        mock_popen.side_effect = popen
+
+        process, display = recorder_pool.start_virtual_display()
+
+        self.assertEqual(display, ':7')
+        command = mock_popen.call_args[0][0]
+        self.assertEqual(command[0], 'Xvfb')
+        self.assertIn('-displayfd', command)
+        self.assertIn('1920x1080x24', command)
+
+    @patch('subprocess.Popen')
+    def test_start_virtual_display_without_display_number(self, mock_popen):
+        process = Mock()
+        mock_popen.return_value = process
+
+        with self.assertRaises(RuntimeError):
+            recorder_pool.start_virtual_display()
+        process.kill.assert_called_once()
+
+    @patch('src.video.recorder_pool.Finalize')
+    @patch('src.video.recorder_pool.start_virtual_display')
+    def test_init_recorder_sets_display(self, mock_start_virtual_display, mock_finalize):
+        process = Mock()
+        mock_start_virtual_display.return_value = process, ':5'
+
+        with patch.dict(os.environ, {'DISPLAY': ':0'}):
+            recorder_pool.init_recorder()
+            self.assertEqual(os.environ['DISPLAY'], ':5')
+
+        mock_finalize.assert_called_once()
+        self.assertEqual(mock_finalize.call_args[1]['args'], (process,))
+
+    def test_run_in_pool(self):
+        pool = Mock()
+        pool.submit.return_value.result.return_value = 'done'
+
+        self.assertEqual(recorder_pool.run_in_pool(pool, len, 'abc'), 'done')
+        pool.submit.assert_called_once_with(len, 'abc')
+
+
+if __name__ == '__main__':
+    unittest.main()